@@ -0,0 +1,181 @@
+from __future__ import absolute_import
+
+import os
+import sqlite3
+from collections import defaultdict
+from contextlib import closing
+
+BY_FILES = "files"
+BY_LINES = "lines"
+
+
+def context_to_nodeid(context):
+    """
+    Parameters
+    ----------
+    context: str
+        dynamic context of coverage.py: 'tests/test_one.py::test_one|run' (pytest-cov)
+
+    Returns
+    -------
+    str
+        'tests/test_one.py::test_one'
+    """
+    return context.rsplit("|", 1)[0] if "|" in context else context
+
+
+def numbits_to_int(numbits):
+    """
+    Parameters
+    ----------
+    numbits: bytes
+        numbits of coverage.py, the bit `n` is set for the covered line `n`
+
+    Returns
+    -------
+    int
+        the same bitmap, covered lines are intersected by `&`
+    """
+    return int.from_bytes(numbits or b"", "little")
+
+
+class CoverageIndex(object):
+    """
+    Inverted index `file -> test -> covered lines` read from `.coverage` sqlite file
+    of coverage.py with per-test dynamic contexts (`pytest --cov --cov-context=test`),
+    only files covered by the target test are loaded
+    """
+
+    def __init__(self, path):
+        if not os.path.isfile(path):
+            raise ValueError(f"Coverage data file not found: {path}")
+        self.path = path
+        # nodeid -> ids of its contexts (setup, run and teardown)
+        self.contexts = defaultdict(set)
+        with closing(self._connect()) as connection:
+            try:
+                rows = connection.execute("SELECT id, context FROM context").fetchall()
+                has_arcs = connection.execute(
+                    "SELECT value FROM meta WHERE key = 'has_arcs'"
+                ).fetchone()
+            except sqlite3.DatabaseError as err:
+                raise ValueError(f"{path} isn't coverage.py data file: {err}") from err
+        for context_id, context in rows:
+            if context:  # the empty static context covers everything
+                self.contexts[context_to_nodeid(context)].add(context_id)
+        self.has_arcs = bool(has_arcs and has_arcs[0] not in ("0", "False"))
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def _read_lines(self, connection, column, ids):
+        """
+        Returns
+        -------
+        Iterator[tuple[int, int, int]]
+            file id, context id and covered lines (bitmap)
+        """
+        marks = ",".join("?" * len(ids))
+        if not self.has_arcs:
+            query = (
+                "SELECT file_id, context_id, numbits FROM line_bits "
+                f"WHERE {column} IN ({marks})"
+            )
+            for file_id, context_id, numbits in connection.execute(query, list(ids)):
+                yield file_id, context_id, numbits_to_int(numbits)
+            return
+        query = f"SELECT file_id, context_id, fromno, tono FROM arc WHERE {column} IN ({marks})"
+        for file_id, context_id, fromno, tono in connection.execute(query, list(ids)):
+            lines = 0
+            for line in (fromno, tono):
+                if line > 0:  # negative numbers are entries and exits of code objects
+                    lines |= 1 << line
+            yield file_id, context_id, lines
+
+    def index(self, nodeid):
+        """
+        Parameters
+        ----------
+        nodeid: str
+            the target test
+
+        Returns
+        -------
+        tuple[dict[int, int], dict[int, dict[str, int]]]
+            lines of the target by files
+            and the inverted index of these files: file -> test -> covered lines
+        """
+        context_ids = self.contexts.get(nodeid)
+        if not context_ids:
+            return {}, {}
+        nodeids = {
+            context_id: test
+            for test, ids in self.contexts.items()
+            for context_id in ids
+        }
+        target = defaultdict(int)
+        files = defaultdict(lambda: defaultdict(int))
+        with closing(self._connect()) as connection:
+            for file_id, _, lines in self._read_lines(
+                connection, "context_id", context_ids
+            ):
+                target[file_id] |= lines
+            if not target:
+                return {}, {}
+            for file_id, context_id, lines in self._read_lines(
+                connection, "file_id", target
+            ):
+                test = nodeids.get(context_id)
+                if test is not None and test != nodeid:
+                    files[file_id][test] |= lines
+        return dict(target), files
+
+    def related(self, nodeid, by=BY_FILES):
+        """
+        Parameters
+        ----------
+        nodeid: str
+            the target test
+        by: str
+            `files` - a test covers any file of the target,
+            `lines` - a test covers any line of the target
+
+        Returns
+        -------
+        Optional[set[str]]
+            tests which could share state with the target,
+            None when the target isn't in coverage data
+        """
+        target, files = self.index(nodeid)
+        if not target:
+            return None
+        related = set()
+        for file_id, tests in files.items():
+            for test, lines in tests.items():
+                if by == BY_FILES or lines & target[file_id]:
+                    related.add(test)
+        return related
+
+    def prune(self, candidates, target, by=BY_FILES):
+        """
+        Parameters
+        ----------
+        candidates: List[_pytest.python.Function]
+        target: _pytest.python.Function
+        by: str
+
+        Returns
+        -------
+        List[_pytest.python.Function]
+            candidates which could share state with the target in the same order,
+            tests unknown by coverage data are kept, all candidates are kept
+            when the target isn't in coverage data
+        """
+        related = self.related(target.nodeid, by)
+        if related is None:
+            return candidates
+        return [
+            item
+            for item in candidates
+            if item.nodeid in related or item.nodeid not in self.contexts
+        ]
@@ -0,0 +1,153 @@
+from __future__ import absolute_import
+
+import itertools
+
+
+def format_duration(seconds):
+    """
+    Parameters
+    ----------
+    seconds: float
+
+    Returns
+    -------
+    str
+        '0.8s', '45s', '3m 20s', '2h 5m'
+    """
+    if seconds < 10:
+        return f"{seconds:.1f}s"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {seconds}s"
+    return f"{seconds}s"
+
+
+class Durations(object):
+    """
+    Durations of tests (setup + call + teardown) measured by previous runs
+    and by the current one, stored in pytest cache
+    """
+
+    CACHE_KEY = "PytestSherlock/durations"
+
+    def __init__(self, config):
+        self.cache = getattr(config, "cache", None)
+        known = self.cache.get(self.CACHE_KEY, None) if self.cache is not None else None
+        self.known = dict(known) if isinstance(known, dict) else {}
+        self.measured = {}
+        # candidates, the target and the cost of the hunt
+        self._cost = None
+
+    def add(self, report):
+        """
+        Parameters
+        ----------
+        report: _pytest.reports.TestReport
+        """
+        return self.add_phase(
+            report.nodeid, report.when, getattr(report, "duration", None)
+        )
+
+    def add_phase(self, nodeid, when, duration):
+        """
+        Parameters
+        ----------
+        nodeid: str
+        when: str
+            setup, call or teardown
+        duration: float
+        """
+        if not isinstance(duration, (int, float)):
+            return False
+        if when == "setup":
+            self.measured[nodeid] = duration
+        else:
+            self.measured[nodeid] = self.measured.get(nodeid, 0.0) + duration
+        self.known[nodeid] = self.measured[nodeid]
+        return True
+
+    def seed(self, durations):
+        """
+        Take durations of a recorded run (`--sherlock-order`) for tests which durations
+        aren't known yet, they give ETA of the first hunt, but they aren't stored
+
+        Parameters
+        ----------
+        durations: dict[str, float]
+            nodeid -> duration
+        """
+        for nodeid, duration in durations.items():
+            self.known.setdefault(nodeid, duration)
+        return bool(durations)
+
+    def average(self):
+        return sum(self.known.values()) / len(self.known) if self.known else None
+
+    def estimate(self, nodeids):
+        """
+        Parameters
+        ----------
+        nodeids: Iterable[str]
+
+        Returns
+        -------
+        Optional[float]
+            expected duration of the tests (unknown ones take the average),
+            None when nothing is known about durations
+        """
+        average = self.average()
+        if average is None:
+            return None
+        return sum(self.known.get(nodeid, average) for nodeid in nodeids)
+
+    def make_cost(self, items, target):
+        """
+        Parameters
+        ----------
+        items: List[_pytest.python.Function]
+            candidates
+        target: _pytest.python.Function
+
+        Returns
+        -------
+        Optional[Callable[[pytest_sherlock.strategy.Bucket], float]]
+            estimated duration of a bucket (with the target test),
+            None when nothing is known about durations,
+            it's made once for the candidates of the hunt
+        """
+        if (
+            self._cost is not None
+            and self._cost[0] is items
+            and self._cost[1] is target
+        ):
+            return self._cost[2]
+        average = self.average()
+        if average is None:
+            return None
+        # prefix sums give the duration of any range of candidates in O(1)
+        prefix = [0.0] + list(
+            itertools.accumulate(self.known.get(item.nodeid, average) for item in items)
+        )
+        target_duration = self.known.get(target.nodeid, average)
+
+        def cost(bucket):
+            if bucket.items is items:
+                return prefix[bucket.stop] - prefix[bucket.start] + target_duration
+            tests = sum(self.known.get(item.nodeid, average) for item in bucket.tests)
+            return tests + target_duration
+
+        self._cost = (items, target, cost)
+        return cost
+
+    def store(self):
+        if self.cache is None or not self.measured:
+            return False
+        known = self.cache.get(self.CACHE_KEY, None)
+        known = dict(known) if isinstance(known, dict) else {}
+        known.update(self.measured)
+        self.cache.set(self.CACHE_KEY, known)
+        return True
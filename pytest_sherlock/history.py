@@ -0,0 +1,153 @@
+from __future__ import absolute_import
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+
+def module_of(nodeid):
+    """
+    Parameters
+    ----------
+    nodeid: str
+        'tests/test_one.py::TestOne::test_first'
+
+    Returns
+    -------
+    str
+        'tests/test_one.py'
+    """
+    return nodeid.split("::")[0]
+
+
+def make_cache_dir(config, name):
+    """
+    Parameters
+    ----------
+    config: _pytest.config.Config
+    name: str
+        name of directory inside of pytest cache
+
+    Returns
+    -------
+    str
+        path to the directory
+    """
+    cache = config.cache
+    make_dir = getattr(cache, "mkdir", None) or getattr(cache, "makedir")
+    return str(make_dir(name))
+
+
+class History(object):
+    """
+    Local database of confirmed coupled tests,
+    stored as sqlite file inside of pytest cache directory
+    """
+
+    CACHE_DIR = "sherlock"
+    DB_NAME = "history.sqlite3"
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS coupled ("
+        "polluter TEXT NOT NULL, "
+        "victim TEXT NOT NULL, "
+        "fixtures TEXT NOT NULL DEFAULT '', "
+        "hits INTEGER NOT NULL DEFAULT 1, "
+        "last_seen REAL NOT NULL, "
+        "PRIMARY KEY (polluter, victim))"
+    )
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(self.SCHEMA)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Parameters
+        ----------
+        config: _pytest.config.Config
+
+        Returns
+        -------
+        Optional[History]
+            None in case when history was disabled
+        """
+        if config.getoption("--sherlock-no-history", False):
+            return None
+        return cls(os.path.join(make_cache_dir(config, cls.CACHE_DIR), cls.DB_NAME))
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def add(self, polluter, victim, fixtures=()):
+        """
+        Save (or increase hits of) confirmed pair of coupled tests
+
+        Parameters
+        ----------
+        polluter: str
+            nodeid of the test which modifies state
+        victim: str
+            nodeid of the test which fails after the polluter
+        fixtures: Iterable[str]
+            common fixtures of both tests
+        """
+        fixtures = ",".join(sorted(fixtures))
+        now = time.time()
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO coupled (polluter, victim, fixtures, hits, last_seen) "
+                    "VALUES (?, ?, ?, 0, ?)",
+                    (polluter, victim, fixtures, now),
+                )
+                connection.execute(
+                    "UPDATE coupled SET hits = hits + 1, fixtures = ?, last_seen = ? "
+                    "WHERE polluter = ? AND victim = ?",
+                    (fixtures, now, polluter, victim),
+                )
+        return True
+
+    def polluters(self, victim):
+        """
+        Parameters
+        ----------
+        victim: str
+            nodeid of the target test
+
+        Returns
+        -------
+        dict[str, int]
+            nodeid of known polluters with amount of confirmations
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT polluter, hits FROM coupled WHERE victim = ? "
+                "ORDER BY hits DESC, last_seen DESC",
+                (victim,),
+            ).fetchall()
+        return dict(rows)
+
+    def make_sort_key(self, victim):
+        """
+        Known polluters of the victim go first, then their module neighbours
+
+        Parameters
+        ----------
+        victim: str
+            nodeid of the target test
+
+        Returns
+        -------
+        Callable[[_pytest.python.Function], tuple[int, bool]]
+        """
+        polluters = self.polluters(victim)
+        modules = {module_of(nodeid) for nodeid in polluters}
+
+        def sort_key(item):
+            return polluters.get(item.nodeid, 0), module_of(item.nodeid) in modules
+
+        return sort_key
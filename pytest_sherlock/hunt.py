@@ -0,0 +1,791 @@
+from __future__ import absolute_import
+
+import itertools
+import os
+import statistics
+import tempfile
+import time
+
+from pytest_sherlock.durations import Durations, format_duration
+from pytest_sherlock.history import History, make_cache_dir
+from pytest_sherlock.parallel import BucketRunner, Limits, ParallelHunt, WorkerError
+from pytest_sherlock.report import HuntReport
+from pytest_sherlock.runner import (
+    MODE_POLLUTER,
+    MODE_SETTER,
+    MODE_SLOWDOWN,
+    LocalRunner,
+    Verdict,
+)
+from pytest_sherlock.state import (
+    RESET_HARD,
+    RESET_SOFT,
+    get_touched_fixtures,
+    refresh_state,
+)
+from pytest_sherlock.strategy import BinaryStrategy, Bucket
+from pytest_sherlock.work_queue import Polling, QueueRunner, WorkQueue
+
+PARTIAL_ORDER = "partial.txt"
+
+
+class SherlockError(Exception):
+    pass
+
+
+def write_eta(eta):
+    """
+    Parameters
+    ----------
+    eta: tuple[float, float]
+        expected and the worst duration
+
+    Returns
+    -------
+    str
+    """
+    expected, worst = eta
+    return f"ETA ~{format_duration(expected)} (at most {format_duration(worst)})"
+
+
+class Collection:
+    """
+    Drives a search strategy: adds the target test to proposed buckets
+    and resets state between steps
+    """
+
+    def __init__(
+        self,
+        strategy,
+        target_test_method,
+        reset=RESET_HARD,
+        reusable=None,
+    ):
+        self.strategy = strategy
+        self.target_test_method = target_test_method
+        self.reset = reset
+        self.reusable = reusable or {}
+        self.min, self.max = strategy.bounds()
+        # the last bucket with the target test
+        self.bucket = Bucket([], 0, 0)
+
+    @classmethod
+    def make(
+        cls, items, target_test_method, suspects=(), reset=RESET_HARD, reusable=None
+    ):
+        return cls(
+            strategy=BinaryStrategy(items, suspects=suspects),
+            target_test_method=target_test_method,
+            reset=reset,
+            reusable=reusable,
+        )
+
+    def restart(self, items, strategy=BinaryStrategy):
+        """
+        Parameters
+        ----------
+        items: List[_pytest.python.Function]
+            other candidates of the same target
+        strategy: Type[pytest_sherlock.strategy.Strategy]
+
+        Returns
+        -------
+        Collection
+            a new search with the same target and reset of state
+        """
+        return Collection(
+            strategy(items),
+            self.target_test_method,
+            reset=self.reset,
+            reusable=self.reusable,
+        )
+
+    @property
+    def suspects(self):
+        return self.strategy.suspects
+
+    @property
+    def binary_tree(self):
+        return getattr(self.strategy, "binary_tree", None)
+
+    @property
+    def narrowest(self):
+        return tuple(self.strategy.narrowest())
+
+    @property
+    def path(self):
+        return getattr(self.strategy, "path", "")
+
+    def get_narrowest(self, items=None):
+        """
+        Parameters
+        ----------
+        items: Optional[List[_pytest.python.Function]]
+            candidates which were used by the strategy,
+            by default candidates in the order of the strategy (it could regroup them)
+
+        Returns
+        -------
+        List[_pytest.python.Function]
+        """
+        if items is None:
+            items = self.strategy.items
+        return items[slice(*self.narrowest)]
+
+    def refresh(self, items, nextitem):
+        """
+        Parameters
+        ----------
+        items: Bucket
+            the previous bucket, fixtures of its tests are touched
+        nextitem: _pytest.python.Function
+            the first test of the next bucket
+        """
+        return refresh_state(
+            item=self.target_test_method,
+            touched=get_touched_fixtures(items),
+            nextitem=nextitem,
+            level=self.reset,
+            reusable=self.reusable,
+        )
+
+    def send(self, is_fail: bool):
+        self.strategy.feed(
+            Bucket(self.bucket.items, self.bucket.start, self.bucket.stop), is_fail
+        )
+        items = self.strategy.propose()
+        if items is None:
+            raise StopIteration
+        if items:
+            items = items.with_target(self.target_test_method)
+            self.refresh(self.bucket, items[0])
+            self.bucket = items
+        return items
+
+    def __next__(self):
+        items = self.strategy.propose()
+        if items is None:
+            raise StopIteration
+        if items:
+            items = items.with_target(self.target_test_method)
+            self.bucket = items
+        return items
+
+    def get_next_item(self, items, idx):
+        """
+        Parameters
+        ----------
+        items: Bucket
+            bucket of tests, the target is the last one
+        idx: int
+            index of the next test
+
+        Returns
+        -------
+        Optional[_pytest.python.Function]
+            for the target with soft reset returns the first test of the bucket,
+            it keeps higher scoped fixtures alive between steps
+        """
+        if idx < len(items):
+            return items[idx]
+        if self.reset == RESET_SOFT and len(items) > 1:
+            return items[0]
+        return None
+
+    def __str__(self):
+        return self.strategy.describe()
+
+
+class Probe(object):
+    """
+    `--sherlock-probe` callable which detects polluted state right after a test,
+    the bucket ends on the first test after which it fires
+    """
+
+    def __init__(self, check=None):
+        self.check = check
+        # nodeids of tests after which the probe fired, but the target passed
+        self.refuted = set()
+        # the collection, the bucket and the culprit which were replaced by the pair of the probe
+        self.probed = None
+
+    def fires(self, item):
+        """
+        Parameters
+        ----------
+        item: _pytest.python.Function
+            the test which was just run
+
+        Returns
+        -------
+        bool
+        """
+        return (
+            self.check is not None
+            and item.nodeid not in self.refuted
+            and bool(self.check(item))
+        )
+
+    def refute(self, item):
+        """The target passed right after the test, the probe is ignored for it"""
+        self.refuted.add(item.nodeid)
+
+    def restore(self):
+        """
+        The pair of the probe doesn't reproduce, its culprit is refuted
+
+        Returns
+        -------
+        tuple[Collection, Bucket, _pytest.python.Function]
+            the collection, the bucket and the culprit which were replaced by the pair
+        """
+        collection, bucket, culprit = self.probed
+        self.probed = None
+        self.refute(culprit)
+        return collection, bucket, culprit
+
+
+class Hunt(object):
+    """
+    Runs steps of the hunt for the test which is coupled with the target:
+    chooses the mode, proposes buckets by the strategy and narrows them by verdicts
+    """
+
+    def __init__(self, config, strategy, probe=None):
+        self.config = config
+        self.report = HuntReport.from_config(config)
+        self.strategy = strategy
+        self.probe = Probe(probe)
+        self.runner = LocalRunner(
+            config,
+            Durations(config),
+            Verdict(
+                config.getoption("--sherlock-mode"),
+                config.getoption("--sherlock-slowdown"),
+            ),
+        )
+        # initialize via start
+        self.collection = None
+        self.candidates = []
+
+    @property
+    def reporter(self):
+        return self.config.pluginmanager.get_plugin("terminalreporter")
+
+    @property
+    def verdict(self):
+        return self.runner.verdict
+
+    @property
+    def workers(self):
+        workers = self.config.getoption("--sherlock-workers")
+        if self.config.getoption("--sherlock-queue"):
+            return max(workers, 2)  # one bucket is proposed and one is speculative
+        return workers
+
+    def start(self, candidates, target, suspects=(), reset=RESET_HARD, reusable=None):
+        """
+        Parameters
+        ----------
+        candidates: List[_pytest.python.Function]
+            tests which could be coupled with the target
+        target: _pytest.python.Function
+        suspects: List[_pytest.python.Function]
+            candidates which are checked first
+        reset: str
+        reusable: Optional[dict[str, Optional[Callable[[Any], bool]]]]
+
+        Returns
+        -------
+        Collection
+        """
+        self.candidates = candidates
+        self.collection = Collection(
+            self.strategy(candidates, suspects=suspects),
+            target,
+            reset=reset,
+            reusable=reusable,
+        )
+        if self.report:
+            self.report.start(
+                target.nodeid, len(candidates), self.collection.min, self.collection.max
+            )
+        return self.collection
+
+    def write_step(self, step, maximum, eta=None):
+        """
+        Write summary of steps
+        For Example:
+        _______________________________ Step [1 of 4]: _______________________________
+        ...
+
+        :param str|int step:
+        :param str|int maximum:
+        :param tuple[float, float]|None eta: expected and the worst duration of the rest
+        """
+        message = f"Step [{step} of {maximum}]:"
+        if eta is not None:
+            message = f"{message} {write_eta(eta)}"
+        self.reporter.write_sep("_", message, yellow=True, bold=True)
+
+    def reset_progress(self, session, items):
+        """
+        Patch progress for each step
+        100% should be all tests from collection + target test
+        For example:
+        _______________________________ Step [1 of 4]: _______________________________
+        tests/exmaple/test_c_delete.py::test_delete_random_param PASSED         [ 20%]
+        tests/exmaple/test_b_modify.py::test_modify_random_param PASSED         [ 40%]
+        tests/exmaple/test_c_delete.py::test_deleted_passed PASSED              [ 60%]
+        tests/exmaple/test_c_delete.py::test_do_not_delete PASSED               [ 80%]
+        tests/exmaple/test_all_read.py::test_read_params FAILED                 [100%]
+        _______________________________ Step [2 of 4]: _______________________________
+        tests/exmaple/test_c_delete.py::test_delete_random_param PASSED         [ 33%]
+        tests/exmaple/test_b_modify.py::test_modify_random_param PASSED         [ 66%]
+        tests/exmaple/test_all_read.py::test_read_params FAILED                 [100%]
+        ...
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        items: List[_pytest.python.Function]
+            bucket of tests
+        """
+        self.verdict.reset()
+        setattr(self.reporter, "_progress_nodeids_reported", set())
+        # candidates aren't reported in lean mode
+        lean = self.config.getoption("--sherlock-lean")
+        setattr(session, "testscollected", 1 if lean else len(items))
+
+    def get_eta(self):
+        """
+        Returns
+        -------
+        Optional[tuple[float, float]]
+            expected and the worst duration of the rest of the hunt by durations of tests
+        """
+        cost = self.runner.durations.make_cost(
+            self.collection.strategy.items, self.collection.target_test_method
+        )
+        if cost is None:
+            return None
+        return self.collection.strategy.estimate(cost)
+
+    def write_timeout(self):
+        if self.verdict.timed_out is None:
+            return False
+        self.reporter.write_line(
+            f"Timeout: {self.verdict.timed_out.nodeid} hung, the verdict of the step is failed",
+            red=True,
+        )
+        return True
+
+    def detect_mode(self, session):
+        """
+        Run the target alone (`auto` and `setter` modes):
+        when it fails alone it needs a state which is set up by a previous test,
+        the tree walk looks for the setter with inverted verdicts
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+
+        Returns
+        -------
+        bool
+            False when there is nothing to find (the target passes alone in setter mode)
+        """
+        target = self.collection.target_test_method
+        self.reporter.write_sep("_", "Check the target alone", yellow=True, bold=True)
+        self.reset_progress(session, [target])
+        started = time.time()
+        self.runner.run_bucket(
+            session, Bucket([], 0, 0, target), self.collection, self.probe
+        )
+        self.write_timeout()
+        failed = bool(self.verdict.failed_report)
+        if self.report:
+            self.report.add_step(0, [target.nodeid], failed, time.time() - started)
+        refresh_state(target)
+        if not failed:
+            if self.verdict.mode == MODE_SETTER:
+                self.reporter.write_line(
+                    "The target passes alone, there is no setter to find"
+                )
+                return False
+            self.verdict.mode = MODE_POLLUTER
+            self.reporter.write_line(
+                f"The target passes alone, try to find the test which breaks it "
+                f"in [{self.collection.min}-{self.collection.max}] steps"
+            )
+            return True
+
+        self.verdict.mode = MODE_SETTER
+        self.verdict.alone_report = self.verdict.failed_report
+        self.probe.check = (
+            None  # it detects polluted state, setters can't be pinpointed by it
+        )
+        self.collection = self.collection.restart(self.candidates, self.strategy)
+        if self.report:
+            self.report.set_mode(self.verdict.mode)
+        self.reporter.write_line(
+            f"The target fails alone, try to find the test which sets up its state "
+            f"in [{self.collection.min}-{self.collection.max}] steps"
+        )
+        return True
+
+    def measure_baseline(self, session):
+        """
+        Run the target alone `--sherlock-baseline-runs` times (slowdown mode),
+        the median of its durations is the baseline of verdicts
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+
+        Returns
+        -------
+        float
+            the median duration of the target in seconds
+        """
+        target = self.collection.target_test_method
+        verdict = self.verdict
+        self.reporter.write_sep("_", "Measure the target alone", yellow=True, bold=True)
+        durations = []
+        for _ in range(max(self.config.getoption("--sherlock-baseline-runs"), 1)):
+            self.reset_progress(session, [target])
+            setattr(self.reporter, "currentfspath", None)  # every run on its own line
+            self.runner.run_test(session, target, None)
+            refresh_state(target)
+            durations.append(verdict.duration or 0.0)
+        verdict.baseline = statistics.median(durations)
+        if self.report:
+            self.report.set_mode(verdict.mode)
+            self.report.set_baseline(durations, verdict.threshold)
+        self.reporter.write_line(
+            f"The target takes {verdict.baseline:.3f}s alone "
+            f"(median of {len(durations)} runs), a step fails "
+            f"when it's slower than {verdict.threshold:.3f}s"
+        )
+        if max(durations) > verdict.threshold:
+            self.reporter.write_line(
+                f"The target is slower than the threshold alone "
+                f"({max(durations):.3f}s), verdicts could be noisy",
+                yellow=True,
+            )
+        return verdict.baseline
+
+    def is_out_of_budget(self, spent, tested, bucket_size):
+        """
+        Parameters
+        ----------
+        spent: float
+            seconds since the start of the hunt
+        tested: int
+            amount of executed tests
+        bucket_size: int
+            amount of tests of the next step
+
+        Returns
+        -------
+        bool
+            True when the next step (estimated by average test duration) doesn't fit the budget
+        """
+        budget = self.config.getoption("--sherlock-budget")
+        if budget is None:
+            return False
+        estimate = spent / tested * bucket_size if tested else 0.0
+        return spent + estimate > budget
+
+    def write_partial(self):
+        """
+        Report the narrowest range of candidates found before the budget ran out
+        and save it with the target test as an order file to resume the hunt
+        """
+        narrowest = self.collection.get_narrowest()
+        target = self.collection.target_test_method
+        path = os.path.join(
+            make_cache_dir(self.config, History.CACHE_DIR), PARTIAL_ORDER
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{item.nodeid}\n" for item in narrowest + [target])
+        resume = f"pytest --flaky-test={target.nodeid} --sherlock-order={path}"
+
+        self.reporter.write_sep("_", "Sherlock budget is over", red=True, bold=True)
+        self.reporter.line(
+            f"Narrowed {len(self.candidates)} candidates down to {len(narrowest)} "
+            f"(range {self.collection.narrowest}, tree path `{self.collection.path or '-'}`)"
+        )
+        self.reporter.line(f"How to resume:\n{resume}")
+        if self.report:
+            self.report.partial(
+                [item.nodeid for item in narrowest],
+                self.collection.narrowest,
+                self.collection.path,
+                resume,
+            )
+        return path
+
+    def confirm_culprit(self, culprit, items, step):
+        """
+        Replace the tree by the single step with the culprit found by the probe
+
+        Parameters
+        ----------
+        culprit: _pytest.python.Function
+        items: Bucket
+            the current bucket
+        step: int
+            the current step
+
+        Returns
+        -------
+        Bucket
+            the culprit and the target
+        """
+        self.reporter.write_line(
+            f"Probe detected polluted state after {culprit.nodeid}"
+        )
+        self.probe.probed = (self.collection, items, culprit)
+        self.collection = self.collection.restart([culprit])
+        self.collection.max += step
+        bucket = next(self.collection)
+        self.collection.refresh(items, culprit)
+        return bucket
+
+    def refute_culprit(self, culprit, items):
+        """
+        The target passed right after the culprit of the probe: the probe is ignored
+        for it and the bucket is run again in full (its rest wasn't run)
+
+        Returns
+        -------
+        Bucket
+        """
+        self.reporter.write_line(
+            f"The target passed after {culprit.nodeid}, the probe was wrong, run the whole bucket"
+        )
+        self.probe.refute(culprit)
+        self.collection.refresh(items, items[0])
+        return items
+
+    def restore_probed(self):
+        """
+        The pair of the probe doesn't reproduce: the polluter is another test before
+        the culprit, the tree walk goes on from the probed bucket which failed
+
+        Returns
+        -------
+        Bucket
+        """
+        collection, bucket, culprit = self.probe.restore()
+        self.reporter.write_line(
+            f"The target passed after {culprit.nodeid} alone, continue the tree walk"
+        )
+        self.collection = collection
+        self.collection.bucket = bucket
+        return self.collection.send(True)
+
+    def hunt_in_parallel(self):
+        """
+        Find the polluter by buckets which are run concurrently in pytest subprocesses
+        (or by workers of the shared queue with `--sherlock-queue`),
+        the found pair is confirmed in the current process by the last step
+
+        Returns
+        -------
+        Optional[_pytest.python.Function]
+            the polluter, None when it wasn't found
+
+        Raises
+        ------
+        pytest_sherlock.parallel.WorkerError
+            a worker failed, the hunt could go on in the current process
+        """
+        target = self.collection.target_test_method
+        queue = self.config.getoption("--sherlock-queue")
+        rootdir = getattr(self.config, "rootpath", None) or self.config.rootdir
+        steps = itertools.count(1)
+
+        def on_verdict(nodeids, failed, duration):
+            step = next(steps)
+            timed_out = tuple(nodeids) in runner.timed_out
+            verdict = "timed out" if timed_out else "failed" if failed else "passed"
+            if self.verdict.mode == MODE_SLOWDOWN and not timed_out:
+                verdict = "was slow" if failed else "was fast"
+            self.reporter.line(
+                f"Worker step [{step}]: {len(nodeids) - 1} tests before the target, "
+                f"the target {verdict} ({duration:.2f}s)"
+            )
+            if self.report:
+                self.report.add_step(
+                    step, nodeids, failed, duration, timed_out=timed_out
+                )
+
+        if queue:
+            title = f"Send buckets to the queue {queue} ({self.workers} in flight)"
+        else:
+            title = f"Run buckets by {self.workers} workers"
+        self.reporter.write_sep("_", title, yellow=True, bold=True)
+        with tempfile.TemporaryDirectory(prefix="sherlock-") as directory:
+            if queue:
+                runner = QueueRunner(
+                    WorkQueue(queue),
+                    target.nodeid,
+                    limits=Limits(self.runner.get_timeout, self.verdict.threshold),
+                    polling=Polling(
+                        wait=self.config.getoption("--sherlock-queue-timeout"),
+                        on_wait=lambda: self.reporter.write_line(
+                            f"Buckets are waiting for workers of the queue {queue} "
+                            "(`pytest --sherlock-worker`)",
+                            yellow=True,
+                        ),
+                    ),
+                )
+            else:
+                runner = BucketRunner(
+                    str(rootdir),
+                    target.nodeid,
+                    directory,
+                    limits=Limits(self.runner.get_timeout, self.verdict.threshold),
+                )
+            polluter = ParallelHunt(
+                runner,
+                self.strategy(self.candidates, suspects=self.collection.suspects),
+                workers=self.workers,
+                on_verdict=on_verdict,
+                invert=self.verdict.mode == MODE_SETTER,
+            ).run()
+        if polluter is not None:
+            self.collection = self.collection.restart([polluter])
+        return polluter
+
+    def prepare(self, session):
+        """
+        Choose what to find before steps: the baseline of the target (slowdown mode),
+        the run of the target alone (`auto` and `setter` modes) and the hunt by workers
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+
+        Returns
+        -------
+        bool
+            False when there is nothing to find by steps in the current process
+        """
+        if self.verdict.mode == MODE_SLOWDOWN:
+            self.measure_baseline(session)
+        elif self.verdict.mode != MODE_POLLUTER and not self.detect_mode(session):
+            return False
+        if self.workers < 2:
+            return True
+        try:
+            return self.hunt_in_parallel() is not None
+        except WorkerError as err:
+            self.reporter.write_line(
+                f"Worker failed: {err}, continue the hunt in the current process",
+                yellow=True,
+            )
+        return True
+
+    def run_step(self, session, items, step):
+        """
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        items: Bucket
+            bucket of tests, the target is the last one
+        step: int
+
+        Returns
+        -------
+        tuple[bool, Optional[_pytest.python.Function]]
+            verdict of the step and the culprit which was detected by the probe
+        """
+        eta = self.get_eta()
+        if eta is not None and self.report:
+            self.report.update_eta(*eta)
+        self.write_step(step, self.collection.max, eta)
+        self.reset_progress(session, items)
+        started = time.time()
+        culprit = self.runner.run_bucket(session, items, self.collection, self.probe)
+        self.write_timeout()
+        failed = self.verdict.is_failed()
+        if self.report:
+            self.report.add_step(
+                step,
+                items.nodeids,
+                failed,
+                time.time() - started,
+                timed_out=self.verdict.timed_out is not None,
+            )
+        return failed, culprit
+
+    def next_bucket(self, items, step, failed, culprit=None):
+        """
+        Parameters
+        ----------
+        items: Bucket
+            the current bucket
+        step: int
+        failed: bool
+            verdict of the current step
+        culprit: Optional[_pytest.python.Function]
+            the test after which the probe fired
+
+        Returns
+        -------
+        Bucket
+
+        Raises
+        ------
+        StopIteration
+            the current bucket is the last one
+        """
+        guilty = self.verdict.is_guilty(failed)
+        if culprit is not None:
+            if guilty:
+                return self.confirm_culprit(culprit, items, step)
+            return self.refute_culprit(culprit, items)
+        if self.probe.probed is not None and not guilty:
+            return self.restore_probed()
+        # shift left if the culprit is in the bucket or shifts right otherwise
+        return self.collection.send(guilty)
+
+    def run(self, session, steps):
+        """
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        steps: pytest_sherlock.sherlock.Steps
+            steps of the current run are added to them
+
+        Returns
+        -------
+        Optional[tuple[Bucket, bool]]
+            the last bucket (empty when there is nothing to find) with its verdict,
+            None when the budget is over
+        """
+        if not self.prepare(session):
+            return Bucket([], 0, 0), False
+
+        step = tested = 0
+        started = time.time()
+        items = next(self.collection)
+        while items:
+            step += 1
+            if self.is_out_of_budget(time.time() - started, tested, len(items)):
+                self.write_partial()
+                return None
+            tested += len(items)
+            steps.add(items)
+            failed, culprit = self.run_step(session, items, step)
+            try:
+                next_items = self.next_bucket(items, step, failed, culprit)
+            except StopIteration as err:
+                if len(items) != 2:  # the last iteration must contain two tests
+                    raise SherlockError("Something is going wrong") from err
+                return items, failed
+            items = next_items
+        return items, False
@@ -0,0 +1,448 @@
+from __future__ import absolute_import
+
+import asyncio
+import gc
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from pytest_sherlock.scan import (
+    ORDER_ENV,
+    make_paths,
+    make_worker_command,
+    run_worker,
+    write_order,
+)
+
+LEAKS_ENV = "SHERLOCK_LEAKS_FILE"
+RSS = "rss"
+FDS = "fds"
+THREADS = "threads"
+CHILDREN = "children"
+METRICS = (FDS, THREADS, CHILDREN, RSS)
+MB = 1024 * 1024
+SHRINK_LIMIT = 16
+
+
+def read_rss():
+    """
+    Returns
+    -------
+    Optional[int]
+        resident memory of the current process in bytes
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:  # Windows
+        return None
+    # the peak instead of the current one, kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_fds():
+    """
+    Returns
+    -------
+    Optional[int]
+        open file descriptors of the current process
+    """
+    for directory in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(directory):
+            return len(os.listdir(directory))
+    return None
+
+
+def count_children():
+    """
+    Returns
+    -------
+    Optional[int]
+        child processes (zombies as well) of the current process
+    """
+    pid = os.getpid()
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return None
+    try:
+        children = set()
+        for task in tasks:
+            with open(f"/proc/{pid}/task/{task}/children", "r", encoding="ascii") as f:
+                children.update(f.read().split())
+        return len(children)
+    except OSError:
+        pass  # the kernel is built without CONFIG_PROC_CHILDREN
+    count = 0
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(
+                f"/proc/{name}/stat", "r", encoding="utf-8", errors="replace"
+            ) as f:
+                # the name of the process in brackets could contain spaces
+                ppid = f.read().rsplit(")", 1)[1].split()[1]
+        except (OSError, IndexError):
+            continue
+        if ppid == str(pid):
+            count += 1
+    return count
+
+
+def sample(collect=False):
+    """
+    Parameters
+    ----------
+    collect: bool
+        run the garbage collector first, unreachable files and sockets are closed by it
+
+    Returns
+    -------
+    dict[str, Optional[int]]
+        metric -> value, None when the platform doesn't provide it
+    """
+    if collect:
+        gc.collect()
+    return {
+        FDS: count_fds(),
+        THREADS: threading.active_count(),
+        CHILDREN: count_children(),
+        RSS: read_rss(),
+    }
+
+
+def diff(before, after):
+    """
+    Returns
+    -------
+    dict[str, int]
+        metric -> growth, metrics which weren't sampled are skipped
+    """
+    return {
+        metric: after[metric] - before[metric]
+        for metric in METRICS
+        if before.get(metric) is not None and after.get(metric) is not None
+    }
+
+
+def format_delta(metric, delta):
+    if metric == RSS:
+        return f"{delta / MB:+.1f} MB"
+    return f"{delta:+d} {metric}"
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtestloop(session):
+    """
+    Worker side of the leak hunt (`-p pytest_sherlock.leaks`): write growth of metrics
+    by the run (after collection, session fixtures are finished) to `SHERLOCK_LEAKS_FILE`
+    """
+    _ = session  # to make pylint happy
+    path = os.environ.get(LEAKS_ENV)
+    if not path:
+        yield
+        return
+    before = sample(collect=True)
+    yield
+    delta = diff(before, sample(collect=True))  # before the file is opened
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(delta, f)
+
+
+class GroupRuns(object):
+    """
+    Runs of groups of tests by worker processes during a hunt,
+    a group is run once for all metrics
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.futures = {}
+        self.counter = itertools.count(1)
+
+    def next_files(self):
+        """
+        Returns
+        -------
+        tuple[str, str]
+            the order file and the leaks file of the next group
+        """
+        name = f"group-{next(self.counter)}"
+        return (
+            os.path.join(self.directory, f"{name}.txt"),
+            os.path.join(self.directory, f"{name}.json"),
+        )
+
+    def get(self, nodeids, measure):
+        """
+        Parameters
+        ----------
+        nodeids: List[str]
+        measure: Callable[[List[str]], Awaitable[dict[str, int]]]
+            runs the group which wasn't run yet
+
+        Returns
+        -------
+        asyncio.Future
+            growth of metrics by the group
+        """
+        key = tuple(nodeids)
+        if key not in self.futures:
+            self.futures[key] = asyncio.ensure_future(measure(nodeids))
+        return self.futures[key]
+
+
+class LeakHunter(object):
+    """
+    Runs the suite with sampling of open files, threads, child processes and memory
+    around every test, leaks of the whole run are confirmed by bisection of the tests
+    in worker processes: a group which leaks is split until single tests
+    or groups which leak only together
+    """
+
+    def __init__(self, config):
+        self.config = config
+        workers = config.getoption("--sherlock-workers")
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.thresholds = {
+            FDS: 1,
+            THREADS: 1,
+            CHILDREN: 1,
+            RSS: int(config.getoption("--sherlock-leak-rss") * MB),
+        }
+        self.per_test = OrderedDict()
+        self.totals = {}
+        self.leaks = []
+        # runs of groups by the current hunt
+        self.runs = GroupRuns(None)
+
+    @property
+    def rootdir(self):
+        return str(getattr(self.config, "rootpath", None) or self.config.rootdir)
+
+    @property
+    def report_path(self):
+        return self.config.getoption("--sherlock-report")
+
+    async def _measure(self, semaphore, nodeids):
+        order_path, leaks_path = self.runs.next_files()
+        env = dict(os.environ)
+        env[ORDER_ENV] = write_order(order_path, nodeids)
+        env[LEAKS_ENV] = leaks_path
+        command = make_worker_command(
+            [], make_paths(nodeids), plugins=["pytest_sherlock.leaks"]
+        )
+        await run_worker(semaphore, command, self.rootdir, env=env)
+        try:
+            with open(leaks_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}  # the worker crashed, nothing is confirmed by it
+
+    def measure(self, semaphore, nodeids):
+        """
+        Returns
+        -------
+        asyncio.Future
+            growth of metrics by the group run in a fresh process,
+            a group is run once for all metrics
+        """
+        return self.runs.get(nodeids, lambda group: self._measure(semaphore, group))
+
+    async def bisect(self, semaphore, metric, nodeids):
+        """
+        Parameters
+        ----------
+        semaphore: asyncio.Semaphore
+        metric: str
+        nodeids: List[str]
+
+        Returns
+        -------
+        List[tuple[List[str], int]]
+            groups which leak the metric with their growth: single tests
+            or the smallest groups which leak only together
+        """
+        delta = (await self.measure(semaphore, nodeids)).get(metric, 0)
+        if delta < self.thresholds[metric]:
+            return []
+        if len(nodeids) == 1:
+            return [(nodeids, delta)]
+        middle = len(nodeids) // 2
+        left, right = await asyncio.gather(
+            self.bisect(semaphore, metric, nodeids[:middle]),
+            self.bisect(semaphore, metric, nodeids[middle:]),
+        )
+        if not left and not right:
+            return [
+                await self.shrink(semaphore, metric, nodeids, delta)
+            ]  # a cumulative leak
+        return left + right
+
+    async def shrink(self, semaphore, metric, nodeids, delta, limit=SHRINK_LIMIT):
+        """
+        Drop tests which the cumulative leak doesn't need one by one
+
+        Parameters
+        ----------
+        semaphore: asyncio.Semaphore
+        metric: str
+        nodeids: List[str]
+            the group which leaks, but its halves don't
+        delta: int
+            growth of the metric by the group
+        limit: int
+            bigger groups aren't shrunk, it costs a run per test
+
+        Returns
+        -------
+        tuple[List[str], int]
+            the smaller group which still leaks with its growth
+        """
+        if len(nodeids) > limit:
+            return nodeids, delta
+        for nodeid in list(nodeids):
+            rest = [n for n in nodeids if n != nodeid]
+            rest_delta = (await self.measure(semaphore, rest)).get(metric, 0)
+            if rest_delta >= self.thresholds[metric]:
+                nodeids, delta = rest, rest_delta
+        return nodeids, delta
+
+    async def hunt(self, nodeids):
+        """
+        Parameters
+        ----------
+        nodeids: List[str]
+            tests in the order of the run
+
+        Returns
+        -------
+        List[dict]
+            confirmed leaks ranked by metric and growth
+        """
+        semaphore = asyncio.Semaphore(self.workers)
+        metrics = [m for m in METRICS if self.totals.get(m, 0) >= self.thresholds[m]]
+        found = await asyncio.gather(
+            *(self.bisect(semaphore, metric, nodeids) for metric in metrics)
+        )
+        leaks = []
+        for metric, groups in zip(metrics, found):
+            for group, delta in groups:
+                leaks.append(
+                    {
+                        "metric": metric,
+                        "tests": list(group),
+                        "delta": delta,
+                        "cumulative": len(group) > 1,
+                        "in_run": sum(
+                            self.per_test.get(n, {}).get(metric, 0) for n in group
+                        ),
+                    }
+                )
+        leaks.sort(key=lambda leak: (METRICS.index(leak["metric"]), -leak["delta"]))
+        return leaks
+
+    def top_per_test(self, metric, limit=5):
+        """
+        Returns
+        -------
+        List[tuple[str, int]]
+            tests with the biggest growth of the metric in the run (not confirmed)
+        """
+        grown = [
+            (nodeid, deltas[metric])
+            for nodeid, deltas in self.per_test.items()
+            if deltas.get(metric, 0) >= self.thresholds[metric]
+        ]
+        return sorted(grown, key=lambda pair: -pair[1])[:limit]
+
+    def write_summary(self, reporter):
+        reporter.write_sep("=", "sherlock leaks", bold=True)
+        totals = ", ".join(
+            format_delta(metric, self.totals[metric])
+            for metric in METRICS
+            if metric in self.totals
+        )
+        reporter.line(f"Growth by the run: {totals or 'metrics are not available'}")
+        if not self.leaks:
+            reporter.line("Leaks were not confirmed by workers")
+        for rank, leak in enumerate(self.leaks, 1):
+            kind = "together" if leak["cumulative"] else "alone"
+            reporter.line(
+                f"{rank}. {format_delta(leak['metric'], leak['delta'])} "
+                f"by {len(leak['tests'])} tests {kind}:"
+            )
+            for nodeid in leak["tests"]:
+                reporter.line(f"    {nodeid}")
+        for metric in METRICS:
+            top = self.top_per_test(metric)
+            if top:
+                reporter.line(
+                    f"The biggest growth of {metric} after a test in the run:"
+                )
+                for nodeid, delta in top:
+                    reporter.line(f"    {format_delta(metric, delta)} {nodeid}")
+
+    def write_report(self):
+        if not self.report_path:
+            return False
+        tmp_path = f"{self.report_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "totals": self.totals,
+                    "thresholds": self.thresholds,
+                    "leaks": self.leaks,
+                    "per_test": self.per_test,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.report_path)
+        return True
+
+    def pytest_report_collectionfinish(self, config, items):
+        _ = config  # to make pylint happy
+        return (
+            f"Hunt leaks of {len(items)} tests, confirm them by {self.workers} workers"
+        )
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        _ = nextitem  # to make pylint happy
+        before = sample()
+        yield
+        self.per_test[item.nodeid] = diff(before, sample())
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtestloop(self, session):
+        if session.config.option.collectonly:
+            yield
+            return
+        before = sample(collect=True)
+        yield
+        self.totals = diff(before, sample(collect=True))
+        nodeids = [item.nodeid for item in session.items]
+        if nodeids:
+            with tempfile.TemporaryDirectory(prefix="sherlock-leaks-") as directory:
+                self.runs = GroupRuns(directory)
+                self.leaks = asyncio.run(self.hunt(nodeids))
+        session.testsfailed += len(self.leaks)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.config.option.collectonly:
+            return
+        self.write_summary(terminalreporter)
+        self.write_report()
@@ -0,0 +1,205 @@
+from __future__ import absolute_import
+
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from pytest_sherlock.recorder import SUFFIX, get_sessions, get_worker, read_log
+
+OUTCOMES = "PASSED|FAILED|ERROR|SKIPPED|XFAIL|XPASS|FLAKY|RERUN"
+# tests/test_one.py::test_first PASSED                       [ 10%]
+VERBOSE_LINE = re.compile(
+    rf"^(?:\[(?P<worker>gw\d+)\]\s+)?(?P<nodeid>\S+::\S+)\s+(?:{OUTCOMES})\b"
+)
+# [gw0] [ 10%] PASSED tests/test_one.py::test_first
+XDIST_LINE = re.compile(
+    rf"^(?:\[(?P<worker>gw\d+)\]\s+)?(?:\[\s*\d+%\]\s+)?(?:{OUTCOMES})\s+(?P<nodeid>\S+::\S+)"
+)
+# 0.51s call     tests/test_one.py::test_first (`--durations`)
+DURATION_LINE = re.compile(
+    r"^(?P<duration>\d+(?:\.\d+)?)s\s+(?:setup|call|teardown)\s+(?P<nodeid>\S+::\S+)"
+)
+# the short test summary (`-rA`) is grouped by outcome, it isn't an execution order
+SUMMARY_LINE = re.compile(r"^=+ short test summary info =+$")
+DEFAULT_WORKER = "main"
+
+
+def junit_key(nodeid):
+    """
+    The same names as pytest uses for JUnit XML report
+
+    Parameters
+    ----------
+    nodeid: str
+        'tests/test_one.py::TestOne::test_first[1]'
+
+    Returns
+    -------
+    tuple[str, str]
+        ('tests.test_one.TestOne', 'test_first[1]')
+    """
+    path, bracket, params = nodeid.partition("[")
+    names = path.split("::")
+    names[0] = re.sub(r"\.py$", "", names[0].replace("/", "."))
+    names[-1] += bracket + params
+    return ".".join(names[:-1]), names[-1]
+
+
+class RecordedOrder(object):
+    """
+    Order of tests how they were executed (by every worker)
+    """
+
+    def __init__(self, workers=None, junit=False, durations=None):
+        # worker name -> list of test ids (nodeid or junit `classname::name`)
+        self.workers = workers or OrderedDict()
+        self.junit = junit
+        # test id -> recorded duration in seconds
+        self.durations = durations or {}
+
+    def key(self, nodeid):
+        """Test id of the nodeid in the recorded order"""
+        return "::".join(junit_key(nodeid)) if self.junit else nodeid
+
+    @classmethod
+    def read(cls, path):
+        """
+        Supports JUnit XML report, verbose pytest log (`-v` output),
+        plain order file with a nodeid per line and logs of `--sherlock-record`
+        (a single log or a directory with logs, the last session is used)
+
+        Parameters
+        ----------
+        path: str
+
+        Returns
+        -------
+        RecordedOrder
+        """
+        if os.path.isdir(path):
+            sessions = get_sessions(path)
+            return cls.from_logs(sessions[-1] if sessions else [])
+        if path.endswith(SUFFIX):
+            return cls.from_logs([path])
+        if path.endswith(".xml"):
+            return cls.from_junit(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_lines(f)
+
+    @classmethod
+    def from_logs(cls, paths):
+        """
+        Parameters
+        ----------
+        paths: List[str]
+            binary logs of `--sherlock-record` (one per worker)
+
+        Returns
+        -------
+        RecordedOrder
+        """
+        workers = OrderedDict()
+        for path in paths:
+            workers[get_worker(path)] = [nodeid for nodeid, _ in read_log(path)]
+        return cls(workers)
+
+    @classmethod
+    def from_junit(cls, path):
+        workers, durations = OrderedDict([(DEFAULT_WORKER, [])]), {}
+        for testcase in ET.parse(path).getroot().iter("testcase"):
+            key = f"{testcase.get('classname', '')}::{testcase.get('name', '')}"
+            workers[DEFAULT_WORKER].append(key)
+            if testcase.get("time"):
+                durations[key] = float(testcase.get("time"))
+        return cls(workers, junit=True, durations=durations)
+
+    @classmethod
+    def from_lines(cls, lines):
+        workers, durations = OrderedDict(), {}
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if SUMMARY_LINE.match(line):
+                break
+            match = DURATION_LINE.match(line)
+            if match:
+                nodeid = match.group("nodeid")
+                durations[nodeid] = durations.get(nodeid, 0.0) + float(
+                    match.group("duration")
+                )
+                continue
+            match = VERBOSE_LINE.match(line) or XDIST_LINE.match(line)
+            if match:
+                worker, nodeid = match.group("worker"), match.group("nodeid")
+            elif " " not in line:
+                worker, nodeid = None, line
+            else:
+                continue  # any other log lines
+            workers.setdefault(worker or DEFAULT_WORKER, []).append(nodeid)
+        return cls(workers, durations=durations)
+
+    def get_sequence(self, target):
+        """
+        Parameters
+        ----------
+        target: str
+            nodeid of the target test
+
+        Returns
+        -------
+        List[str]
+            tests of the worker which executed the target test (without duplicates)
+        """
+        key = self.key(target)
+        sequence = next(
+            (tests for tests in self.workers.values() if key in tests),
+            next(iter(self.workers.values()), []),
+        )
+        return list(OrderedDict.fromkeys(sequence))
+
+    def resolve(self, items, target):
+        """
+        Parameters
+        ----------
+        items: List[_pytest.python.Function]
+            collected tests
+        target: _pytest.python.Function
+
+        Returns
+        -------
+        List[_pytest.python.Function]
+            collected tests which were executed before the target test in recorded order
+        """
+        if self.junit:
+            by_key = {"::".join(junit_key(item.nodeid)): item for item in items}
+        else:
+            by_key = {item.nodeid: item for item in items}
+
+        target_key = self.key(target.nodeid)
+        ordered = []
+        for key in self.get_sequence(target.nodeid):
+            if key == target_key:
+                return ordered
+            if key in by_key:
+                ordered.append(by_key[key])
+        return None
+
+    def get_durations(self, items):
+        """
+        Parameters
+        ----------
+        items: List[_pytest.python.Function]
+            collected tests
+
+        Returns
+        -------
+        dict[str, float]
+            nodeid -> recorded duration (JUnit `time` or `--durations` of the log)
+        """
+        return {
+            item.nodeid: self.durations[self.key(item.nodeid)]
+            for item in items
+            if self.key(item.nodeid) in self.durations
+        }
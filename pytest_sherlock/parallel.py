@@ -0,0 +1,231 @@
+from __future__ import absolute_import
+
+import asyncio
+import itertools
+import os
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+
+from pytest_sherlock.order import junit_key
+from pytest_sherlock.scan import ORDER_ENV, make_paths, make_worker_command, write_order
+
+
+class WorkerError(Exception):
+    pass
+
+
+class Limits(object):
+    """
+    Limits of buckets which are run by workers, a bucket over them fails
+    """
+
+    def __init__(self, timeout=None, slower_than=None):
+        """
+        Parameters
+        ----------
+        timeout: Optional[Callable[[List[str]], Optional[float]]]
+            time limit of the bucket in seconds, a hung bucket is killed
+            and its verdict is failed
+        slower_than: Optional[float]
+            the verdict is failed when the call of the target takes longer (seconds),
+            instead of its outcome
+        """
+        self.timeout = timeout
+        self.slower_than = slower_than
+
+    def get_timeout(self, nodeids):
+        return self.timeout(nodeids) if self.timeout is not None else None
+
+    def is_slow(self, duration):
+        return self.slower_than is not None and duration > self.slower_than
+
+
+class BucketRunner(object):
+    """
+    Runs a bucket of tests (with the target test at the end) in a fresh pytest subprocess,
+    the bucket is passed by the order file (`-p pytest_sherlock.scan`), not by arguments
+    """
+
+    def __init__(self, rootdir, target, directory, args=(), limits=None):
+        """
+        Parameters
+        ----------
+        rootdir: str
+            nodeids are relative to it
+        target: str
+            nodeid of the target test
+        directory: str
+            where JUnit XML reports of buckets are written
+        args: Iterable[str]
+            extra arguments of pytest
+        limits: Optional[Limits]
+        """
+        self.rootdir = rootdir
+        self.target = target
+        self.directory = directory
+        self.args = list(args)
+        self.limits = limits or Limits()
+        # buckets (tuples of nodeids) which were killed by the timeout
+        self.timed_out = set()
+        self._counter = itertools.count(1)
+
+    def make_command(self, nodeids, junit_path):
+        args = [f"--junitxml={junit_path}", *self.args]
+        if self.limits.slower_than is not None:
+            # `time` of JUnit XML is setup, call and teardown by default
+            args += ["-o", "junit_duration_report=call"]
+        return make_worker_command(args, make_paths(nodeids))
+
+    def read_verdict(self, junit_path):
+        """
+        Returns
+        -------
+        bool
+            True when the target test failed (or it was slower than `slower_than`)
+        """
+        classname, name = junit_key(self.target)
+        try:
+            root = ET.parse(junit_path).getroot()
+        except (OSError, ET.ParseError) as err:
+            raise WorkerError(f"Worker didn't write the report: {junit_path}") from err
+        for testcase in root.iter("testcase"):
+            if testcase.get("classname") == classname and testcase.get("name") == name:
+                if self.limits.slower_than is not None:
+                    return self.limits.is_slow(float(testcase.get("time") or 0.0))
+                return any(child.tag in ("failure", "error") for child in testcase)
+        raise WorkerError(f"Worker didn't run the target test: {self.target}")
+
+    async def run(self, nodeids):
+        """
+        Parameters
+        ----------
+        nodeids: List[str]
+            tests of the bucket, the target is the last one
+
+        Returns
+        -------
+        bool
+            True when the target test failed or the bucket timed out
+        """
+        name = f"bucket-{next(self._counter)}"
+        junit_path = os.path.join(self.directory, f"{name}.xml")
+        env = dict(os.environ)
+        env[ORDER_ENV] = write_order(
+            os.path.join(self.directory, f"{name}.txt"), nodeids
+        )
+        process = await asyncio.create_subprocess_exec(
+            *self.make_command(nodeids, junit_path),
+            cwd=self.rootdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            await asyncio.wait_for(process.wait(), self.limits.get_timeout(nodeids))
+        except (asyncio.CancelledError, asyncio.TimeoutError) as err:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            if isinstance(err, asyncio.CancelledError):
+                raise
+            self.timed_out.add(tuple(nodeids))
+            return True  # a hang of the target counts as its failure
+        try:
+            return self.read_verdict(junit_path)
+        except WorkerError as err:
+            raise WorkerError(
+                f"{err} (the bucket of {len(nodeids)} tests from {nodeids[0]}, "
+                f"exit code {process.returncode})"
+            ) from err
+
+
+class ParallelHunt(object):
+    """
+    Drives a search strategy with up to `workers` buckets in flight:
+    besides the proposed bucket idle workers run speculative buckets of the strategy,
+    runs which the strategy doesn't want anymore after a verdict are cancelled
+    """
+
+    def __init__(self, runner, strategy, workers=2, on_verdict=None, invert=False):
+        """
+        Parameters
+        ----------
+        runner: BucketRunner
+            it runs buckets with its target at the end
+        strategy: pytest_sherlock.strategy.Strategy
+        workers: int
+        on_verdict: Optional[Callable[[List[str], bool, float], Any]]
+            called with nodeids, verdict and duration of every used bucket
+        invert: bool
+            the culprit is in the bucket when the target passed (looking for a setter)
+        """
+        self.runner = runner
+        self.strategy = strategy
+        self.workers = max(workers, 1)
+        self.on_verdict = on_verdict
+        self.invert = invert
+        self.tasks = {}
+        self.cancelled = 0
+
+    @staticmethod
+    def key(bucket):
+        return id(bucket.items), bucket.start, bucket.stop
+
+    async def _timed(self, nodeids):
+        started = time.time()
+        failed = await self.runner.run(nodeids)
+        return failed, time.time() - started
+
+    def schedule(self, bucket):
+        key = self.key(bucket)
+        if key not in self.tasks:
+            nodeids = [*bucket.nodeids, self.runner.target]
+            self.tasks[key] = (nodeids, asyncio.ensure_future(self._timed(nodeids)))
+        return self.tasks[key]
+
+    def in_flight(self):
+        return sum(1 for _, task in self.tasks.values() if not task.done())
+
+    def speculate(self):
+        """Fill idle workers by buckets which could be needed by the next verdicts"""
+        for bucket in self.strategy.speculate(self.workers):
+            if self.in_flight() >= self.workers:
+                return
+            self.schedule(bucket)
+
+    def cancel_unwanted(self, wanted):
+        for key in list(self.tasks):
+            if key in wanted:
+                continue
+            _, task = self.tasks.pop(key)
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+
+    async def hunt(self):
+        """
+        Returns
+        -------
+        Optional[_pytest.python.Function]
+            the polluter
+        """
+        try:
+            bucket = self.strategy.propose()
+            while bucket is not None:
+                nodeids, task = self.schedule(bucket)
+                self.speculate()
+                failed, duration = await task
+                if self.on_verdict is not None:
+                    self.on_verdict(nodeids, failed, duration)
+                self.strategy.feed(bucket, failed != self.invert)
+                bucket = self.strategy.propose()
+                wanted = [bucket] if bucket is not None else []
+                wanted += self.strategy.speculate(self.workers)
+                self.cancel_unwanted({self.key(b) for b in wanted})
+            return self.strategy.answer()
+        finally:
+            self.cancel_unwanted(set())
+
+    def run(self):
+        return asyncio.run(self.hunt())
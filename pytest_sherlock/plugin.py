@@ -1,8 +1,37 @@
 from __future__ import absolute_import
 
-from pytest_sherlock.sherlock import Sherlock
+import argparse
+import re
 
-PLUGIN_NAME = "pytest_sherlock.plugin"
+# the engine is imported only inside of `pytest_configure` when it's requested,
+# the plugin is loaded by every pytest run and must stay cheap when it's inactive
+# the module itself is registered as `pytest_sherlock.plugin` when it's loaded by `-p`
+SHERLOCK_NAME = "pytest_sherlock.sherlock"
+RECORDER_NAME = "pytest_sherlock.recorder"
+SCANNER_NAME = "pytest_sherlock.scan"
+WORKER_NAME = "pytest_sherlock.work_queue"
+LEAKS_NAME = "pytest_sherlock.leaks"
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """
+    Parameters
+    ----------
+    value: str
+        '90', '90s', '30m', '1.5h'
+
+    Returns
+    -------
+    float
+        seconds
+    """
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*$", value)
+    if not match or float(match.group(1)) <= 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid duration {value!r}, expected number with s, m or h suffix: `30m`"
+        )
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
 
 
 def pytest_addoption(parser):
@@ -20,17 +49,295 @@ def pytest_addoption(parser):
         type=int,
         help="Reproduce from exists steps `Step [1 of ...]`",
     )
+    group.addoption(
+        "--sherlock-no-history",
+        action="store_true",
+        dest="sherlock_no_history",
+        default=False,
+        help="Don't use and don't save history of found coupled tests",
+    )
+    group.addoption(
+        "--sherlock-report",
+        action="store",
+        dest="sherlock_report",
+        metavar="path",
+        help="Write machine-readable report of the hunt (JSON or SARIF by `.sarif` extension)",
+    )
+    group.addoption(
+        "--sherlock-reset",
+        action="store",
+        dest="sherlock_reset",
+        choices=("soft", "hard"),
+        default="soft",
+        help="How to reset state between steps: "
+        "`soft` finishes only fixtures touched by the previous step or failed ones (default), "
+        "`hard` tears down all fixtures including session scoped",
+    )
+    group.addoption(
+        "--sherlock-repro",
+        action="store",
+        dest="sherlock_repro",
+        metavar="dir",
+        nargs="?",
+        const="",
+        help="Write standalone reproduction of found coupled tests "
+        "(only their sources and fixtures they need) to the directory, "
+        "temporary directory by default",
+    )
+    group.addoption(
+        "--sherlock-order",
+        action="store",
+        dest="sherlock_order",
+        metavar="path",
+        help="Search in recorded execution order instead of collected one: "
+        "JUnit XML report, verbose pytest log (`-v` output), file with a nodeid per line, "
+        "log of `--sherlock-record` or `last` to use the last recorded session",
+    )
+    group.addoption(
+        "--sherlock-record",
+        action="store_true",
+        dest="sherlock_record",
+        default=False,
+        help="Record executed order of tests to pytest cache for future `--sherlock-order=last`",
+    )
+    group.addoption(
+        "--sherlock-trace",
+        action="store_true",
+        dest="sherlock_trace",
+        default=False,
+        help="Re-run found coupled tests with tracing of the victim and show "
+        "the first env variable, file, attribute or variable which differs from a clean run",
+    )
+    group.addoption(
+        "--sherlock-budget",
+        action="store",
+        dest="sherlock_budget",
+        metavar="duration",
+        type=parse_duration,
+        help="Time budget of the hunt (`90s`, `30m`, `1h`), when it runs out the narrowest "
+        "range of candidates is reported and saved to resume via `--sherlock-order`",
+    )
+    group.addoption(
+        "--sherlock-timeout",
+        action="store",
+        dest="sherlock_timeout",
+        metavar="duration",
+        type=parse_duration,
+        help="Time limit of a step (`30s`, `5m`): a hung bucket (a deadlock of the target "
+        "after a polluter) is stopped and counts as failed, the limit grows "
+        "with expected duration of the bucket by `--sherlock-timeout-factor`",
+    )
+    group.addoption(
+        "--sherlock-timeout-factor",
+        action="store",
+        dest="sherlock_timeout_factor",
+        metavar="num",
+        type=float,
+        default=3.0,
+        help="A bucket times out after the factor times its expected duration "
+        "by previous runs, but not earlier than `--sherlock-timeout`, 3 by default",
+    )
+    group.addoption(
+        "--sherlock-workers",
+        action="store",
+        dest="sherlock_workers",
+        metavar="num",
+        type=int,
+        default=0,
+        help="Run buckets concurrently by pytest subprocesses, idle workers run buckets "
+        "of possible next steps, the found pair is confirmed in the current process",
+    )
+    group.addoption(
+        "--sherlock-probe",
+        action="store",
+        dest="sherlock_probe",
+        metavar="module:callable",
+        help="Cheap health check which is called with every test of a bucket after it "
+        "and returns True when state is polluted, the bucket ends on the first detection",
+    )
+    group.addoption(
+        "--sherlock-strategy",
+        action="store",
+        dest="sherlock_strategy",
+        metavar="name",
+        default="binary",
+        help="Search strategy: `binary` (default), `scope` (splits only on boundaries of "
+        "packages, modules, classes and functions), name of `pytest_sherlock.strategies` "
+        "entry point or `package.module:Class` path",
+    )
+    group.addoption(
+        "--sherlock-mode",
+        action="store",
+        dest="sherlock_mode",
+        choices=("auto", "polluter", "setter", "slowdown"),
+        default="polluter",
+        help="`polluter` - find the test which breaks the target (default), "
+        "`setter` - find the test which sets up state the target needs (it fails alone), "
+        "`slowdown` - find the test after which the target is slow, "
+        "`auto` - run the target alone first and choose the mode by its verdict",
+    )
+    group.addoption(
+        "--sherlock-slowdown",
+        action="store",
+        dest="sherlock_slowdown",
+        metavar="num",
+        type=float,
+        default=3.0,
+        help="Slowdown mode: a step fails when the target is slower than the factor "
+        "times its baseline, 3 by default",
+    )
+    group.addoption(
+        "--sherlock-baseline-runs",
+        action="store",
+        dest="sherlock_baseline_runs",
+        metavar="num",
+        type=int,
+        default=5,
+        help="Slowdown mode: the baseline is the median duration of the target "
+        "run alone the number of times, 5 by default",
+    )
+    group.addoption(
+        "--sherlock-coverage",
+        action="store",
+        dest="sherlock_coverage",
+        metavar="path",
+        help="Keep only candidates which share covered code with the target by `.coverage` file "
+        "with per-test contexts (`pytest --cov --cov-context=test`)",
+    )
+    group.addoption(
+        "--sherlock-coverage-by",
+        action="store",
+        dest="sherlock_coverage_by",
+        choices=("files", "lines"),
+        default="files",
+        help="`files` - a candidate covers any file of the target (default), "
+        "`lines` - a candidate covers any line of the target",
+    )
+    group.addoption(
+        "--sherlock-queue",
+        action="store",
+        dest="sherlock_queue",
+        metavar="dir",
+        help="Send buckets of the hunt to workers (`--sherlock-worker`) through the shared "
+        "directory, `--sherlock-workers` buckets are in flight (2 by default)",
+    )
+    group.addoption(
+        "--sherlock-queue-timeout",
+        action="store",
+        dest="sherlock_queue_timeout",
+        type=parse_duration,
+        default=600.0,
+        metavar="duration",
+        help="The hunt continues in the current process when no worker claims a bucket "
+        "of the queue for the duration: `90s`, `10m` (default)",
+    )
+    group.addoption(
+        "--sherlock-worker",
+        action="store",
+        dest="sherlock_worker",
+        metavar="dir",
+        help="Serve buckets of hunts from the shared directory instead of running tests "
+        "(any host with the same checkout)",
+    )
+    group.addoption(
+        "--sherlock-worker-idle",
+        action="store",
+        dest="sherlock_worker_idle",
+        type=parse_duration,
+        default=600.0,
+        metavar="duration",
+        help="The worker stops when the queue is empty for the duration: `90s`, `10m` (default)",
+    )
+    group.addoption(
+        "--sherlock-lean",
+        action="store_true",
+        dest="sherlock_lean",
+        default=False,
+        help="Run candidates without reports (no terminal progress, JUnit XML and formatting "
+        "of their failures), only the target is reported",
+    )
+    group.addoption(
+        "--sherlock-scan",
+        action="store_true",
+        dest="sherlock_scan",
+        default=False,
+        help="Run the suite in several orders by worker processes (`--sherlock-workers`), "
+        "find every test which outcome depends on the order and hunt its polluter",
+    )
+    group.addoption(
+        "--sherlock-leaks",
+        action="store_true",
+        dest="sherlock_leaks",
+        default=False,
+        help="Sample open files, threads, child processes and memory around every test, "
+        "confirm leaks of the run by bisection in worker processes (`--sherlock-workers`) "
+        "and report tests which leak alone or together",
+    )
+    group.addoption(
+        "--sherlock-leak-rss",
+        action="store",
+        dest="sherlock_leak_rss",
+        metavar="MB",
+        type=float,
+        default=20.0,
+        help="Growth of resident memory which counts as a leak, 20 MB by default",
+    )
+    parser.addini(
+        "sherlock_reusable_fixtures",
+        type="linelist",
+        help="Fixtures which are kept between steps with `soft` reset, "
+        "each line is `name` or `name = package.module:callable`, "
+        "the callable gets the fixture value and returns False when it must be recreated",
+    )
+
+    parser.addini(
+        "sherlock_record",
+        type="bool",
+        default=False,
+        help="Always record executed order of tests (the same as `--sherlock-record`)",
+    )
+    parser.addini(
+        "sherlock_record_keep",
+        default="10",
+        help="How many recorded sessions keep in pytest cache",
+    )
 
 
 def pytest_configure(config):
     """Find and load configuration file onto the session."""
+    # engines are imported only when they are requested
+    # pylint: disable=import-outside-toplevel
+    if config.getoption("--sherlock-worker") and not config.getoption("--flaky-test"):
+        from pytest_sherlock.work_queue import QueueWorker
+
+        config.pluginmanager.register(QueueWorker(config), name=WORKER_NAME)
+        return
+
+    if config.getoption("--sherlock-scan") and not config.getoption("--flaky-test"):
+        from pytest_sherlock.scan import Scanner
+
+        config.pluginmanager.register(Scanner(config), name=SCANNER_NAME)
+        return
+
+    if config.getoption("--sherlock-leaks") and not config.getoption("--flaky-test"):
+        from pytest_sherlock.leaks import LeakHunter
+
+        config.pluginmanager.register(LeakHunter(config), name=LEAKS_NAME)
+        return
+
     if not config.getoption("--flaky-test"):
+        if config.getoption("--sherlock-record") or config.getini("sherlock_record"):
+            from pytest_sherlock.recorder import Recorder
+
+            config.pluginmanager.register(Recorder(config), name=RECORDER_NAME)
         return
 
-    plugin = config.pluginmanager.get_plugin(PLUGIN_NAME)
+    plugin = config.pluginmanager.get_plugin(SHERLOCK_NAME)
     if not plugin:
+        from pytest_sherlock.sherlock import Sherlock
+
         config.sherlock = Sherlock(config)
-        config.pluginmanager.register(config.sherlock, name=PLUGIN_NAME)
+        config.pluginmanager.register(config.sherlock, name=SHERLOCK_NAME)
 
 
 def pytest_report_teststatus(report):
@@ -0,0 +1,246 @@
+from __future__ import absolute_import
+
+import glob
+import os
+import time
+
+import pytest
+
+from pytest_sherlock.history import make_cache_dir
+
+MAGIC = b"SHRK1"
+SUFFIX = ".order"
+CACHE_DIR = "sherlock"
+LOGS_DIR = "orders"
+OUTCOMES = ("unknown", "passed", "failed", "skipped", "error")
+OUTCOME_CODES = {outcome: code for code, outcome in enumerate(OUTCOMES)}
+OUTCOME_BITS = 3
+
+
+def encode_varint(value, buffer):
+    """
+    Append unsigned integer as LEB128 varint
+
+    Parameters
+    ----------
+    value: int
+    buffer: bytearray
+    """
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+    return buffer
+
+
+def decode_varint(data, position):
+    """
+    Parameters
+    ----------
+    data: bytes
+    position: int
+
+    Returns
+    -------
+    tuple[int, int]
+        value and the next position
+    """
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+def read_log(path):
+    """
+    Every record is a varint `index << 3 | outcome`,
+    the first record of a test is followed by its nodeid (varint length + utf-8)
+
+    Parameters
+    ----------
+    path: str
+
+    Returns
+    -------
+    List[tuple[str, str]]
+        nodeid and outcome in order of execution
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"Not a sherlock order log: {path}")
+
+    nodeids, records = [], []
+    position = len(MAGIC)
+    while position < len(data):
+        tag, position = decode_varint(data, position)
+        index, outcome = tag >> OUTCOME_BITS, tag & ((1 << OUTCOME_BITS) - 1)
+        if index == len(nodeids):
+            size, position = decode_varint(data, position)
+            nodeids.append(data[position : position + size].decode("utf-8"))
+            position += size
+        records.append((nodeids[index], OUTCOMES[outcome]))
+    return records
+
+
+def get_logs_dir(config):
+    """
+    Parameters
+    ----------
+    config: _pytest.config.Config
+
+    Returns
+    -------
+    str
+        directory inside of pytest cache with recorded logs
+    """
+    directory = os.path.join(make_cache_dir(config, CACHE_DIR), LOGS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def get_worker(path):
+    """
+    '1700000000-gw1.order' -> 'gw1'
+    """
+    return os.path.basename(path)[: -len(SUFFIX)].split("-", 1)[-1]
+
+
+def get_sessions(directory):
+    """
+    Parameters
+    ----------
+    directory: str
+
+    Returns
+    -------
+    List[List[str]]
+        logs grouped by session (one log per worker), the oldest session first
+    """
+    sessions = {}
+    for path in glob.glob(os.path.join(directory, f"*{SUFFIX}")):
+        sessions.setdefault(os.path.basename(path).split("-", 1)[0], []).append(path)
+    return [sorted(sessions[key]) for key in sorted(sessions)]
+
+
+class LogWriter(object):
+    """
+    Writes records of `read_log` format to the log by batches,
+    the log is created by the first batch
+    """
+
+    BATCH_SIZE = 512
+
+    def __init__(self, path, batch_size=None):
+        self.path = path
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.nodeids = {}
+        self.buffer = bytearray(MAGIC)
+        self.pending = 0
+
+    def add(self, nodeid, outcome):
+        index = self.nodeids.get(nodeid)
+        if index is None:
+            index = self.nodeids[nodeid] = len(self.nodeids)
+            encode_varint(index << OUTCOME_BITS | OUTCOME_CODES[outcome], self.buffer)
+            encoded = nodeid.encode("utf-8")
+            encode_varint(len(encoded), self.buffer)
+            self.buffer += encoded
+        else:
+            encode_varint(index << OUTCOME_BITS | OUTCOME_CODES[outcome], self.buffer)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self.buffer:
+            with open(self.path, "ab") as f:
+                f.write(self.buffer)
+            self.buffer = bytearray()
+        self.pending = 0
+        return True
+
+    def close(self):
+        """Write the rest of records, the log of a run without tests isn't created"""
+        if self.nodeids or self.pending:
+            self.flush()
+
+
+class Recorder(object):
+    """
+    Lightweight plugin which records executed order of tests with outcomes
+    to compact binary log inside of pytest cache, records are written by batches
+    """
+
+    def __init__(self, config, directory=None, keep=None, batch_size=None):
+        self.directory = directory or get_logs_dir(config)
+        self.keep = keep or int(config.getini("sherlock_record_keep") or 10)
+        workerinput = getattr(config, "workerinput", None)
+        self.worker = workerinput["workerid"] if workerinput else "main"
+        # xdist controller gets reports of all workers, they record by themselves
+        self.is_controller = workerinput is None and getattr(
+            config.option, "dist", "no"
+        ) not in (None, "no")
+        self.session_id = self.get_session_id(workerinput)
+        self.log = LogWriter(
+            os.path.join(self.directory, f"{self.session_id}-{self.worker}{SUFFIX}"),
+            batch_size=batch_size,
+        )
+        self.outcome = None
+
+    @property
+    def path(self):
+        return self.log.path
+
+    @staticmethod
+    def get_session_id(workerinput):
+        # all xdist workers of the same run share the same id
+        if workerinput and "sherlock_session_id" in workerinput:
+            return workerinput["sherlock_session_id"]
+        return f"{int(time.time() * 1000):015d}"
+
+    def rotate(self):
+        """
+        Remove the oldest sessions, keep only `sherlock_record_keep` last ones
+        (including the current one)
+        """
+        sessions = get_sessions(self.directory)
+        for session in sessions[: max(len(sessions) - self.keep + 1, 0)]:
+            for path in session:
+                os.remove(path)
+        return True
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node):
+        """xdist hook, share session id with workers"""
+        node.workerinput["sherlock_session_id"] = self.session_id
+
+    def pytest_sessionstart(self, session):
+        _ = session  # to make pylint happy
+        if self.worker == "main":
+            self.rotate()
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_controller:
+            return
+        if report.failed:
+            self.outcome = "failed" if report.when == "call" else "error"
+        elif report.skipped and self.outcome is None:
+            self.outcome = "skipped"
+        elif report.when == "call" and self.outcome is None:
+            self.outcome = "passed"
+
+    def pytest_runtest_logfinish(self, nodeid):
+        if self.is_controller:
+            return
+        self.log.add(nodeid, self.outcome or "unknown")
+        self.outcome = None
+
+    def pytest_sessionfinish(self, session):
+        _ = session  # to make pylint happy
+        self.log.close()
@@ -0,0 +1,286 @@
+from __future__ import absolute_import
+
+import json
+import os
+import statistics
+import time
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_RULE_ID = "coupled-tests"
+
+
+def get_fixture_scopes(item, names):
+    """
+    Parameters
+    ----------
+    item: _pytest.python.Function
+    names: Iterable[str]
+        names of fixtures
+
+    Returns
+    -------
+    dict[str, str]
+        {'config': 'session'}
+    """
+    info = getattr(item, "_fixtureinfo", None)
+    name2fixturedefs = getattr(info, "name2fixturedefs", None) or {}
+    scopes = {}
+    for name in sorted(names):
+        fixture_defs = name2fixturedefs.get(name)
+        scope = getattr(fixture_defs[-1], "scope", None) if fixture_defs else None
+        scopes[name] = str(scope) if scope is not None else None
+    return scopes
+
+
+class HuntReport(object):
+    """
+    Machine-readable report of a hunt (JSON or SARIF by file extension),
+    the file is rewritten after every step to show partial progress
+    """
+
+    RUNNING = "running"
+    FOUND = "found"
+    NOT_FOUND = "not_found"
+    PARTIAL = "partial"
+
+    def __init__(self, path):
+        self.path = path
+        self.is_sarif = path.endswith(".sarif")
+        self.started = None
+        self.data = {
+            "status": self.RUNNING,
+            "mode": "polluter",
+            "target": None,
+            "candidates": 0,
+            "steps_range": None,
+            "steps": [],
+            "coupled": [],
+            "common_fixtures": {},
+            "reproduce": None,
+            "confidence": 0.0,
+            "message": None,
+            "difference": None,
+            "narrowest": None,
+            "eta": None,
+            "duration": 0.0,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Parameters
+        ----------
+        config: _pytest.config.Config
+
+        Returns
+        -------
+        Optional[HuntReport]
+            None in case when a report wasn't requested
+        """
+        path = config.getoption("--sherlock-report")
+        if not path:
+            return None
+        return cls(os.path.abspath(path))
+
+    def start(self, target, candidates, minimum, maximum):
+        """
+        Parameters
+        ----------
+        target: str
+            nodeid of the target test
+        candidates: int
+            amount of tests which could be guilty
+        minimum: int
+        maximum: int
+            possible amount of steps
+        """
+        self.started = time.time()
+        self.data.update(
+            target=target, candidates=candidates, steps_range=[minimum, maximum]
+        )
+        return self.write()
+
+    def add_step(self, step, nodeids, failed, duration, timed_out=False):
+        """
+        Parameters
+        ----------
+        step: int
+        nodeids: List[str]
+            tests of the step, the target is the last one
+        failed: bool
+            verdict of the target test
+        duration: float
+            seconds
+        timed_out: bool
+            the step hung and was stopped by `--sherlock-timeout` (it's a failed verdict)
+        """
+        data = {
+            "step": step,
+            "tests": list(nodeids),
+            "verdict": "failed" if failed else "passed",
+            "duration": round(duration, 6),
+        }
+        if timed_out:
+            data["timed_out"] = True
+        self.data["steps"].append(data)
+        return self.write()
+
+    def set_mode(self, mode):
+        """
+        Parameters
+        ----------
+        mode: str
+            `polluter` - the target fails after the culprit,
+            `setter` - the target fails without the culprit,
+            `slowdown` - the target is slow after the culprit
+        """
+        self.data["mode"] = mode
+        return self.write()
+
+    def set_baseline(self, durations, threshold):
+        """
+        Parameters
+        ----------
+        durations: List[float]
+            seconds of the target runs alone
+        threshold: float
+            a step is failed when the target is slower
+        """
+        self.data["baseline"] = {
+            "durations": [round(duration, 6) for duration in durations],
+            "median": round(statistics.median(durations), 6),
+            "threshold": round(threshold, 6),
+        }
+        return self.write()
+
+    def update_eta(self, expected, worst):
+        """
+        Parameters
+        ----------
+        expected: float
+        worst: float
+            seconds which the rest of the hunt could take
+        """
+        self.data["eta"] = {"expected": round(expected, 3), "worst": round(worst, 3)}
+        return self.write()
+
+    def finish(
+        self, coupled=None, fixtures=None, reproduce=None, message=None, difference=None
+    ):
+        """
+        Parameters
+        ----------
+        coupled: Optional[List[str]]
+            nodeids of coupled tests, the target is the last one
+        fixtures: Optional[dict[str, str]]
+            common fixtures with scopes
+        reproduce: Optional[str]
+            command to reproduce
+        message: Optional[str]
+            failure message of the target test
+        difference: Optional[dict[str, str]]
+            the first state which the victim reads differently from a clean run
+        """
+        self.data.update(
+            status=self.FOUND if coupled else self.NOT_FOUND,
+            eta=None,
+            coupled=list(coupled or []),
+            common_fixtures=dict(fixtures or {}),
+            reproduce=reproduce,
+            message=message,
+            difference=difference,
+            confidence=self.confidence(bool(coupled)),
+        )
+        return self.write()
+
+    def partial(self, nodeids, tests_range, path, resume):
+        """
+        The hunt was stopped by the time budget
+
+        Parameters
+        ----------
+        nodeids: List[str]
+            the narrowest range of candidates which contains the polluter
+        tests_range: tuple[int, int]
+            the range in the candidates
+        path: str
+            path in the tree, `L` - bucket failed, `R` - bucket passed
+        resume: str
+            command to resume the hunt
+        """
+        self.data.update(
+            status=self.PARTIAL,
+            narrowest={
+                "tests": list(nodeids),
+                "range": list(tests_range),
+                "path": path,
+            },
+            reproduce=resume,
+        )
+        return self.write()
+
+    def confidence(self, found):
+        """
+        1.0 - the pair fails and the target passed without the polluter at least once
+              (setter mode: the pair passes and the target failed without the setter)
+        0.5 - the pair fails, but the target was never seen green
+        0.0 - coupled tests were not found
+        """
+        if not found:
+            return 0.0
+        opposite = "failed" if self.data["mode"] == "setter" else "passed"
+        if any(step["verdict"] == opposite for step in self.data["steps"]):
+            return 1.0
+        return 0.5
+
+    def to_sarif(self):
+        results = []
+        if self.data["coupled"]:
+            results.append(
+                {
+                    "ruleId": SARIF_RULE_ID,
+                    "level": "error",
+                    "message": {"text": self.data["message"] or "Found coupled tests"},
+                    "locations": [
+                        {
+                            "physicalLocation": {
+                                "artifactLocation": {"uri": nodeid.split("::")[0]}
+                            },
+                            "logicalLocations": [{"fullyQualifiedName": nodeid}],
+                        }
+                        for nodeid in self.data["coupled"]
+                    ],
+                    "properties": {
+                        "reproduce": self.data["reproduce"],
+                        "confidence": self.data["confidence"],
+                        "commonFixtures": self.data["common_fixtures"],
+                    },
+                }
+            )
+        return {
+            "$schema": SARIF_SCHEMA,
+            "version": "2.1.0",
+            "runs": [
+                {
+                    "tool": {
+                        "driver": {
+                            "name": "pytest-sherlock",
+                            "informationUri": "https://github.com/DKorytkin/pytest-sherlock",
+                            "rules": [{"id": SARIF_RULE_ID}],
+                        }
+                    },
+                    "results": results,
+                    "properties": self.data,
+                }
+            ],
+        }
+
+    def write(self):
+        if self.started is not None:
+            self.data["duration"] = round(time.time() - self.started, 6)
+        content = self.to_sarif() if self.is_sarif else self.data
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f, indent=2)
+        os.replace(tmp_path, self.path)  # readers never see a half written file
+        return True
@@ -0,0 +1,316 @@
+from __future__ import absolute_import
+
+import ast
+import os
+import sys
+import tempfile
+
+CONFTEST = "conftest.py"
+TEST_MODULE = "test_sherlock_repro.py"
+INI = "pytest.ini"
+INI_CONTENT = "[pytest]\naddopts = -p no:randomly -p no:cacheprovider\n"
+
+
+class ReproductionError(Exception):
+    pass
+
+
+def _is_user_file(path, rootdir):
+    """
+    Parameters
+    ----------
+    path: Optional[str]
+    rootdir: str
+
+    Returns
+    -------
+    bool
+        True for files from the project, but not from installed packages
+    """
+    if not path:
+        return False
+    path = os.path.abspath(path)
+    if "site-packages" in path.split(os.sep):
+        return False
+    return os.path.commonpath([path, rootdir]) == rootdir
+
+
+def _is_fixture(node):
+    """
+    True for functions decorated by `fixture` or `pytest.fixture`, called or not
+    """
+    for decorator in getattr(node, "decorator_list", []):
+        if isinstance(decorator, ast.Call):
+            decorator = decorator.func
+        if isinstance(decorator, ast.Name) and decorator.id == "fixture":
+            return True
+        if isinstance(decorator, ast.Attribute) and decorator.attr == "fixture":
+            return True
+    return False
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def _used_names(node):
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _defined_names(node):
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return {node.name}
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return {(alias.asname or alias.name).split(".")[0] for alias in node.names}
+    if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return {n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)}
+    return set()
+
+
+class SourceModule(object):
+    """
+    Top level statements of a python module which could be copied one by one
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "r", encoding="utf-8") as f:
+            self.source = f.read()
+        self.lines = self.source.splitlines()
+        self.tree = ast.parse(self.source, filename=path)
+        self.definitions = {}
+        for node in self.tree.body:
+            for name in _defined_names(node):
+                self.definitions[name] = node
+
+    def definition(self, name):
+        node = self.definitions.get(name)
+        if node is None:
+            raise ReproductionError(
+                f"{name} isn't defined at the top level of {self.path}"
+            )
+        return node
+
+    def end_lineno(self, node):
+        """
+        Last line of the node, python 3.7 has no `end_lineno` of nodes,
+        so it is the last line of nested nodes with following closing brackets
+        """
+        end = getattr(node, "end_lineno", None)
+        if end is not None:
+            return end
+        end = max(getattr(child, "lineno", 0) for child in ast.walk(node))
+        indent = _indent(self.lines[node.lineno - 1])
+        while end < len(self.lines):
+            line = self.lines[end]
+            if not line.strip() or _indent(line) < indent:
+                break
+            if _indent(line) == indent and line.lstrip()[0] not in ")]}":
+                break
+            end += 1
+        return end
+
+    def segment(self, node):
+        """
+        Source of the node including decorators,
+        `__file__` is replaced by the origin path to keep relative paths working
+        """
+        start = min(
+            [node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]
+        )
+        text = "\n".join(self.lines[start - 1 : self.end_lineno(node)])
+        return text.replace("__file__", repr(self.path))
+
+    def imports(self):
+        return [
+            node
+            for node in self.tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom))
+        ]
+
+    def dependencies(self, nodes):
+        """
+        Top level statements (except imports) which are used by nodes, recursively
+
+        Parameters
+        ----------
+        nodes: List[ast.AST]
+
+        Returns
+        -------
+        List[ast.AST]
+            in order of the module
+        """
+        required = []
+        pending = (
+            set().union(*[_used_names(node) for node in nodes]) if nodes else set()
+        )
+        seen = set()
+        while pending:
+            name = pending.pop()
+            node = self.definitions.get(name)
+            if name in seen or node is None or node in nodes or node in required:
+                continue
+            seen.add(name)
+            if isinstance(node, (ast.Import, ast.ImportFrom)) or _is_fixture(node):
+                continue  # imports are copied separately, fixtures go to conftest
+            required.append(node)
+            pending |= _used_names(node)
+        order = {id(node): idx for idx, node in enumerate(self.tree.body)}
+        return sorted(required, key=lambda node: order[id(node)])
+
+    def class_with_method(self, class_name, method_name, new_name=None):
+        """
+        Source of the class which contains only one test method,
+        other helpers and attributes of the class stay as is
+        """
+        node = self.definition(class_name)
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        header = "\n".join(self.lines[start - 1 : node.body[0].lineno - 1])
+        if new_name:
+            header = header.replace(f"class {class_name}", f"class {new_name}", 1)
+        body = []
+        for child in node.body:
+            is_test = isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and (
+                child.name.startswith("test")
+            )
+            if is_test and child.name != method_name:
+                continue
+            body.append(self.segment(child))
+        return "\n".join([header] + body).replace("__file__", repr(self.path))
+
+
+class Reproduction(object):
+    """
+    Collects sources of coupled tests and fixtures they need
+    and writes them as standalone pytest project
+    """
+
+    def __init__(self, coupled_tests, rootdir):
+        self.coupled_tests = coupled_tests
+        self.rootdir = os.path.abspath(rootdir)
+        self.modules = {}
+
+    def get_module(self, path):
+        path = os.path.abspath(path)
+        if path not in self.modules:
+            self.modules[path] = SourceModule(path)
+        return self.modules[path]
+
+    def get_fixture_functions(self):
+        """
+        Returns
+        -------
+        List[Callable]
+            user defined fixture functions required by coupled tests (with dependencies)
+        """
+        functions = []
+        for item in self.coupled_tests:
+            info = getattr(item, "_fixtureinfo", None)
+            if info is None:
+                continue
+            for name in info.names_closure:
+                fixture_defs = info.name2fixturedefs.get(name)
+                if not fixture_defs:
+                    continue
+                func = getattr(fixture_defs[-1], "func", None)
+                code = getattr(func, "__code__", None)
+                if code is None or not _is_user_file(code.co_filename, self.rootdir):
+                    continue  # builtin fixtures or fixtures from plugins
+                if func not in functions:
+                    functions.append(func)
+        return functions
+
+    @staticmethod
+    def render(parts):
+        unique = []
+        for part in parts:
+            if part not in unique:
+                unique.append(part)
+        return "\n\n\n".join(unique) + "\n"
+
+    def make_conftest(self):
+        imports, dependencies, fixtures = ["import pytest"], [], []
+        for func in self.get_fixture_functions():
+            module = self.get_module(func.__code__.co_filename)
+            node = module.definitions.get(func.__name__)
+            if node is None:
+                continue  # fixtures defined inside of classes are not supported
+            imports.extend(module.segment(n) for n in module.imports())
+            dependencies.extend(module.segment(n) for n in module.dependencies([node]))
+            fixtures.append(module.segment(node))
+        return self.render(
+            ["\n".join(dict.fromkeys(imports))] + dependencies + fixtures
+        )
+
+    def make_test_module(self):
+        """
+        Returns
+        -------
+        tuple[str, List[str]]
+            source of test module and names of tests in the pinned order
+        """
+        imports, dependencies, tests, names = [], [], [], []
+        used = set()
+        for item in self.coupled_tests:
+            if getattr(item, "function", None) is None:
+                raise ReproductionError(f"{item.nodeid} isn't a python test function")
+            module = self.get_module(item.module.__file__)
+            imports.extend(module.segment(n) for n in module.imports())
+            function_name = item.function.__name__
+            param = item.name[len(item.name.split("[")[0]) :]  # '[1-2]' of parametrized
+            cls = getattr(item, "cls", None)
+            if cls is not None:
+                new_name = f"{cls.__name__}Victim" if cls.__name__ in used else None
+                node = module.definition(cls.__name__)
+                tests.append(
+                    module.class_with_method(cls.__name__, function_name, new_name)
+                )
+                class_name = new_name or cls.__name__
+                used.add(class_name)
+                names.append(f"{class_name}::{function_name}{param}")
+            else:
+                node = module.definition(function_name)
+                source = module.segment(node)
+                if function_name in used:
+                    source = source.replace(
+                        f"def {function_name}(", f"def {function_name}_victim(", 1
+                    )
+                    function_name = f"{function_name}_victim"
+                used.add(function_name)
+                tests.append(source)
+                names.append(f"{function_name}{param}")
+            dependencies.extend(
+                module.segment(n)
+                for n in module.dependencies([node])
+                if not getattr(n, "name", "").startswith("test")
+            )
+        header = "\n".join(dict.fromkeys(imports))
+        return self.render(([header] if header else []) + dependencies + tests), names
+
+    def write(self, directory=None):
+        """
+        Parameters
+        ----------
+        directory: Optional[str]
+            where to write the reproduction, temporary directory by default
+
+        Returns
+        -------
+        tuple[str, str]
+            directory and command to run the reproduction
+        """
+        directory = directory or tempfile.mkdtemp(prefix="sherlock-repro-")
+        os.makedirs(directory, exist_ok=True)
+        test_module, names = self.make_test_module()
+        files = {
+            CONFTEST: self.make_conftest(),
+            TEST_MODULE: test_module,
+            INI: INI_CONTENT,
+        }
+        for name, content in files.items():
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write(content)
+        tests = " ".join(f"{TEST_MODULE}::{name}" for name in names)
+        return directory, f"cd {directory} && {sys.executable} -m pytest -l -vv {tests}"
@@ -0,0 +1,302 @@
+from __future__ import absolute_import
+
+import contextlib
+import signal
+import threading
+
+from _pytest.runner import runtestprotocol
+
+from pytest_sherlock.durations import format_duration
+from pytest_sherlock.state import refresh_state, run_lean, teardown_towards
+from pytest_sherlock.trace import Tracer, find_first_difference
+
+MODE_AUTO = "auto"
+MODE_POLLUTER = "polluter"
+MODE_SETTER = "setter"
+MODE_SLOWDOWN = "slowdown"
+
+
+class BucketTimeout(Exception):
+    """Raised into the running test when the bucket exceeds `--sherlock-timeout`"""
+
+
+@contextlib.contextmanager
+def watchdog(seconds, on_timeout=None):
+    """
+    Raise `BucketTimeout` into the main thread when the block runs longer than `seconds`,
+    a hung test (deadlock on a leaked lock, exhausted pool) fails instead of hanging forever.
+    It's based on SIGALRM, so it isn't armed on Windows and outside of the main thread
+
+    Parameters
+    ----------
+    seconds: Optional[float]
+    on_timeout: Optional[Callable[[], Any]]
+        called right before the exception is raised
+
+    Yields
+    ------
+    bool
+        True when the watchdog is armed
+    """
+    if (
+        not seconds
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield False
+        return
+
+    def on_alarm(signum, frame):
+        _ = signum, frame  # to make pylint happy
+        if on_timeout is not None:
+            on_timeout()
+        raise BucketTimeout(
+            f"The bucket is running longer than {format_duration(seconds)}"
+        )
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield True
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class Verdict(object):
+    """
+    Verdict of the step by reports of the target test, the mode decides
+    what fails the step and which buckets are guilty
+    """
+
+    def __init__(self, mode, slowdown):
+        self.mode = mode
+        self.slowdown = slowdown
+        # initialize via add, the failure of the target in the current step
+        self.failed_report = None
+        # initialize via LocalRunner.run_bucket, the test which was running when it timed out
+        self.timed_out = None
+        # initialize via add, the call phase of the target in the current step
+        self.duration = None
+        # initialize via Hunt.measure_baseline (slowdown mode), the median duration of the target
+        self.baseline = None
+        # initialize via Hunt.detect_mode, the failure of the target run alone
+        self.alone_report = None
+
+    def reset(self):
+        self.failed_report = None
+        self.timed_out = None
+        self.duration = None
+
+    def add(self, report):
+        """
+        Parameters
+        ----------
+        report: _pytest.runner.TestReport
+            report of the target test
+        """
+        # only the call: setup and teardown of shared fixtures depend on the bucket
+        if report.when == "setup":
+            self.duration = None
+        elif report.when == "call":
+            self.duration = getattr(report, "duration", None) or 0.0
+        if report.outcome != "passed":
+            self.failed_report = report
+
+    @property
+    def threshold(self):
+        return self.baseline * self.slowdown if self.baseline is not None else None
+
+    def is_failed(self):
+        """
+        Returns
+        -------
+        bool
+            verdict of the step: the target failed (slowdown mode: it was slower
+            than `--sherlock-slowdown` times its baseline) or the bucket timed out
+        """
+        if self.timed_out is not None:
+            return True
+        if self.mode == MODE_SLOWDOWN:
+            return self.duration is not None and self.duration > self.threshold
+        return bool(self.failed_report)
+
+    def is_guilty(self, failed):
+        """
+        Parameters
+        ----------
+        failed: bool
+            verdict of the target test
+
+        Returns
+        -------
+        bool
+            True when the culprit is in the bucket: the target failed after a polluter
+            or the target passed after a setter (in setter mode)
+        """
+        return failed != (self.mode == MODE_SETTER)
+
+    def describe(self, coupled):
+        """
+        Parameters
+        ----------
+        coupled: List[_pytest.python.Function]
+            the found pair, the target is the last one
+
+        Returns
+        -------
+        str
+            why the step without a failure of the target was failed
+        """
+        if self.timed_out is not None:
+            return f"{self.timed_out.nodeid} hung, the target wasn't run after it"
+        return (
+            f"The target takes {self.duration:.3f}s after {coupled[0].nodeid}, "
+            f"{self.duration / max(self.baseline, 1e-9):.1f}x "
+            f"of its baseline {self.baseline:.3f}s"
+        )
+
+
+class LocalRunner(object):
+    """
+    Runs buckets in the current process (the target is the last test of a bucket),
+    the verdict is fed by reports of the target
+    """
+
+    def __init__(self, config, durations, verdict):
+        self.config = config
+        self.durations = durations
+        self.verdict = verdict
+        # initialize via trace, records state which the target reads
+        self.tracer = None
+
+    def get_timeout(self, nodeids):
+        """
+        Parameters
+        ----------
+        nodeids: List[str]
+            tests of the bucket, the target is the last one
+
+        Returns
+        -------
+        Optional[float]
+            time limit of the bucket: `--sherlock-timeout-factor` times its expected duration,
+            but not less than `--sherlock-timeout`, None without `--sherlock-timeout`
+        """
+        timeout = self.config.getoption("--sherlock-timeout")
+        if timeout is None:
+            return None
+        expected = self.durations.estimate(nodeids)
+        if expected is None:
+            return timeout
+        return max(
+            timeout, expected * self.config.getoption("--sherlock-timeout-factor")
+        )
+
+    def run_test(self, session, item, next_item, lean=False):
+        """
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        item: _pytest.python.Function
+        next_item: Optional[_pytest.python.Function]
+        lean: bool
+            run the test without reports (`--sherlock-lean` for tests before the target)
+        """
+        if lean:
+            for call in run_lean(item, next_item):
+                self.durations.add_phase(
+                    item.nodeid, call.when, getattr(call, "duration", None)
+                )
+        else:
+            self.config.hook.pytest_runtest_protocol(item=item, nextitem=next_item)
+        if session.shouldfail:
+            raise session.Failed(session.shouldfail)
+        if session.shouldstop:
+            raise session.Interrupted(session.shouldstop)
+
+    def run_bucket(self, session, items, collection, probe):
+        """
+        Run tests of the bucket, with `--sherlock-probe` the bucket ends on the first test
+        after which the probe detects polluted state (the target is run right after it)
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        items: Bucket
+            bucket of tests, the target is the last one
+        collection: pytest_sherlock.hunt.Collection
+            it chooses the next item after the target
+        probe: pytest_sherlock.hunt.Probe
+
+        Returns
+        -------
+        Optional[_pytest.python.Function]
+            the test after which the probe detected polluted state
+        """
+        target = items[-1]
+        lean = self.config.getoption("--sherlock-lean")
+        probing = len(items) > 2  # nothing to pinpoint in a pair
+        culprit = current = None
+
+        def on_timeout():
+            self.verdict.timed_out = current
+
+        with watchdog(self.get_timeout(items.nodeids), on_timeout):
+            for next_idx, item in enumerate(items, 1):
+                current = item
+                next_item = collection.get_next_item(items, next_idx)
+                try:
+                    self.run_test(
+                        session, item, next_item, lean=lean and item is not target
+                    )
+                except BucketTimeout:
+                    pass  # the alarm came between phases of the test, it's a failure anyway
+                if item is not target and self.verdict.timed_out is not None:
+                    teardown_towards(
+                        item, None
+                    )  # the target isn't run after a hung test
+                    break
+                if item is not target and probing and probe.fires(item):
+                    teardown_towards(
+                        item, target
+                    )  # the rest of the bucket is wasted work
+                    current = target
+                    self.run_test(
+                        session, target, collection.get_next_item(items, len(items))
+                    )
+                    culprit = item
+                    break
+        return culprit
+
+    def trace(self, coupled):
+        """
+        Re-run the victim alone and after the polluter with tracing of the victim
+        and find the first state read which differs
+
+        Parameters
+        ----------
+        coupled: List[_pytest.python.Function]
+            polluter and victim
+
+        Returns
+        -------
+        Optional[dict[str, str]]
+        """
+        victim = coupled[-1]
+        failed_report = self.verdict.failed_report
+
+        def observe(bucket):
+            refresh_state(victim)
+            self.tracer = Tracer(getattr(victim, "function", None))
+            for next_idx, item in enumerate(bucket, 1):
+                next_item = bucket[next_idx] if next_idx < len(bucket) else None
+                runtestprotocol(item, nextitem=next_item, log=False)
+            return self.tracer.observations
+
+        try:
+            clean, polluted = observe([victim]), observe(coupled)
+        finally:
+            self.tracer = None
+            self.verdict.failed_report = failed_report
+        return find_first_difference(clean, polluted)
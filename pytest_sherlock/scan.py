@@ -0,0 +1,443 @@
+from __future__ import absolute_import
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+import pytest
+
+from pytest_sherlock.history import module_of
+from pytest_sherlock.order import junit_key
+
+ORDER_ENV = "SHERLOCK_ORDER_FILE"
+# more modules of a run are replaced by the root directory to keep the command line short
+MAX_PATHS = 100
+SEED = 0
+PASSED = "passed"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    """
+    Worker side of the scan (`-p pytest_sherlock.scan`): run only tests
+    of the order file from `SHERLOCK_ORDER_FILE` in its order
+    """
+    path = os.environ.get(ORDER_ENV)
+    if not path:
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        order = [line.strip() for line in f if line.strip()]
+    position = {nodeid: idx for idx, nodeid in enumerate(order)}
+    selected = [item for item in items if item.nodeid in position]
+    deselected = [item for item in items if item.nodeid not in position]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+    items[:] = sorted(selected, key=lambda item: position[item.nodeid])
+
+
+def make_paths(nodeids, limit=MAX_PATHS):
+    """
+    Parameters
+    ----------
+    nodeids: Iterable[str]
+        tests of the run, they are selected by the order file
+    limit: int
+
+    Returns
+    -------
+    List[str]
+        modules of the tests or the root directory when there are too many of them
+    """
+    paths = list(OrderedDict.fromkeys(module_of(nodeid) for nodeid in nodeids))
+    return paths if len(paths) <= limit else ["."]
+
+
+def make_worker_command(args, paths, plugins=()):
+    """
+    Command of a worker process which runs only tests of the order file in its order
+    (`SHERLOCK_ORDER_FILE`), without hunting and shuffling
+
+    Parameters
+    ----------
+    args: Iterable[str]
+        arguments of pytest
+    paths: Iterable[str]
+        modules of the tests (`make_paths`)
+    plugins: Iterable[str]
+        extra plugins of the worker
+
+    Returns
+    -------
+    List[str]
+    """
+    return [
+        sys.executable,
+        "-m",
+        "pytest",
+        "-p",
+        "no:sherlock",  # entry point of the plugin, workers don't hunt
+        "-p",
+        "no:randomly",  # workers must keep the order
+        "-p",
+        "pytest_sherlock.scan",
+        *[arg for plugin in plugins for arg in ("-p", plugin)],
+        "-q",
+        *args,
+        *paths,
+    ]
+
+
+async def run_worker(semaphore, command, cwd, env=None):
+    """
+    Run the worker process when the semaphore allows it, the process is killed
+    when the run is cancelled
+
+    Returns
+    -------
+    int
+        exit code of the worker
+    """
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            return await process.wait()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+
+def write_order(path, nodeids):
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{nodeid}\n" for nodeid in nodeids)
+    return path
+
+
+def make_orders(nodeids, seed=SEED):
+    """
+    Parameters
+    ----------
+    nodeids: List[str]
+        tests in collected order
+    seed: int
+
+    Returns
+    -------
+    OrderedDict[str, List[str]]
+        name of the order -> tests, identical orders are skipped
+    """
+    modules = OrderedDict()
+    for nodeid in nodeids:
+        modules.setdefault(module_of(nodeid), []).append(nodeid)
+    shuffled = list(modules)
+    random.Random(seed).shuffle(shuffled)
+
+    candidates = [
+        ("original", list(nodeids)),
+        ("reversed", list(reversed(nodeids))),
+        ("modules-reversed", [n for m in reversed(modules) for n in modules[m]]),
+        ("modules-shuffled", [n for m in shuffled for n in modules[m]]),
+    ]
+    orders, seen = OrderedDict(), set()
+    for name, order in candidates:
+        if tuple(order) not in seen:
+            seen.add(tuple(order))
+            orders[name] = order
+    return orders
+
+
+def find_order_dependent(outcomes):
+    """
+    Parameters
+    ----------
+    outcomes: dict[str, dict[str, str]]
+        name of the order -> nodeid -> outcome
+
+    Returns
+    -------
+    OrderedDict[str, dict[str, str]]
+        order dependent test -> outcome -> name of the first order with it
+    """
+    dependent = OrderedDict()
+    seen = OrderedDict()
+    for name, tests in outcomes.items():
+        for nodeid, outcome in tests.items():
+            seen.setdefault(nodeid, {}).setdefault(outcome, name)
+    for nodeid, by_outcome in seen.items():
+        if PASSED in by_outcome and FAILED in by_outcome:
+            dependent[nodeid] = {PASSED: by_outcome[PASSED], FAILED: by_outcome[FAILED]}
+    return dependent
+
+
+def read_outcomes(junit_path, nodeids):
+    """
+    Parameters
+    ----------
+    junit_path: str
+    nodeids: Iterable[str]
+        tests which were run
+
+    Returns
+    -------
+    dict[str, str]
+        nodeid -> passed, failed or skipped
+    """
+    by_key = {junit_key(nodeid): nodeid for nodeid in nodeids}
+    outcomes = {}
+    try:
+        root = ET.parse(junit_path).getroot()
+    except (OSError, ET.ParseError):
+        return outcomes
+    for testcase in root.iter("testcase"):
+        nodeid = by_key.get((testcase.get("classname", ""), testcase.get("name", "")))
+        if nodeid is None:
+            continue
+        tags = {child.tag for child in testcase}
+        if tags & {"failure", "error"}:
+            outcomes[nodeid] = FAILED
+        elif "skipped" in tags:
+            outcomes[nodeid] = SKIPPED
+        else:
+            outcomes[nodeid] = PASSED
+    return outcomes
+
+
+class Scanner(object):
+    """
+    Runs the suite in several orders by worker processes, finds tests which outcome
+    depends on the order and hunts the polluter of every victim by `--flaky-test`
+    """
+
+    def __init__(self, config):
+        self.config = config
+        workers = config.getoption("--sherlock-workers")
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.rootdir = str(getattr(config, "rootpath", None) or config.rootdir)
+        self.directory = None
+        self.items = []
+        self.results = OrderedDict()
+        # tests which didn't fail again in the same run, nodeid -> name of the order
+        self.flaky = OrderedDict()
+
+    @property
+    def reporter(self):
+        return self.config.pluginmanager.get_plugin("terminalreporter")
+
+    @property
+    def report_path(self):
+        return self.config.getoption("--sherlock-report")
+
+    def get_path(self, name, suffix):
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    def make_hunt_command(self, victim, name, paths, mode="polluter"):
+        """
+        Files of the hunt are named by it in the directory of the scan:
+        the order, the JSON report and pytest cache
+        """
+        plugin = []
+        if self.config.pluginmanager.get_plugin("sherlock") is None:
+            plugin = ["-p", "pytest_sherlock.plugin"]  # isn't installed as entry point
+        # concurrent hunts must not share steps and history of pytest cache
+        plugin += ["-o", f"cache_dir={self.get_path(name, '-cache')}"]
+        return [
+            sys.executable,
+            "-m",
+            "pytest",
+            *plugin,
+            "-p",
+            "no:randomly",
+            "-q",
+            f"--flaky-test={victim}",
+            f"--sherlock-mode={mode}",
+            f"--sherlock-order={self.get_path(name, '.txt')}",
+            f"--sherlock-report={self.get_path(name, '.json')}",
+            *paths,
+        ]
+
+    def write_order(self, name, order):
+        return write_order(self.get_path(name, ".txt"), order)
+
+    async def run_order(self, semaphore, name, order):
+        """
+        Returns
+        -------
+        dict[str, str]
+            nodeid -> outcome
+        """
+        env = dict(os.environ)
+        env[ORDER_ENV] = self.write_order(name, order)
+        junit_path = self.get_path(name, ".xml")
+        paths = make_paths(order)
+        command = make_worker_command([f"--junitxml={junit_path}"], paths)
+        await run_worker(semaphore, command, self.rootdir, env=env)
+        return read_outcomes(junit_path, order)
+
+    async def hunt(self, semaphore, idx, victim, order, mode="polluter"):
+        """
+        Parameters
+        ----------
+        semaphore: asyncio.Semaphore
+        idx: int
+            index of the victim, hunts are run concurrently
+        victim: str
+        order: List[str]
+            the order where the victim failed (polluter) or passed (setter)
+        mode: str
+
+        Returns
+        -------
+        dict
+            JSON report of the hunt
+        """
+        name = f"hunt-{idx}"
+        self.write_order(name, order)
+        command = self.make_hunt_command(victim, name, make_paths(order), mode)
+        await run_worker(semaphore, command, self.rootdir)
+        try:
+            with open(self.get_path(name, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"status": "error", "target": victim}
+
+    async def scan(self):
+        semaphore = asyncio.Semaphore(self.workers)
+        nodeids = [item.nodeid for item in self.items]
+        orders = make_orders(nodeids)
+        outcomes = await asyncio.gather(
+            *(self.run_order(semaphore, name, order) for name, order in orders.items())
+        )
+        outcomes = OrderedDict(zip(orders, outcomes))
+        dependent = find_order_dependent(outcomes)
+
+        # the test is run first (alone): a victim passes alone and fails after a polluter,
+        # a brittle test fails alone and passes after a setter
+        alone = await asyncio.gather(
+            *(
+                self.run_order(semaphore, f"alone-{idx}", [nodeid])
+                for idx, nodeid in enumerate(dependent)
+            )
+        )
+        victims = OrderedDict()
+        for (nodeid, by_outcome), outcome in zip(dependent.items(), alone):
+            if outcome.get(nodeid) == PASSED:
+                victims[nodeid] = ("polluter", by_outcome[FAILED])
+            else:
+                victims[nodeid] = ("setter", by_outcome[PASSED])
+        victims = await self.confirm(semaphore, victims, orders)
+
+        hunts = await asyncio.gather(
+            *(
+                self.hunt(semaphore, idx, victim, orders[order_name], mode)
+                for idx, (victim, (mode, order_name)) in enumerate(victims.items())
+            )
+        )
+        for (victim, (_, order_name)), report in zip(victims.items(), hunts):
+            report["order"] = order_name
+            self.results[victim] = report
+        return outcomes
+
+    async def confirm(self, semaphore, victims, orders):
+        """
+        Run the failed run of every victim again (the order where it failed after a polluter,
+        alone when it needs a setter), a randomly flaky test isn't worth a hunt
+
+        Parameters
+        ----------
+        semaphore: asyncio.Semaphore
+        victims: OrderedDict[str, tuple[str, str]]
+            nodeid -> mode and name of the order for the hunt
+        orders: OrderedDict[str, List[str]]
+
+        Returns
+        -------
+        OrderedDict[str, tuple[str, str]]
+            victims which failed again
+        """
+        runs = OrderedDict()  # every order is run again only once for all its victims
+        by_victim = OrderedDict()
+        for idx, (nodeid, (mode, order_name)) in enumerate(victims.items()):
+            if mode == "polluter":
+                name = by_victim[nodeid] = f"confirm-{order_name}"
+                runs.setdefault(name, orders[order_name])
+            else:
+                name = by_victim[nodeid] = f"confirm-alone-{idx}"
+                runs[name] = [nodeid]
+        outcomes = await asyncio.gather(
+            *(self.run_order(semaphore, name, order) for name, order in runs.items())
+        )
+        outcomes = dict(zip(runs, outcomes))
+        confirmed = OrderedDict()
+        for nodeid, (mode, order_name) in victims.items():
+            if outcomes[by_victim[nodeid]].get(nodeid) == FAILED:
+                confirmed[nodeid] = (mode, order_name)
+            else:
+                self.flaky[nodeid] = order_name if mode == "polluter" else "alone"
+        return confirmed
+
+    def write_summary(self, outcomes):
+        self.reporter.write_sep("=", "sherlock scan", bold=True)
+        for name, tests in outcomes.items():
+            failed = sum(1 for outcome in tests.values() if outcome == FAILED)
+            self.reporter.line(f"order {name}: {len(tests)} tests, {failed} failed")
+        for nodeid, order_name in self.flaky.items():
+            self.reporter.line(
+                f"{nodeid} is randomly flaky, it didn't fail again ({order_name})"
+            )
+        if not self.results:
+            self.reporter.line("Order-dependent tests were not found")
+            return
+        self.reporter.line("Order-dependent tests:")
+        for victim, report in self.results.items():
+            mode = report.get("mode", "polluter")
+            if report.get("coupled"):
+                culprit = report["coupled"][0]
+                self.reporter.line(
+                    f"{victim} <- {mode} {culprit} (order {report['order']})"
+                )
+                self.reporter.line(f"    {report.get('reproduce')}")
+            else:
+                self.reporter.line(f"{victim} {mode} was not found")
+
+    def write_report(self):
+        if not self.report_path:
+            return False
+        tmp_path = f"{self.report_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"victims": self.results, "flaky": self.flaky}, f, indent=2)
+        os.replace(tmp_path, self.report_path)
+        return True
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        _ = session, config  # to make pylint happy
+        self.items = list(items)
+
+    def pytest_report_collectionfinish(self, config, items):
+        _ = config, items  # to make pylint happy
+        return f"Scan {len(self.items)} tests for order dependency by {self.workers} workers"
+
+    def pytest_runtestloop(self, session):
+        if session.config.option.collectonly:
+            return True
+        with tempfile.TemporaryDirectory(prefix="sherlock-scan-") as directory:
+            self.directory = directory
+            outcomes = asyncio.run(self.scan())
+        self.write_summary(outcomes)
+        self.write_report()
+        session.testsfailed = len(self.results)
+        return True
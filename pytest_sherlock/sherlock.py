@@ -1,21 +1,28 @@
 from __future__ import absolute_import
 
 import contextlib
+import importlib
+import signal
 from typing import List, Optional
 
 import pytest
 import six
 from _pytest.config import Config
 from _pytest.junitxml import _NodeReporter
-from _pytest.main import Session
 from _pytest.python import Function
-from _pytest.terminal import TerminalReporter
 
-from pytest_sherlock.binary_tree_search import draw_tree, length, make_tee
+from pytest_sherlock.coverage_index import CoverageIndex
+from pytest_sherlock.history import History
+from pytest_sherlock.hunt import Hunt, SherlockError, write_eta
+from pytest_sherlock.order import RecordedOrder
+from pytest_sherlock.recorder import get_logs_dir
+from pytest_sherlock.report import get_fixture_scopes
+from pytest_sherlock.repro import Reproduction, ReproductionError
+from pytest_sherlock.runner import MODE_AUTO, MODE_SETTER, MODE_SLOWDOWN
+from pytest_sherlock.strategy import Strategy, get_strategy
+from pytest_sherlock.trace import write_difference
 
-
-class SherlockError(Exception):
-    pass
+LAST_RECORDED = "last"
 
 
 class NotFoundError(SherlockError):
@@ -36,57 +43,189 @@ class NotFoundError(SherlockError):
         return cls(msg)
 
 
-def _remove_cached_results_from_failed_fixtures(item):
+def get_reusable_fixtures(config):
     """
-    This function force to remove all cached_result attribute from every fixture
+    Read `sherlock_reusable_fixtures` ini option, every line is a fixture name
+    with an optional callable which validates or resets the fixture value
+
+    [pytest]
+    sherlock_reusable_fixtures =
+        postgres = tests.helpers:truncate_tables
+        app_server
 
     Parameters
     ----------
-    item: Function
+    config: _pytest.config.Config
+
+    Returns
+    -------
+    dict[str, Optional[Callable[[Any], bool]]]
+    """
+    reusable = {}
+    for line in config.getini("sherlock_reusable_fixtures") or []:
+        name, _, path = (part.strip() for part in line.partition("="))
+        reusable[name] = resolve_callable(path) if path else None
+    return reusable
+
+
+def resolve_callable(path):
+    """
+    Parameters
+    ----------
+    path: str
+        'package.module:function'
+
+    Returns
+    -------
+    Callable
     """
+    module_name, _, attr = path.partition(":")
     try:
-        info = getattr(item, "_fixtureinfo")
-    except AttributeError:
-        # doctests items have no _fixtureinfo attribute
-        return False
-    if not info.name2fixturedefs:
-        # this test item does not use any fixtures
-        return False
-
-    for _, fixture_defs in sorted(info.name2fixturedefs.items()):
-        if not fixture_defs:
-            continue
-        for fixture_def in fixture_defs:
-            if hasattr(fixture_def, "cached_result"):
-                fixture_def.cached_result = None
-    return True
-
-
-def _remove_failed_setup_state_from_session(item):
+        obj = importlib.import_module(module_name)
+        for name in attr.split("."):
+            obj = getattr(obj, name)
+    except (ImportError, AttributeError, ValueError) as err:
+        raise pytest.UsageError(f"Can't import callable {path!r}: {err}") from err
+    if not callable(obj):
+        raise pytest.UsageError(f"{path!r} is not callable")
+    return obj
+
+
+def load_strategy(name):
+    """
+    Parameters
+    ----------
+    name: str
+        name of built-in strategy, name of `pytest_sherlock.strategies` entry point
+        or `package.module:Class` path
+
+    Returns
+    -------
+    Type[pytest_sherlock.strategy.Strategy]
+    """
+    strategy = get_strategy(name)
+    if strategy is None and ":" in name:
+        strategy = resolve_callable(name)
+    if strategy is None:
+        raise pytest.UsageError(f"Unknown sherlock strategy: {name!r}")
+    if not isinstance(strategy, type) or not issubclass(strategy, Strategy):
+        raise pytest.UsageError(f"{name!r} is not a subclass of {Strategy.__name__}")
+    return strategy
+
+
+def load_coverage(path):
+    """
+    Parameters
+    ----------
+    path: str
+        `.coverage` file with per-test contexts
+
+    Returns
+    -------
+    CoverageIndex
+    """
+    try:
+        return CoverageIndex(path)
+    except ValueError as err:
+        raise pytest.UsageError(str(err)) from err
+
+
+def check_timeout_method(config):
+    """
+    pytest-timeout with its `signal` method arms SIGALRM for every test
+    and cancels the timer of `watchdog`, so such a hunt would never time out
+
+    Parameters
+    ----------
+    config: _pytest.config.Config
+
+    Raises
+    ------
+    pytest.UsageError
+    """
+    if not hasattr(signal, "SIGALRM") or not config.pluginmanager.hasplugin("timeout"):
+        return
+    method = config.getoption("timeout_method", None) or config.getini("timeout_method")
+    if (method or "signal") == "signal":
+        raise pytest.UsageError(
+            "--sherlock-timeout conflicts with the signal method of pytest-timeout, "
+            "pass --timeout-method=thread or -p no:timeout"
+        )
+
+
+def get_cached_fixture_value(item, name, default=None):
+    """
+    Value of a higher scoped fixture which is still alive after the test,
+    useful for `--sherlock-probe` callables
+
+    Parameters
+    ----------
+    item: _pytest.python.Function
+    name: str
+        name of the fixture
+    default: Any
+        when the fixture isn't cached or it failed
+
+    Returns
+    -------
+    Any
     """
-    Force to call teardown for item.
+    info = getattr(item, "_fixtureinfo", None)
+    fixture_defs = getattr(info, "name2fixturedefs", {}).get(name)
+    cached_result = (
+        getattr(fixture_defs[-1], "cached_result", None) if fixture_defs else None
+    )
+    if not cached_result or cached_result[2] is not None:
+        return default
+    return cached_result[0]
 
+
+def get_common_fixtures(coupled_tests):
+    """
     Parameters
     ----------
-    item: Function
+    coupled_tests: List[_pytest.python.Function]
+
+    Returns
+    -------
+    set[str]
+        names of fixtures which used by every test
+    """
+    return set.intersection(*[set(t.fixturenames) for t in coupled_tests])
+
+
+def make_reproduce_command(coupled_tests):
+    """
+    Parameters
+    ----------
+    coupled_tests: List[_pytest.python.Function]
+
+    Returns
+    -------
+    str
+        pytest -l -vv tests/test_one.py::test_one tests/test_two.py::test_two
     """
-    setup_state = getattr(item.session, "_setupstate")
-    if hasattr(setup_state, "teardown_all"):
-        setup_state.teardown_all()  # until pytest 6.2.5
-    else:
-        setup_state.teardown_exact(None)  # from pytest 7.0.0
-    return True
+    coupled_test_names = " ".join(
+        t.nodeid.replace("::()::", "::") for t in coupled_tests
+    )
+    return f"pytest -l -vv {coupled_test_names}"
 
 
-def refresh_state(item):
+def get_failure_message(failed_report):
     """
     Parameters
     ----------
-    item: Function
+    failed_report: _pytest.runner.TestReport
+
+    Returns
+    -------
+    str
     """
-    _remove_cached_results_from_failed_fixtures(item)
-    _remove_failed_setup_state_from_session(item)
-    return True
+    if hasattr(failed_report.longrepr, "reprcrash"):
+        return failed_report.longrepr.reprcrash.message
+    if isinstance(failed_report.longrepr, six.string_types):
+        return failed_report.longrepr
+    return str(failed_report.longrepr)
 
 
 def write_coupled_report(coupled_tests):
@@ -102,14 +241,12 @@ def write_coupled_report(coupled_tests):
     """
     # Can I get info about modified common fixtures?
     coupled_test_names = [t.nodeid.replace("::()::", "::") for t in coupled_tests]
-    common_fixtures = set.intersection(*[set(t.fixturenames) for t in coupled_tests])
-    coupled_tests = "\n".join(coupled_test_names)
-    msg = f"Found coupled tests:\n{coupled_tests}\n\n"
+    common_fixtures = get_common_fixtures(coupled_tests)
+    msg = "Found coupled tests:\n{}\n\n".format("\n".join(coupled_test_names))
     if common_fixtures:
         common_fixtures = "\n".join(common_fixtures)
         msg += f"Common fixtures:\n{common_fixtures}\n\n"
-    coupled_test_names = " ".join(coupled_test_names)
-    msg += f"How to reproduce:\npytest -l -vv {coupled_test_names}\n"
+    msg += f"How to reproduce:\n{make_reproduce_command(coupled_tests)}\n"
     return msg
 
 
@@ -121,77 +258,60 @@ def find_target_test(items, test_name):
     raise NotFoundError.make_from(test_name, items)
 
 
-def make_collection(items, binary_tree=None):
-    root = binary_tree or make_tee((0, len(items)))
-    current_node = root
-    while current_node is not None:
-        if current_node.left is not None:
-            range_of_tests = slice(*current_node.left.items)
-        elif current_node.right is not None:
-            range_of_tests = slice(*current_node.right.items)
-        else:
-            range_of_tests = slice(*current_node.items)
-
-        bucket = items[range_of_tests]
-        has_report = yield bucket
-
-        if has_report and len(bucket) == 1:  # found coupled tests
-            return
-
-        if has_report:
-            current_node = current_node.left  # dive dipper if report was made
-        else:
-            current_node = current_node.right
-
-
-class Collection:
-    def __init__(self, collection, binary_tree, target_test_method):
-        self.collection = collection
-        self.binary_tree = binary_tree
-        self.target_test_method = target_test_method
-        self.min = length(self.binary_tree, min)
-        self.max = length(self.binary_tree, max)
-
-    @classmethod
-    def make(cls, items, target_test_method):
-        binary_tree = make_tee((0, len(items)))
-        collection = make_collection(items, binary_tree=binary_tree)
-        return cls(
-            collection=collection,
-            binary_tree=binary_tree,
-            target_test_method=target_test_method,
-        )
-
-    def send(self, is_fail: bool):
-        items = self.collection.send(is_fail)
-        if items:
-            items.append(self.target_test_method)
-            refresh_state(item=self.target_test_method)
-        return items
-
-    def __next__(self):
-        items = next(self.collection)
-        if items:
-            items.append(self.target_test_method)
-        return items
-
-    def __str__(self):
-        return draw_tree(self.binary_tree)
-
-
 class Steps:
+    """
+    Steps of the hunt are stored in pytest cache in compact form:
+    a shared table of nodeids (every collected test is written only once)
+    and `[start, stop]` range of the table for every step, the target test is stored separately
+    """
+
     STEPS_KEY = "PytestSherlock/steps"
     LAST_FAILED_KEY = "cache/lastfailed"
 
     def __init__(self, config: Config):
         self.config = config
+        self.nodeids = []
+        self.target = None
         self.steps = []
         self.start_from_step = self.config.option.step
+        # id of a list of items -> (the list, offset of its nodeids in the table)
+        self._offsets = {}
 
     def add(self, items):
-        self.steps.append([item.nodeid for item in items])
+        """
+        Parameters
+        ----------
+        items: Bucket
+            bucket of tests, the target is the last one
+        """
+        source = self._offsets.get(id(items.items))
+        if source is None:
+            source = self._offsets[id(items.items)] = (items.items, len(self.nodeids))
+            self.nodeids.extend(item.nodeid for item in items.items)
+        offset = source[1]
+        if items.target is not None:
+            self.target = items.target.nodeid
+        self.steps.append([offset + items.start, offset + items.stop])
         return True
 
+    def get_step(self, idx):
+        """
+        Parameters
+        ----------
+        idx: int
+            index of the step (from zero)
+
+        Returns
+        -------
+        set[str]
+            nodeids of tests of the step (including the target)
+        """
+        start, stop = self.steps[idx]
+        tests = set(self.nodeids[start:stop])
+        if self.target is not None:
+            tests.add(self.target)
+        return tests
+
     def setup_from_step(self, items):
         """
         Uses cache to get data about previous execution for filtering out tests only for this step.
@@ -209,18 +329,49 @@ class Steps:
         if self.start_from_step:
             target_step = self.start_from_step - 1
             if self.steps and len(self.steps) > target_step:
-                tests_from_step = self.steps[target_step]
+                tests_from_step = self.get_step(target_step)
                 items[:] = [item for item in items if item.nodeid in tests_from_step]
             else:
                 # not found any steps in cache from previous execution
                 self.start_from_step = None
+        self.clear()  # steps of the current execution will be stored instead
         return items
 
+    def clear(self):
+        self.nodeids, self.target, self.steps = [], None, []
+        self._offsets = {}
+        return self
+
+    def load(self, data):
+        """
+        Parameters
+        ----------
+        data: Union[dict, List[List[str]]]
+            compact steps or a list of nodeids per step (written by older versions)
+        """
+        if isinstance(data, dict):
+            self.nodeids = list(data.get("nodeids", []))
+            self.target = data.get("target")
+            self.steps = [list(step) for step in data.get("steps", [])]
+        elif isinstance(data, list):
+            self.nodeids, self.steps = [], []
+            for step in data:
+                *tests, self.target = step
+                self.steps.append([len(self.nodeids), len(self.nodeids) + len(tests)])
+                self.nodeids.extend(tests)
+        return self
+
     def read(self):
-        pass
+        data = self.config.cache.get(self.STEPS_KEY, None)
+        if data:
+            self.load(data)
+        return self
+
+    def dump(self):
+        return {"nodeids": self.nodeids, "target": self.target, "steps": self.steps}
 
     def store(self, last_failed_items: Optional[List[Function]] = None):
-        self.config.cache.set(self.STEPS_KEY, self.steps)
+        self.config.cache.set(self.STEPS_KEY, self.dump())
         if last_failed_items:
             self.config.cache.set(
                 self.LAST_FAILED_KEY, {i.nodeid: True for i in last_failed_items}
@@ -240,56 +391,29 @@ class Sherlock(object):
     def __init__(self, config):
         self.config: Config = config
         self._steps: Steps = Steps(self.config)
-        # initialize via pytest_sessionstart
-        self.reporter: Optional[TerminalReporter] = None
-        self.session: Optional[Session] = None
-        # initialize via pytest_collection_modifyitems
-        self.collection: Optional[Collection] = None
-        # initialize via pytest_runtest_makereport
-        self.failed_report = None
+        self._history: Optional[History] = History.from_config(self.config)
+        probe = config.getoption("--sherlock-probe")
+        self.hunt: Hunt = Hunt(
+            config,
+            strategy=load_strategy(config.getoption("--sherlock-strategy")),
+            probe=resolve_callable(probe) if probe else None,
+        )
+        coverage = config.getoption("--sherlock-coverage")
+        self.coverage: Optional[CoverageIndex] = (
+            load_coverage(coverage) if coverage else None
+        )
+        if config.getoption("--sherlock-timeout") is not None:
+            check_timeout_method(config)
+        # initialize via pytest_collection_modifyitems, amount of candidates pruned by coverage
+        self.pruned: Optional[int] = None
         # initialize via pytest_runtestloop
         self.last_failed = None
 
-    def write_step(self, step, maximum):
-        """
-        Write summary of steps
-        For Example:
-        _______________________________ Step [1 of 4]: _______________________________
-        ...
-
-        :param str|int step:
-        :param str|int maximum:
-        """
-        message = f"Step [{step} of {maximum}]:"
-        self.reporter.write_sep("_", message, yellow=True, bold=True)
-
-    def reset_progress(self, items):
-        """
-        Patch progress for each step
-        100% should be all tests from collection + target test
-        For example:
-        _______________________________ Step [1 of 4]: _______________________________
-        tests/exmaple/test_c_delete.py::test_delete_random_param PASSED         [ 20%]
-        tests/exmaple/test_b_modify.py::test_modify_random_param PASSED         [ 40%]
-        tests/exmaple/test_c_delete.py::test_deleted_passed PASSED              [ 60%]
-        tests/exmaple/test_c_delete.py::test_do_not_delete PASSED               [ 80%]
-        tests/exmaple/test_all_read.py::test_read_params FAILED                 [100%]
-        _______________________________ Step [2 of 4]: _______________________________
-        tests/exmaple/test_c_delete.py::test_delete_random_param PASSED         [ 33%]
-        tests/exmaple/test_b_modify.py::test_modify_random_param PASSED         [ 66%]
-        tests/exmaple/test_all_read.py::test_read_params FAILED                 [100%]
-        ...
+    @property
+    def reporter(self):
+        return self.config.pluginmanager.get_plugin("terminalreporter")
 
-        Parameters
-        ----------
-        items: List[_pytest.python.Function]
-            bucket of tests
-        """
-        self.failed_report = None
-        setattr(self.reporter, "_progress_nodeids_reported", set())
-        setattr(self.session, "testscollected", len(items))
-
-    def patch_report(self, failed_report, coupled):
+    def patch_report(self, failed_report, coupled, difference=None, setter=False):
         """
         Patch reports console output and Junit result xml
         to avoid multi errors in report
@@ -299,14 +423,20 @@ class Sherlock(object):
         failed_report: _pytest.runner.TestReport
         coupled: List[_pytest.python.Function]
             list of coupled tests, last should be a target
+        difference: Optional[str]
+            description of the state which the victim reads differently
+        setter: bool
+            the first test sets up state which the target needs,
+            the failed report is the target run alone
         """
         target_item = coupled[-1]
-        if hasattr(failed_report.longrepr, "reprcrash"):
-            message = failed_report.longrepr.reprcrash.message
-        elif isinstance(failed_report.longrepr, six.string_types):
-            message = failed_report.longrepr
-        else:
-            message = str(failed_report.longrepr)
+        message = get_failure_message(failed_report)
+        if difference:
+            message = f"{difference}\n\n{message}"
+        if setter:
+            message = (
+                f"The target fails without the setter {coupled[0].nodeid}:\n{message}"
+            )
         failed_report.longrepr = f"\n{write_coupled_report(coupled)}\n\n{message}"
         self.reporter.stats["failed"] = [failed_report]
         xml = getattr(self.config, "_xml", None)
@@ -318,14 +448,204 @@ class Sherlock(object):
             xml.stats["failure"] = 1
         return True
 
+    def write_reproduction(self, coupled):
+        """
+        Write standalone reproduction of coupled tests in case it was requested
+
+        Parameters
+        ----------
+        coupled: List[_pytest.python.Function]
+            list of coupled tests, last should be a target
+        """
+        directory = self.config.getoption("--sherlock-repro")
+        if directory is None:
+            return False
+        rootdir = getattr(self.config, "rootpath", None) or self.config.rootdir
+        try:
+            _, command = Reproduction(coupled, str(rootdir)).write(directory or None)
+        except (OSError, ReproductionError) as err:
+            self.reporter.write_line(f"Can't write reproduction: {err!r}", red=True)
+            return False
+        self.reporter.write_line(f"How to reproduce standalone:\n{command}", bold=True)
+        return True
+
+    def write_final_report(self, message=None, difference=None):
+        """
+        Finish machine-readable report in case it was requested
+
+        Parameters
+        ----------
+        message: Optional[str]
+            origin failure message of the target test
+        difference: Optional[dict[str, str]]
+            the first state which the victim reads differently
+        """
+        if not self.hunt.report:
+            return False
+        if not self.last_failed:
+            return self.hunt.report.finish()
+
+        target_item = self.last_failed[-1]
+        return self.hunt.report.finish(
+            coupled=[item.nodeid for item in self.last_failed],
+            fixtures=get_fixture_scopes(
+                target_item, get_common_fixtures(self.last_failed)
+            ),
+            reproduce=make_reproduce_command(self.last_failed),
+            message=message,
+            difference=difference,
+        )
+
+    def found_setter(self, coupled):
+        """
+        The target passed after the setter: the verdict is the failure of the target alone
+
+        Parameters
+        ----------
+        coupled: List[_pytest.python.Function]
+            the setter and the target
+
+        Returns
+        -------
+        tuple[str, Optional[dict[str, str]]]
+            the failure message and the first state which the target reads differently
+        """
+        alone_report = self.hunt.verdict.alone_report
+        difference = None
+        if self.config.getoption("--sherlock-trace"):
+            difference = self.hunt.runner.trace(coupled)
+        self.patch_report(
+            alone_report,
+            coupled=coupled,
+            difference=difference and write_difference(difference, setter=True),
+            setter=True,
+        )
+        self.last_failed = coupled
+        return get_failure_message(alone_report), difference
+
+    def found_failed_step(self, session, coupled):
+        """
+        The target was slow after the polluter (slowdown mode) or the polluter hung
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        coupled: List[_pytest.python.Function]
+            the polluter and the target
+
+        Returns
+        -------
+        str
+            why the last step was failed
+        """
+        message = self.hunt.verdict.describe(coupled)
+        self.reporter.write_line(
+            f"{write_coupled_report(coupled)}\n{message}", red=True
+        )
+        # failures of the previous steps aren't the verdict
+        self.reporter.stats.pop("failed", None)
+        session.testsfailed += 1
+        self.last_failed = coupled
+        self.write_reproduction(coupled)
+        return message
+
+    def found_polluter(self, coupled):
+        """
+        The target failed after the polluter
+
+        Parameters
+        ----------
+        coupled: List[_pytest.python.Function]
+            the polluter and the target
+
+        Returns
+        -------
+        tuple[str, Optional[dict[str, str]]]
+            the failure message and the first state which the target reads differently
+        """
+        failed_report = self.hunt.verdict.failed_report
+        message = get_failure_message(failed_report)
+        difference = None
+        if self.config.getoption("--sherlock-trace"):
+            difference = self.hunt.runner.trace(coupled)
+        self.patch_report(
+            failed_report,
+            coupled=coupled,
+            difference=difference and write_difference(difference),
+        )
+        self.last_failed = coupled
+        self.write_reproduction(coupled)
+        if self._history:
+            polluter, victim = coupled
+            self._history.add(
+                polluter.nodeid, victim.nodeid, get_common_fixtures(coupled)
+            )
+        return message, difference
+
+    def write_verdict(self, session, items, failed):
+        """
+        Report the coupled tests by the last bucket of the hunt
+
+        Parameters
+        ----------
+        session: _pytest.main.Session
+        items: Bucket
+            the last bucket, empty when there was nothing to find
+        failed: bool
+            verdict of the last step
+        """
+        verdict = self.hunt.verdict
+        message = difference = None
+        if items and verdict.mode == MODE_SETTER:
+            if not failed:  # the target passed after the setter
+                message, difference = self.found_setter(items)
+            else:
+                self.reporter.stats["failed"] = [verdict.alone_report]
+        elif failed and (
+            verdict.failed_report is None or verdict.mode == MODE_SLOWDOWN
+        ):
+            message = self.found_failed_step(session, items)
+        elif failed:
+            message, difference = self.found_polluter(items)
+        return self.write_final_report(message, difference)
+
     @pytest.hookimpl(hookwrapper=True, trylast=True)
     def pytest_sessionstart(self, session):
-        self.session = session
+        _ = session  # to make pylint happy
         self._steps.read()
-        if self.reporter is None:
-            self.reporter = self.config.pluginmanager.get_plugin("terminalreporter")
         yield
 
+    def get_candidates(self, config, before, items, target_test_method):
+        """
+        Parameters
+        ----------
+        config: _pytest.config.Config
+        before: List[_pytest.python.Function]
+            tests collected before the target
+        items: List[_pytest.python.Function]
+            all collected tests
+        target_test_method: _pytest.python.Function
+
+        Returns
+        -------
+        List[_pytest.python.Function]
+            tests which were executed before the target (by recorded order if it was passed)
+        """
+        path = config.getoption("--sherlock-order")
+        if not path:
+            return before
+        if path == LAST_RECORDED:
+            path = get_logs_dir(config)
+        order = RecordedOrder.read(path)
+        candidates = order.resolve(items, target_test_method)
+        if candidates is None:
+            raise SherlockError(
+                f"Test {target_test_method.nodeid} not found in recorded order: {path}"
+            )
+        # ETA of the first hunt comes from durations of the recorded run
+        self.hunt.runner.durations.seed(order.get_durations(items))
+        return candidates
+
     @pytest.hookimpl(hookwrapper=True, trylast=True)
     def pytest_collection_modifyitems(self, session, config, items):
         r"""
@@ -374,17 +694,48 @@ class Sherlock(object):
             idx, target_test_method = find_target_test(
                 items, config.option.flaky_test.strip()
             )
-            target_items = sorted(
-                self._steps.setup_from_step(items[:idx]),
-                key=lambda item: (
-                    len(set(item.fixturenames) & set(target_test_method.fixturenames)),
-                    item.parent.nodeid,  # Can we do AST or Name or Content analysis?
-                ),
-                reverse=True,
+            candidates = self.get_candidates(
+                config, items[:idx], items, target_test_method
             )
+            if self.coverage is not None:
+                before = len(candidates)
+                candidates = self.coverage.prune(
+                    candidates,
+                    target_test_method,
+                    config.getoption("--sherlock-coverage-by"),
+                )
+                self.pruned = before - len(candidates)
+            target_items = self._steps.setup_from_step(candidates)
+            if not config.getoption("--sherlock-order"):
+                # the recorded order is the execution order, it is kept as it was
+                known = (
+                    self._history.make_sort_key(target_test_method.nodeid)
+                    if self._history
+                    else lambda item: ()
+                )
+                target_items = sorted(
+                    target_items,
+                    key=lambda item: (
+                        known(item),
+                        len(
+                            set(item.fixturenames)
+                            & set(target_test_method.fixturenames)
+                        ),
+                        item.parent.nodeid,  # Can we do AST or Name or Content analysis?
+                    ),
+                    reverse=True,
+                )
+            suspects = []
+            if self._history and not self._steps.start_from_step:
+                polluters = self._history.polluters(target_test_method.nodeid)
+                suspects = [item for item in target_items if item.nodeid in polluters]
             items[:] = [target_test_method]
-            self.collection = Collection.make(
-                target_items, target_test_method=target_test_method
+            self.hunt.start(
+                target_items,
+                target_test_method,
+                suspects=suspects,
+                reset=config.getoption("--sherlock-reset"),
+                reusable=get_reusable_fixtures(config),
             )
         yield
 
@@ -401,7 +752,16 @@ class Sherlock(object):
             contain just target test
         """
         _ = config, startdir, items  # to make pylint happy
-        msg = f"Try to find coupled tests in [{self.collection.min}-{self.collection.max}] steps"
+        if self.hunt.verdict.mode == MODE_AUTO:
+            # the mode and the steps are known after the target is run alone
+            return "Run the target alone to choose what to find"
+        collection = self.hunt.collection
+        msg = f"Try to find coupled tests in [{collection.min}-{collection.max}] steps"
+        eta = self.hunt.get_eta()
+        if eta is not None:
+            msg = f"{msg}, {write_eta(eta)}"
+        if self.pruned is not None:
+            msg = f"{msg}, coverage pruned {self.pruned} candidates"
         if self._steps.start_from_step:
             msg = f"{msg} (reproduce from {self._steps.start_from_step} step)"
         return msg
@@ -423,46 +783,28 @@ class Sherlock(object):
         if session.config.option.collectonly:
             return True
 
-        step = 1
-        items = next(self.collection)
-        while items:
-            self.write_step(step, self.collection.max)
-            self.reset_progress(items)
-            self._steps.add(items)
-
-            for next_idx, item in enumerate(items, 1):
-                next_item = items[next_idx] if next_idx < len(items) else None
-                self.config.hook.pytest_runtest_protocol(item=item, nextitem=next_item)
-                if session.shouldfail:
-                    raise session.Failed(session.shouldfail)
-                if session.shouldstop:
-                    raise session.Interrupted(session.shouldstop)
-
-            try:
-                # shift left if a report is red or shifts right if green
-                items = self.collection.send(bool(self.failed_report))
-            except StopIteration as err:
-                if len(items) != 2:  # the last iteration must contain two tests
-                    raise SherlockError("Something is going wrong") from err
-                if self.failed_report:
-                    self.patch_report(self.failed_report, coupled=items)
-                    self.last_failed = items
-                break
-
-            step += 1
-
+        last = self.hunt.run(session, self._steps)
+        if last is not None:  # the budget is over otherwise
+            self.write_verdict(session, *last)
         return True
 
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        tracer = self.hunt.runner.tracer
+        if tracer is None or item is not self.hunt.collection.target_test_method:
+            yield
+            return
+        with tracer:
+            yield
+
     @pytest.hookimpl(hookwrapper=True, trylast=True)
     def pytest_runtest_makereport(self, item, call):
         _ = item, call  # to make pylint happy
         report = yield
         test_report = report.get_result()
-        if (
-            test_report.nodeid == self.collection.target_test_method.nodeid
-            and test_report.outcome != "passed"
-        ):
-            self.failed_report = test_report
+        self.hunt.runner.durations.add(test_report)
+        if test_report.nodeid == self.hunt.collection.target_test_method.nodeid:
+            self.hunt.verdict.add(test_report)
         elif test_report.outcome != "passed":
             test_report.outcome = "flaky"
             if self.config.getvalue("verbose") >= 2:
@@ -476,3 +818,4 @@ class Sherlock(object):
         _ = session  # to make pylint happy
         yield
         self._steps.store(self.last_failed)
+        self.hunt.runner.durations.store()
@@ -0,0 +1,210 @@
+from __future__ import absolute_import
+
+import pytest
+from _pytest.runner import CallInfo
+
+RESET_SOFT = "soft"
+RESET_HARD = "hard"
+
+
+def _remove_cached_results_from_failed_fixtures(item):
+    """
+    This function force to remove all cached_result attribute from every fixture
+
+    Parameters
+    ----------
+    item: Function
+    """
+    try:
+        info = getattr(item, "_fixtureinfo")
+    except AttributeError:
+        # doctests items have no _fixtureinfo attribute
+        return False
+    if not info.name2fixturedefs:
+        # this test item does not use any fixtures
+        return False
+
+    for _, fixture_defs in sorted(info.name2fixturedefs.items()):
+        if not fixture_defs:
+            continue
+        for fixture_def in fixture_defs:
+            if hasattr(fixture_def, "cached_result"):
+                fixture_def.cached_result = None
+    return True
+
+
+def _remove_failed_setup_state_from_session(item):
+    """
+    Force to call teardown for item.
+
+    Parameters
+    ----------
+    item: Function
+    """
+    setup_state = getattr(item.session, "_setupstate")
+    if hasattr(setup_state, "teardown_all"):
+        setup_state.teardown_all()  # until pytest 6.2.5
+    else:
+        setup_state.teardown_exact(None)  # from pytest 7.0.0
+    return True
+
+
+def _reset_reusable_fixture(reset, value):
+    """
+    Parameters
+    ----------
+    reset: Optional[Callable[[Any], bool]]
+        user defined callable which validates or resets the value of fixture
+    value: Any
+        cached value of fixture
+
+    Returns
+    -------
+    bool
+        True in case when the fixture could be reused
+    """
+    if reset is None:
+        return True
+    try:
+        return bool(reset(value))
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+
+def _finish_touched_fixtures(item, touched, reusable=None):
+    """
+    Finish only fixtures of the item which were touched by the previous step
+    (the item itself could change them too) or which were failed during setup,
+    other fixtures stay cached.
+    Touched reusable fixtures are reset by the user callable instead of finishing.
+
+    Parameters
+    ----------
+    item: Function
+    touched: set[str]
+        names of fixtures used by the previous step
+    reusable: Optional[dict[str, Optional[Callable[[Any], bool]]]]
+        names of fixtures which could be kept between steps with their reset callables
+    """
+    info = getattr(item, "_fixtureinfo", None)
+    if info is None or not info.name2fixturedefs:
+        # doctests items have no _fixtureinfo attribute
+        return False
+
+    reusable = reusable or {}
+    if not getattr(item, "_request", None):
+        getattr(
+            item, "_initrequest"
+        )()  # the request is dropped by pytest after each run
+    for name, fixture_defs in sorted(info.name2fixturedefs.items()):
+        for fixture_def in fixture_defs or ():
+            cached_result = getattr(fixture_def, "cached_result", None)
+            if cached_result is None:
+                continue
+            has_error = cached_result[2] is not None
+            if not has_error and name not in touched:
+                continue
+            if (
+                not has_error
+                and name in reusable
+                and _reset_reusable_fixture(reusable[name], cached_result[0])
+            ):
+                continue
+            fixture_def.finish(getattr(item, "_request"))
+    return True
+
+
+def teardown_towards(item, nextitem):
+    """
+    Teardown setup stack only until nodes which the next item also descends from
+
+    Parameters
+    ----------
+    item: Function
+    nextitem: Function
+    """
+    setup_state = getattr(item.session, "_setupstate")
+    if hasattr(setup_state, "teardown_all"):
+        setup_state.teardown_exact(item, nextitem)  # until pytest 6.2.5
+    else:
+        setup_state.teardown_exact(nextitem)  # from pytest 7.0.0
+    return True
+
+
+def _call_lean(item, when, **kwds):
+    hook = getattr(item.ihook, f"pytest_runtest_{when}")
+    reraise = (pytest.exit.Exception,)
+    if not item.config.getoption("usepdb", False):
+        reraise += (KeyboardInterrupt,)
+    return CallInfo.from_call(
+        lambda: hook(item=item, **kwds), when=when, reraise=reraise
+    )
+
+
+def run_lean(item, nextitem=None):
+    """
+    Run setup, call and teardown of the test like `runtestprotocol`, but without reports:
+    no `pytest_runtest_makereport` (longrepr isn't formatted), no log hooks
+    (terminal progress, JUnit XML), only the verdict of the target matters
+
+    Parameters
+    ----------
+    item: Function
+    nextitem: Optional[Function]
+
+    Returns
+    -------
+    List[_pytest.runner.CallInfo]
+    """
+    hasrequest = hasattr(item, "_request")
+    if hasrequest and not getattr(item, "_request"):
+        getattr(item, "_initrequest")()
+    try:
+        calls = [_call_lean(item, "setup")]
+        if calls[0].excinfo is None:
+            calls.append(_call_lean(item, "call"))
+        calls.append(_call_lean(item, "teardown", nextitem=nextitem))
+    finally:
+        if hasrequest:
+            setattr(item, "_request", False)
+            item.funcargs = None
+    return calls
+
+
+def get_touched_fixtures(items):
+    """
+    Parameters
+    ----------
+    items: Iterable[_pytest.python.Function]
+
+    Returns
+    -------
+    set[str]
+        names of all fixtures used by items
+    """
+    return set().union(*[set(item.fixturenames) for item in items])
+
+
+def refresh_state(item, touched=None, nextitem=None, level=RESET_HARD, reusable=None):
+    """
+    Parameters
+    ----------
+    item: Function
+    touched: Optional[set[str]]
+        names of fixtures used by the previous step (its tests and the target)
+    nextitem: Optional[Function]
+        the first test of the next step
+    level: str
+        "hard" - drop all cached fixtures and tear down whole session
+        "soft" - finish only touched or failed fixtures of the item
+    reusable: Optional[dict[str, Optional[Callable[[Any], bool]]]]
+        fixtures which are reset by user callable instead of finishing ("soft" level only)
+    """
+    if level == RESET_SOFT and nextitem is not None:
+        _finish_touched_fixtures(item, touched or set(), reusable)
+        teardown_towards(item, nextitem)
+        return True
+
+    _remove_cached_results_from_failed_fixtures(item)
+    _remove_failed_setup_state_from_session(item)
+    return True
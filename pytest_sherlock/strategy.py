@@ -0,0 +1,484 @@
+from __future__ import absolute_import
+
+import importlib
+import sys
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from pytest_sherlock.binary_tree_search import Node, draw_tree, length, make_tee
+
+ENTRY_POINTS_GROUP = "pytest_sherlock.strategies"
+DEFAULT_STRATEGY = "binary"
+
+
+class Bucket(Sequence):
+    """
+    Lightweight view of collected tests `items[start:stop]` (+ the target test at the end),
+    it doesn't copy the list of items
+    """
+
+    __slots__ = ("items", "start", "stop", "target", "_nodeids")
+
+    def __init__(self, items, start, stop, target=None):
+        self.items = items
+        self.start = start
+        self.stop = stop
+        self.target = target
+        self._nodeids = None
+
+    def with_target(self, target):
+        return Bucket(self.items, self.start, self.stop, target)
+
+    @property
+    def tests(self):
+        """Tests of the bucket without the target test"""
+        return (self.items[idx] for idx in range(self.start, self.stop))
+
+    @property
+    def nodeids(self):
+        """Nodeids are collected only once and shared by the report and the steps"""
+        if self._nodeids is None:
+            self._nodeids = [item.nodeid for item in self]
+        return self._nodeids
+
+    def __len__(self):
+        return self.stop - self.start + (self.target is not None)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(len(self))[idx]]
+        idx = range(len(self))[idx]  # raises IndexError
+        if idx == self.stop - self.start:
+            return self.target
+        return self.items[self.start + idx]
+
+    def __iter__(self):
+        yield from self.tests
+        if self.target is not None:
+            yield self.target
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            a is b or a == b for a, b in zip(self, other)
+        )
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Bucket({self.start}:{self.stop}, target={self.target!r})"
+
+
+def bucket_of(node):
+    """
+    The left child is checked first
+
+    Parameters
+    ----------
+    node: pytest_sherlock.binary_tree_search.Node
+
+    Returns
+    -------
+    tuple[int, int]
+        range of tests which must be run with the target test
+    """
+    return (node.left or node.right or node).items
+
+
+class Strategy(object):
+    """
+    Interface of search strategies, a strategy proposes buckets of candidates
+    (they are run before the target test) and narrows candidates by verdicts of the target.
+
+    Custom strategies are selected by `--sherlock-strategy=name` via
+    `pytest_sherlock.strategies` entry points group or by `package.module:Class` path.
+
+    Parameters
+    ----------
+    items: List[_pytest.python.Function]
+        candidates ordered by probability to be the polluter (the first is the most probable)
+    suspects: Iterable[_pytest.python.Function]
+        known polluters of the target test, they should be checked first
+    """
+
+    name = None
+
+    def __init__(self, items, suspects=()):
+        self.items = items
+        self.suspects = list(suspects)
+
+    def bounds(self):
+        """
+        Returns
+        -------
+        tuple[int, int]
+            minimum and maximum amount of steps
+        """
+        raise NotImplementedError
+
+    def propose(self):
+        """
+        Returns
+        -------
+        Optional[Bucket]
+            the next bucket which must be run (without the target test),
+            None when the search is finished
+        """
+        raise NotImplementedError
+
+    def speculate(self, limit):
+        """
+        Buckets which could be needed by the next verdicts, they are run by idle workers
+
+        Parameters
+        ----------
+        limit: int
+
+        Returns
+        -------
+        List[Bucket]
+        """
+        _ = limit  # to make pylint happy
+        return []
+
+    def feed(self, bucket, failed):
+        """
+        Accept the verdict of the proposed bucket
+        (verdicts of speculative buckets are fed when they become proposed)
+
+        Parameters
+        ----------
+        bucket: Bucket
+        failed: bool
+            the target test failed after tests of the bucket
+        """
+        raise NotImplementedError
+
+    def answer(self):
+        """
+        Returns
+        -------
+        Optional[_pytest.python.Function]
+            the polluter when the search is finished successfully
+        """
+        raise NotImplementedError
+
+    def narrowest(self):
+        """
+        Returns
+        -------
+        tuple[int, int]
+            range of candidates which still must contain the polluter
+        """
+        return 0, len(self.items)
+
+    def estimate(self, cost):
+        """
+        Parameters
+        ----------
+        cost: Callable[[Bucket], float]
+            estimated duration of a bucket
+
+        Returns
+        -------
+        Optional[tuple[float, float]]
+            expected and the worst duration of the rest of the search
+            (including the proposed bucket), None when it's unknown
+        """
+        _ = cost  # to make pylint happy
+
+    def describe(self):
+        """Human readable description of the search space"""
+        return f"{self.name}: {len(self.items)} candidates"
+
+
+class BinaryStrategy(Strategy):
+    """
+    Binary search by the tree of ranges (`make_tee`), the left half is checked first:
+    if the target fails the polluter is in the left half, otherwise in the right one
+    """
+
+    name = DEFAULT_STRATEGY
+
+    def __init__(self, items, suspects=()):
+        super().__init__(items, suspects)
+        self.binary_tree = self.make_tree() if self.items else None
+        self.node = self.binary_tree
+        self._suspect_idx = 0
+        self._answer = None
+        # the narrowest range of candidates which must contain the polluter
+        # and the path to it in the tree (`L` - bucket failed, `R` - bucket passed)
+        self.range = self.binary_tree.items if self.binary_tree else (0, 0)
+        self.path = ""
+        # the cost and estimates of subtrees by it, the rest of the search is a subtree
+        self._estimated = None, {}
+
+    def make_tree(self):
+        """
+        Returns
+        -------
+        pytest_sherlock.binary_tree_search.Node
+            every node is split into the left and the right adjacent ranges
+        """
+        return make_tee((0, len(self.items)))
+
+    def bounds(self):
+        if self.suspects:
+            return 1, length(self.binary_tree, max) + len(self.suspects)
+        return length(self.binary_tree, min), length(self.binary_tree, max)
+
+    def propose(self):
+        if self._answer is not None:
+            return None
+        if self._suspect_idx < len(self.suspects):
+            return Bucket(self.suspects, self._suspect_idx, self._suspect_idx + 1)
+        if self.node is None:
+            return None
+        return Bucket(self.items, *bucket_of(self.node))
+
+    def speculate(self, limit):
+        buckets = [
+            Bucket(self.suspects, idx, idx + 1)
+            for idx in range(self._suspect_idx + 1, len(self.suspects))
+        ]
+        if self.node is None:
+            queue = []
+        elif self._suspect_idx < len(self.suspects):
+            queue = [self.node]
+        else:
+            queue = [child for child in (self.node.left, self.node.right) if child]
+        while queue and len(buckets) < limit:
+            node = queue.pop(0)
+            buckets.append(Bucket(self.items, *bucket_of(node)))
+            queue.extend(child for child in (node.left, node.right) if child)
+        return buckets[:limit]
+
+    def feed(self, bucket, failed):
+        if self._suspect_idx < len(
+            self.suspects
+        ):  # known polluters are checked one by one
+            self._suspect_idx += 1
+            if failed:
+                self._answer = bucket[0]
+            return
+        if failed and len(bucket) == 1:  # found coupled tests
+            self._answer = bucket[0]
+        if failed:
+            self.range = (bucket.start, bucket.stop)
+            self.node = self.node.left  # dive dipper if report was made
+        else:
+            self.range = (bucket.stop, self.range[1])
+            self.node = self.node.right
+        self.path += "L" if failed else "R"
+
+    def answer(self):
+        return self._answer
+
+    def narrowest(self):
+        return self.range
+
+    def estimate(self, cost):
+        if self._answer is not None:
+            return 0.0, 0.0
+        if self._estimated[0] is not cost:
+            self._estimated = cost, {}
+        estimates = self._estimated[1]
+
+        def _walk(node):
+            if node is None:
+                return 0.0, 0.0
+            if id(node) in estimates:
+                return estimates[id(node)]
+            start, stop = bucket_of(node)
+            bucket_cost = cost(Bucket(self.items, start, stop))
+            if node.left is None and node.right is None:
+                estimates[id(node)] = bucket_cost, bucket_cost
+                return estimates[id(node)]
+            # the failed bucket of a single test finishes the search
+            left = _walk(node.left) if stop - start > 1 else (0.0, 0.0)
+            right = _walk(node.right)
+            # both verdicts are equally probable
+            estimates[id(node)] = (
+                bucket_cost + (left[0] + right[0]) / 2,
+                bucket_cost + max(left[1], right[1]),
+            )
+            return estimates[id(node)]
+
+        suspects = sum(
+            cost(Bucket(self.suspects, idx, idx + 1))
+            for idx in range(self._suspect_idx, len(self.suspects))
+        )
+        expected, worst = _walk(self.node)
+        return suspects + expected, suspects + worst
+
+    def describe(self):
+        return draw_tree(self.binary_tree) if self.binary_tree else ""
+
+
+class _Scope(object):
+    """Group of collected tests: package, module, class or function with parametrized variants"""
+
+    __slots__ = ("children", "items")
+
+    def __init__(self):
+        self.children = OrderedDict()
+        self.items = []
+
+    def flatten(self):
+        tests = list(self.items)
+        for child in self.children.values():
+            tests.extend(child.flatten())
+        return tests
+
+    def parts(self, start):
+        """
+        Returns
+        -------
+        List[tuple[Optional[_Scope], int, int]]
+            adjacent ranges of children, a single test has no scope
+        """
+        if self.items:  # variants of the function are split only inside of it
+            return [
+                (None, idx, idx + 1) for idx in range(start, start + len(self.items))
+            ]
+        parts = []
+        for child in self.children.values():
+            size = len(child.flatten())
+            parts.append((child, start, start + size))
+            start += size
+        return parts
+
+
+def scope_path(item):
+    """
+    Parameters
+    ----------
+    item: _pytest.python.Function
+
+    Returns
+    -------
+    List[str]
+        nodeids of parents (packages, module, class) from the outermost
+        and the name of the function without parametrize id
+    """
+    path = []
+    node = getattr(item, "parent", None)
+    while node is not None and isinstance(getattr(node, "nodeid", None), str):
+        if node.nodeid:  # the session
+            path.append(node.nodeid)
+        node = getattr(node, "parent", None)
+    path.reverse()
+    name = getattr(item, "originalname", None)
+    if not isinstance(name, str) or not name:
+        name = item.name.split("[")[0]
+    path.append(name)
+    return path
+
+
+def make_scope_tree(root, start=0):
+    """
+    Parameters
+    ----------
+    root: _Scope
+    start: int
+        index of the first test of the scope
+
+    Returns
+    -------
+    pytest_sherlock.binary_tree_search.Node
+        tree which ranges are split only on boundaries of scopes
+    """
+
+    def _split(parts):
+        if len(parts) == 1:
+            scope, part_start, part_stop = parts[0]
+            if scope is None:
+                return Node((part_start, part_stop))
+            return _split(
+                scope.parts(part_start)
+            )  # the single child has the same range
+
+        first, last = parts[0][1], parts[-1][2]
+        half = first + (last - first) // 2
+        # the boundary of scopes which splits tests the most evenly
+        middle = min(range(1, len(parts)), key=lambda idx: abs(parts[idx][1] - half))
+        node = Node((first, last))
+        node.left = _split(parts[:middle])
+        node.right = _split(parts[middle:])
+        return node
+
+    return _split(root.parts(start))
+
+
+class ScopeStrategy(BinaryStrategy):
+    """
+    Binary search by the tree which splits candidates on boundaries of packages, modules,
+    classes and functions (parametrized variants are split at the end),
+    tests of the same scope are grouped together to keep higher scoped fixtures between steps
+    """
+
+    name = "scope"
+
+    def __init__(self, items, suspects=()):
+        self.root = _Scope()
+        for item in items:
+            scope = self.root
+            for key in scope_path(item):
+                scope = scope.children.setdefault(key, _Scope())
+            scope.items.append(item)
+        super().__init__(self.root.flatten(), suspects)
+
+    def make_tree(self):
+        return make_scope_tree(self.root)
+
+
+STRATEGIES = {BinaryStrategy.name: BinaryStrategy, ScopeStrategy.name: ScopeStrategy}
+
+
+def iter_entry_points(group):
+    """
+    Parameters
+    ----------
+    group: str
+
+    Returns
+    -------
+    Iterator[importlib.metadata.EntryPoint]
+    """
+    if sys.version_info < (3, 8):
+        try:
+            import pkg_resources  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            return iter(())
+        return pkg_resources.iter_entry_points(group)
+
+    metadata = importlib.import_module("importlib.metadata")
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return iter(entry_points.select(group=group))
+    return iter(entry_points.get(group, ()))  # python 3.8 - 3.9
+
+
+def get_strategy(name):
+    """
+    Parameters
+    ----------
+    name: str
+        name of built-in strategy or strategy from `pytest_sherlock.strategies` entry points
+
+    Returns
+    -------
+    Optional[Type[Strategy]]
+        None when the strategy wasn't found
+    """
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    for entry_point in iter_entry_points(ENTRY_POINTS_GROUP):
+        if entry_point.name == name:
+            return entry_point.load()
+    return None
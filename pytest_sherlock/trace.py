@@ -0,0 +1,256 @@
+from __future__ import absolute_import
+
+import ast
+import hashlib
+import inspect
+import os
+import reprlib
+import sys
+import textwrap
+from collections import OrderedDict
+
+MAX_FILE_SIZE = 1024 * 1024
+ENVIRON_CODES = frozenset(
+    func.__code__
+    for func in (type(os.environ).__getitem__, type(os.environ).__contains__)
+    if hasattr(func, "__code__")
+)
+
+_repr = reprlib.Repr()
+_repr.maxstring = 120
+_repr.maxother = 120
+_active_tracers = []
+# audit hooks which were installed by the process, they can't be removed
+_AUDIT_HOOKS = []
+
+
+def safe_repr(value):
+    try:
+        return _repr.repr(value)
+    except Exception:  # pylint: disable=broad-except
+        return f"<unrepresentable {type(value).__name__}>"
+
+
+def file_digest(path):
+    """
+    Parameters
+    ----------
+    path: str
+
+    Returns
+    -------
+    str
+        sha1 of small files, size and mtime of big ones
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "<missing>"
+    if stat.st_size > MAX_FILE_SIZE or not os.path.isfile(path):
+        return f"size={stat.st_size} mtime={stat.st_mtime}"
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _audit_hook(event, args):
+    if event != "open" or not _active_tracers:
+        return
+    path, mode = args[0], args[1]
+    if isinstance(path, (str, bytes, os.PathLike)) and (
+        mode is None or "r" in str(mode)
+    ):
+        tracer = _active_tracers.pop()  # digest opens the file as well
+        try:
+            tracer.add("file", os.fsdecode(path), file_digest(os.fsdecode(path)))
+        finally:
+            _active_tracers.append(tracer)
+
+
+def install_audit_hook():
+    # install only one for the whole process
+    if not _AUDIT_HOOKS and hasattr(sys, "addaudithook"):
+        sys.addaudithook(_audit_hook)
+        _AUDIT_HOOKS.append(_audit_hook)
+    return bool(_AUDIT_HOOKS)
+
+
+def get_read_expressions(func):
+    """
+    Global names and attribute chains (`settings.DEBUG`) which are read by the function
+
+    Parameters
+    ----------
+    func: Callable
+
+    Returns
+    -------
+    dict[int, List[str]]
+        absolute line number -> expressions
+    """
+    try:
+        lines, first_line = inspect.getsourcelines(func)
+        tree = ast.parse(textwrap.dedent("".join(lines)))
+    except (OSError, TypeError, SyntaxError):
+        return {}
+
+    def _chain(node):
+        names = []
+        while isinstance(node, ast.Attribute):
+            names.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        return ".".join([node.id] + names[::-1])
+
+    expressions = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load):
+            chain = _chain(node)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            chain = node.id
+        else:
+            continue
+        if chain:
+            line = first_line + node.lineno - 1
+            expressions.setdefault(line, [])
+            if chain not in expressions[line]:
+                expressions[line].append(chain)
+    return expressions
+
+
+def resolve_static(expression, frame):
+    """
+    Resolve `name.attr.attr` without calling properties or descriptors
+    """
+    name, *attrs = expression.split(".")
+    if name in frame.f_locals:
+        value = frame.f_locals[name]
+    elif name in frame.f_globals:
+        value = frame.f_globals[name]
+    else:
+        raise LookupError(name)
+    for attr in attrs:
+        value = inspect.getattr_static(value, attr)
+    return value
+
+
+class Tracer(object):
+    """
+    Records state which was read by the function: env variables, files,
+    globals, attributes and locals (in order of reading)
+    """
+
+    def __init__(self, func):
+        self.code = getattr(func, "__code__", None)
+        self.expressions = get_read_expressions(func)
+        self.observations = []
+        self._previous = None
+
+    def add(self, kind, name, value):
+        self.observations.append((kind, name, value))
+
+    def _trace_line(self, frame):
+        for expression in self.expressions.get(frame.f_lineno, ()):
+            try:
+                value = resolve_static(expression, frame)
+            except (LookupError, AttributeError):
+                continue
+            kind = (
+                "local" if expression.split(".")[0] in frame.f_locals else "attribute"
+            )
+            if (
+                inspect.ismodule(value)
+                or inspect.isroutine(value)
+                or inspect.isclass(value)
+            ):
+                continue
+            self.add(kind, expression, safe_repr(value))
+
+    def _trace_environ(self, frame):
+        if frame.f_locals.get("self") is not os.environ:
+            return  # `__contains__` is shared by all mappings
+        key = str(frame.f_locals.get("key"))
+        self.add("env", key, safe_repr(os.environ.get(key)))
+
+    def _local_trace(self, frame, event, arg):
+        _ = arg  # to make pylint happy
+        if event == "line":
+            self._trace_line(frame)
+        return self._local_trace
+
+    def _global_trace(self, frame, event, arg):
+        _ = arg  # to make pylint happy
+        if event != "call":
+            return None
+        if frame.f_code in ENVIRON_CODES:
+            self._trace_environ(frame)
+            return None
+        if frame.f_code is self.code:
+            return self._local_trace
+        return None
+
+    def __enter__(self):
+        install_audit_hook()
+        _active_tracers.append(self)
+        self._previous = sys.gettrace()
+        sys.settrace(self._global_trace)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.settrace(self._previous)
+        _active_tracers.remove(self)
+        return False
+
+
+def find_first_difference(clean, polluted):
+    """
+    Compare observations of clean and polluted runs of the same test
+
+    Parameters
+    ----------
+    clean: List[tuple[str, str, str]]
+    polluted: List[tuple[str, str, str]]
+
+    Returns
+    -------
+    Optional[dict[str, str]]
+        the first state read which differs from the clean run
+    """
+
+    def _index(observations):
+        counters, indexed = {}, OrderedDict()
+        for kind, name, value in observations:
+            occurrence = counters.get((kind, name), 0)
+            counters[(kind, name)] = occurrence + 1
+            indexed[(kind, name, occurrence)] = value
+        return indexed
+
+    clean_index = _index(clean)
+    for (kind, name, occurrence), value in _index(polluted).items():
+        clean_value = clean_index.get((kind, name, occurrence))
+        if clean_value is not None and clean_value != value:
+            return {"kind": kind, "name": name, "clean": clean_value, "polluted": value}
+    return None
+
+
+def write_difference(difference, setter=False):
+    """
+    Parameters
+    ----------
+    difference: dict[str, str]
+        the first state which differs (`find_first_difference`)
+    setter: bool
+        the victim was traced alone and after the setter (it fails alone)
+
+    Returns
+    -------
+    str
+    """
+    clean, coupled = (
+        ("alone", "after setter") if setter else ("clean run", "after polluter")
+    )
+    return (
+        f"Victim reads different state ({difference['kind']}) {difference['name']}:\n"
+        f"{clean}: {difference['clean']}\n"
+        f"{coupled}: {difference['polluted']}"
+    )
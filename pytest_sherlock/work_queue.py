@@ -0,0 +1,430 @@
+from __future__ import absolute_import
+
+import asyncio
+import itertools
+import json
+import os
+import socket
+import tempfile
+import time
+import uuid
+
+from pytest_sherlock.parallel import BucketRunner, Limits, WorkerError
+
+LEASE_TIMEOUT = 60.0
+HEARTBEAT = 5.0
+POLL = 0.2
+# a bucket which waits for a worker longer is reported (once)
+WAITING = 5.0
+
+
+class WorkQueue(object):
+    """
+    Queue of bucket jobs in a shared directory (NFS, mounted volume of CI runners).
+
+    Every state of a job is a directory, a job moves between them by atomic renames:
+    `pending` -> `claimed` (only one worker wins the rename) -> `done` (the verdict).
+    A worker keeps the lease file of its job fresh, a job with an expired lease
+    is moved back to `pending`. `cancelled` marks jobs which the hunt doesn't need anymore.
+    """
+
+    STATES = ("pending", "claimed", "leases", "done", "cancelled", "tmp")
+
+    def __init__(self, directory):
+        self.directory = directory
+        for state in self.STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def path(self, state, job_id):
+        return os.path.join(self.directory, state, f"{job_id}.json")
+
+    def _write(self, state, job_id, data):
+        tmp_path = os.path.join(self.directory, "tmp", f"{job_id}.{uuid.uuid4().hex}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path(state, job_id))
+
+    def _read(self, state, job_id):
+        try:
+            with open(self.path(state, job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, state, job_id):
+        try:
+            os.remove(self.path(state, job_id))
+        except OSError:
+            return False
+        return True
+
+    def put(self, job_id, target, nodeids, timeout=None, slower_than=None):
+        """
+        Parameters
+        ----------
+        job_id: str
+        target: str
+            nodeid of the target test
+        nodeids: List[str]
+            tests of the bucket, the target is the last one
+        timeout: Optional[float]
+            seconds after which the worker kills the bucket, its verdict is failed
+        slower_than: Optional[float]
+            the verdict is failed when the target takes longer (slowdown mode)
+        """
+        job = {"id": job_id, "target": target, "nodeids": nodeids}
+        if timeout is not None:
+            job["timeout"] = timeout
+        if slower_than is not None:
+            job["slower_than"] = slower_than
+        self._write("pending", job_id, job)
+        return job_id
+
+    def claim(self, worker_id):
+        """
+        Parameters
+        ----------
+        worker_id: str
+
+        Returns
+        -------
+        Optional[dict]
+            the oldest pending job, None when the queue is empty
+        """
+        for name in sorted(os.listdir(os.path.join(self.directory, "pending"))):
+            job_id = name[: -len(".json")]
+            try:
+                os.rename(self.path("pending", job_id), self.path("claimed", job_id))
+            except OSError:
+                continue  # another worker was faster
+            self._write("leases", job_id, {"worker": worker_id})
+            job = self._read("claimed", job_id)
+            if job is not None:
+                return job
+        return None
+
+    def heartbeat(self, job_id):
+        try:
+            os.utime(self.path("leases", job_id))
+        except OSError:
+            return False
+        return True
+
+    def owns(self, job_id, worker_id):
+        lease = self._read("leases", job_id)
+        return lease is not None and lease.get("worker") == worker_id
+
+    def finish(self, job_id, verdict, worker_id=None):
+        """
+        Parameters
+        ----------
+        job_id: str
+        verdict: dict
+            `{"failed": bool}` (with `"timed_out": true` for a killed bucket)
+            or `{"error": str}`
+        worker_id: Optional[str]
+            a slow worker whose job was requeued doesn't release the claim of another one
+
+        Returns
+        -------
+        bool
+            False when the job was cancelled, its verdict isn't written
+        """
+        if self.is_cancelled(job_id):
+            self.release(job_id, worker_id)
+            return False
+        self._write("done", job_id, verdict)
+        self._remove(
+            "pending", job_id
+        )  # it was requeued, but nobody has claimed it yet
+        self.release(job_id, worker_id)
+        return True
+
+    def release(self, job_id, worker_id=None):
+        """
+        Forget the claimed job (it's finished or cancelled), the job which was requeued
+        and claimed by another worker is kept for it
+
+        Returns
+        -------
+        bool
+            False when the claim belongs to another worker
+        """
+        if worker_id is not None and not self.owns(job_id, worker_id):
+            return False
+        self._remove("claimed", job_id)
+        self._remove("leases", job_id)
+        self._remove("cancelled", job_id)
+        return True
+
+    def verdict(self, job_id):
+        """
+        Returns
+        -------
+        Optional[dict]
+            the verdict of the job which is removed from the queue
+        """
+        verdict = self._read("done", job_id)
+        if verdict is not None:
+            self._remove("done", job_id)
+            if os.path.exists(self.path("claimed", job_id)):
+                self.cancel(job_id)  # a requeued copy is still run by another worker
+        return verdict
+
+    def requeue_expired(self, job_id, timeout=LEASE_TIMEOUT):
+        """
+        Move the claimed job back to pending when its worker stopped to renew the lease
+
+        Returns
+        -------
+        bool
+            True when the job was requeued
+        """
+        try:
+            expired = (
+                time.time() - os.path.getmtime(self.path("leases", job_id)) > timeout
+            )
+        except OSError:
+            # the worker renamed the job, but hasn't written the lease yet
+            return False
+        if not expired:
+            return False
+        try:
+            os.rename(self.path("claimed", job_id), self.path("pending", job_id))
+        except OSError:
+            return False  # the worker has just finished it
+        self._remove("leases", job_id)
+        return True
+
+    def cancel(self, job_id):
+        """
+        Drop the job which the hunt doesn't need anymore: a pending one is removed,
+        a running one is marked for its worker, a finished verdict is removed
+        """
+        if self._remove("pending", job_id) or self._remove("done", job_id):
+            return True
+        self._write("cancelled", job_id, {})
+        if self._remove("done", job_id):  # it was finished meanwhile
+            self._remove("cancelled", job_id)
+        return True
+
+    def is_cancelled(self, job_id):
+        return os.path.exists(self.path("cancelled", job_id))
+
+    def is_pending(self, job_id):
+        return os.path.exists(self.path("pending", job_id))
+
+
+class Polling(object):
+    """
+    How the runner waits for verdicts of the queue
+    """
+
+    def __init__(self, lease_timeout=LEASE_TIMEOUT, poll=POLL, wait=None, on_wait=None):
+        """
+        Parameters
+        ----------
+        lease_timeout: float
+            seconds after which a job of silent worker is given to another one
+        poll: float
+            seconds between checks of the verdict
+        wait: Optional[float]
+            seconds after which a bucket which no worker claimed is cancelled
+            and the run fails with `WorkerError`
+        on_wait: Optional[Callable[[], None]]
+            called once when a bucket waits for a worker longer than `WAITING` seconds
+        """
+        self.lease_timeout = lease_timeout
+        self.poll = poll
+        self.wait = wait
+        self.on_wait = on_wait
+
+    async def sleep(self):
+        await asyncio.sleep(self.poll)
+
+    def check_waiting(self, job_id, waited, directory):
+        """
+        Parameters
+        ----------
+        job_id: str
+            the job which isn't claimed by any worker
+        waited: float
+            seconds since it was put to the queue (or requeued)
+        directory: str
+            the queue
+        """
+        if waited > WAITING and self.on_wait is not None:
+            self.on_wait()
+            self.on_wait = None  # only once
+        if self.wait is not None and waited > self.wait:
+            raise WorkerError(
+                f"No worker claimed the job {job_id} of {directory} in {waited:.0f}s"
+            )
+
+
+class QueueRunner(object):
+    """
+    Runs buckets by workers of the shared queue, it's a drop-in replacement of
+    `pytest_sherlock.parallel.BucketRunner` for `ParallelHunt`
+    """
+
+    def __init__(self, queue, target, limits=None, polling=None):
+        """
+        Parameters
+        ----------
+        queue: WorkQueue
+        target: str
+            nodeid of the target test
+        limits: Optional[pytest_sherlock.parallel.Limits]
+            they are enforced by the worker
+        polling: Optional[Polling]
+        """
+        self.queue = queue
+        self.target = target
+        self.limits = limits or Limits()
+        self.polling = polling or Polling()
+        # buckets (tuples of nodeids) which were killed by the timeout
+        self.timed_out = set()
+        hunt_id = uuid.uuid4().hex[:8]
+        self._job_ids = (f"{hunt_id}-{idx:04d}" for idx in itertools.count(1))
+
+    async def run(self, nodeids):
+        """
+        Parameters
+        ----------
+        nodeids: List[str]
+            tests of the bucket, the target is the last one
+
+        Returns
+        -------
+        bool
+            True when the target test failed or the bucket timed out
+        """
+        job_id = self.queue.put(
+            next(self._job_ids),
+            self.target,
+            nodeids,
+            timeout=self.limits.get_timeout(nodeids),
+            slower_than=self.limits.slower_than,
+        )
+        try:
+            verdict = await self.wait_verdict(job_id)
+        except (asyncio.CancelledError, WorkerError):
+            self.queue.cancel(job_id)
+            raise
+        if "error" in verdict:
+            raise WorkerError(verdict["error"])
+        if verdict.get("timed_out"):
+            self.timed_out.add(tuple(nodeids))
+        return bool(verdict["failed"])
+
+    async def wait_verdict(self, job_id):
+        """
+        Wait until a worker finishes the job, the job of a silent worker is requeued
+
+        Returns
+        -------
+        dict
+            the verdict which the worker wrote
+        """
+        waiting_since = time.time()
+        while True:
+            verdict = self.queue.verdict(job_id)
+            if verdict is not None:
+                return verdict
+            if self.queue.requeue_expired(job_id, self.polling.lease_timeout):
+                waiting_since = time.time()
+            elif not self.queue.is_pending(job_id):
+                waiting_since = None  # a worker runs it
+            if waiting_since is not None:
+                self.polling.check_waiting(
+                    job_id, time.time() - waiting_since, self.queue.directory
+                )
+            await self.polling.sleep()
+
+
+class QueueWorker(object):
+    """
+    `pytest --sherlock-worker=DIR` serves jobs of the shared queue instead of running tests,
+    every job is run in a fresh pytest subprocess of the same checkout
+    """
+
+    def __init__(self, config, heartbeat=HEARTBEAT, poll=POLL):
+        self.config = config
+        self.queue = WorkQueue(config.getoption("--sherlock-worker"))
+        self.rootdir = str(getattr(config, "rootpath", None) or config.rootdir)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat = heartbeat
+        self.poll = poll
+        self.served = 0
+
+    async def run_job(self, job, directory):
+        """
+        Returns
+        -------
+        Optional[dict]
+            the verdict, None when the job was cancelled
+        """
+        timeout = job.get("timeout")
+        runner = BucketRunner(
+            self.rootdir,
+            job["target"],
+            directory,
+            limits=Limits(
+                timeout=(lambda _: timeout) if timeout is not None else None,
+                slower_than=job.get("slower_than"),
+            ),
+        )
+        task = asyncio.ensure_future(runner.run(job["nodeids"]))
+        while not task.done():
+            await asyncio.wait([task], timeout=self.heartbeat)
+            self.queue.heartbeat(job["id"])
+            if not task.done() and self.queue.is_cancelled(job["id"]):
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                return None
+        try:
+            verdict = {"failed": task.result()}
+        except WorkerError as err:
+            return {"error": f"{self.worker_id}: {err}"}
+        if runner.timed_out:
+            verdict["timed_out"] = True
+        return verdict
+
+    async def serve(self):
+        """Run jobs until the queue is idle for `--sherlock-worker-idle`"""
+        idle = self.config.getoption("--sherlock-worker-idle")
+        idle_since = time.time()
+        with tempfile.TemporaryDirectory(prefix="sherlock-worker-") as directory:
+            while time.time() - idle_since < idle:
+                job = self.queue.claim(self.worker_id)
+                if job is None:
+                    await asyncio.sleep(self.poll)
+                    continue
+                verdict = await self.run_job(job, directory)
+                if verdict is None:
+                    self.queue.release(job["id"], self.worker_id)
+                else:
+                    self.queue.finish(job["id"], verdict, self.worker_id)
+                    self.served += 1
+                idle_since = time.time()
+        return self.served
+
+    def pytest_collection(self, session):
+        session.items = []  # jobs are collected by subprocesses
+        return True
+
+    def pytest_runtestloop(self, session):
+        _ = session  # to make pylint happy
+        reporter = self.config.pluginmanager.get_plugin("terminalreporter")
+        reporter.write_line(
+            f"Sherlock worker {self.worker_id} serves {self.queue.directory}"
+        )
+        served = asyncio.run(self.serve())
+        reporter.write_line(
+            f"Sherlock worker {self.worker_id} is idle, served {served} jobs"
+        )
+        return True
@@ -22,8 +22,24 @@ setup(
     keywords=["py.test", "pytest", "flaky tests", "coupled tests", "debug tests"],
     py_modules=[
         "pytest_sherlock.binary_tree_search",
+        "pytest_sherlock.coverage_index",
+        "pytest_sherlock.durations",
+        "pytest_sherlock.history",
+        "pytest_sherlock.hunt",
+        "pytest_sherlock.leaks",
+        "pytest_sherlock.order",
+        "pytest_sherlock.parallel",
         "pytest_sherlock.plugin",
+        "pytest_sherlock.recorder",
+        "pytest_sherlock.report",
+        "pytest_sherlock.repro",
+        "pytest_sherlock.runner",
+        "pytest_sherlock.scan",
         "pytest_sherlock.sherlock",
+        "pytest_sherlock.state",
+        "pytest_sherlock.strategy",
+        "pytest_sherlock.trace",
+        "pytest_sherlock.work_queue",
     ],
     packages=find_packages(exclude=["tests*"]),
     install_requires=["setuptools>=28.8.0", "pytest>=3.5.1", "six>=1.13.0"],
@@ -0,0 +1,55 @@
+import argparse
+from unittest import mock
+
+import pytest
+
+# options of the plugin by their dest with defaults of `pytest_addoption`
+OPTIONS = {
+    "flaky_test": None,
+    "step": None,
+    "sherlock_no_history": False,
+    "sherlock_report": None,
+    "sherlock_reset": "soft",
+    "sherlock_repro": None,
+    "sherlock_order": None,
+    "sherlock_record": False,
+    "sherlock_trace": False,
+    "sherlock_budget": None,
+    "sherlock_timeout": None,
+    "sherlock_timeout_factor": 3.0,
+    "sherlock_workers": 0,
+    "sherlock_probe": None,
+    "sherlock_strategy": "binary",
+    "sherlock_mode": "polluter",
+    "sherlock_slowdown": 3.0,
+    "sherlock_baseline_runs": 5,
+    "sherlock_coverage": None,
+    "sherlock_coverage_by": "files",
+    "sherlock_queue": None,
+    "sherlock_queue_timeout": 600.0,
+    "sherlock_worker": None,
+    "sherlock_worker_idle": 600.0,
+    "sherlock_lean": False,
+    "sherlock_scan": False,
+    "sherlock_leaks": False,
+    "sherlock_leak_rss": 20.0,
+}
+
+
+@pytest.fixture
+def make_config():
+    """
+    Factory of config mocks with options of the plugin (defaults and passed values),
+    `getoption` reads them like pytest does
+    """
+
+    def make(config=None, **values):
+        options = dict(OPTIONS, **values)
+        config = mock.MagicMock() if config is None else config
+        config.option = argparse.Namespace(**options)
+        config.getoption.side_effect = lambda name, default=None: getattr(
+            config.option, name.lstrip("-").replace("-", "_"), default
+        )
+        return config
+
+    return make
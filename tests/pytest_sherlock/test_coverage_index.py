@@ -0,0 +1,123 @@
+import sqlite3
+from contextlib import closing
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.coverage_index import (
+    BY_FILES,
+    BY_LINES,
+    CoverageIndex,
+    context_to_nodeid,
+    numbits_to_int,
+)
+
+TARGET = "tests/test_d.py::test_victim"
+# test -> file -> covered lines
+COVERED = {
+    TARGET: {"app.py": [9, 10], "tests/test_d.py": [4, 5]},
+    "tests/test_b.py::test_polluter": {"app.py": [5, 6]},
+    "tests/test_b.py::test_reader": {"app.py": [10]},
+    "tests/test_a.py::test_other": {"other.py": [1, 2]},
+}
+
+
+def make_numbits(lines):
+    numbits = bytearray(max(lines) // 8 + 1)
+    for line in lines:
+        numbits[line // 8] |= 1 << (line % 8)
+    return bytes(numbits)
+
+
+def make_coverage(path, covered, arcs=False):
+    """The same tables as coverage.py writes (only used columns)"""
+    with closing(sqlite3.connect(str(path))) as connection, connection:
+        connection.executescript(
+            "CREATE TABLE meta (key TEXT, value TEXT);"
+            "CREATE TABLE file (id INTEGER PRIMARY KEY, path TEXT);"
+            "CREATE TABLE context (id INTEGER PRIMARY KEY, context TEXT);"
+            "CREATE TABLE line_bits (file_id INTEGER, context_id INTEGER, numbits BLOB);"
+            "CREATE TABLE arc (file_id INTEGER, context_id INTEGER, fromno INTEGER, tono INTEGER);"
+        )
+        connection.execute("INSERT INTO meta VALUES ('has_arcs', ?)", (str(int(arcs)),))
+        connection.execute("INSERT INTO context (context) VALUES ('')")
+        files = {}
+        for nodeid, by_file in covered.items():
+            for when in ("setup", "run"):
+                context_id = connection.execute(
+                    "INSERT INTO context (context) VALUES (?)", (f"{nodeid}|{when}",)
+                ).lastrowid
+                if when == "setup":
+                    continue
+                for file_path, lines in by_file.items():
+                    if file_path not in files:
+                        files[file_path] = connection.execute(
+                            "INSERT INTO file (path) VALUES (?)", (file_path,)
+                        ).lastrowid
+                    if arcs:
+                        connection.executemany(
+                            "INSERT INTO arc VALUES (?, ?, ?, ?)",
+                            [(files[file_path], context_id, -1, line) for line in lines],
+                        )
+                    else:
+                        connection.execute(
+                            "INSERT INTO line_bits VALUES (?, ?, ?)",
+                            (files[file_path], context_id, make_numbits(lines)),
+                        )
+    return str(path)
+
+
+@pytest.fixture(params=(False, True), ids=("lines", "arcs"))
+def index(request, tmp_path):
+    return CoverageIndex(make_coverage(tmp_path / ".coverage", COVERED, arcs=request.param))
+
+
+def test_context_to_nodeid():
+    nodeid = "tests/test_one.py::test_one[a|b]"
+    assert context_to_nodeid(f"{nodeid}|run") == nodeid
+    assert context_to_nodeid("tests/test_one.py::test_one") == "tests/test_one.py::test_one"
+
+
+def test_numbits_to_int():
+    assert numbits_to_int(make_numbits([1, 9])) == (1 << 1) | (1 << 9)
+    assert numbits_to_int(None) == 0
+
+
+@pytest.mark.parametrize(
+    "by, expected",
+    (
+        (BY_FILES, {"tests/test_b.py::test_polluter", "tests/test_b.py::test_reader"}),
+        (BY_LINES, {"tests/test_b.py::test_reader"}),
+    ),
+)
+def test_related(index, by, expected):
+    assert index.related(TARGET, by) == expected
+
+
+def test_related_unknown_target(index):
+    assert index.related("tests/test_e.py::test_new") is None
+
+
+def test_prune(index):
+    candidates = [
+        mock.MagicMock(nodeid=nodeid)
+        for nodeid in (
+            "tests/test_a.py::test_other",
+            "tests/test_b.py::test_polluter",
+            "tests/test_e.py::test_new",  # unknown tests are kept
+            "tests/test_b.py::test_reader",
+        )
+    ]
+    target = mock.MagicMock(nodeid=TARGET)
+    assert index.prune(candidates, target) == candidates[1:]
+    unknown = mock.MagicMock(nodeid="tests/test_e.py::test_other_new")
+    assert index.prune(candidates, unknown) is candidates
+
+
+def test_invalid_file(tmp_path):
+    with pytest.raises(ValueError, match="not found"):
+        CoverageIndex(str(tmp_path / ".coverage"))
+    path = tmp_path / "junk"
+    path.write_text("junk")
+    with pytest.raises(ValueError, match="isn't coverage.py data file"):
+        CoverageIndex(str(path))
@@ -0,0 +1,101 @@
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.durations import Durations, format_duration
+from pytest_sherlock.strategy import BinaryStrategy, Bucket
+
+
+def make_report(nodeid, when, duration):
+    return mock.MagicMock(nodeid=nodeid, when=when, duration=duration)
+
+
+def make_item(nodeid):
+    return mock.MagicMock(nodeid=nodeid)
+
+
+@pytest.fixture
+def config():
+    c = mock.MagicMock()
+    c.cache.get.return_value = {"test_a": 1.0, "test_b": 3.0}
+    return c
+
+
+@pytest.mark.parametrize(
+    "seconds, expected",
+    ((0.84, "0.8s"), (45, "45s"), (200, "3m 20s"), (7500, "2h 5m")),
+)
+def test_format_duration(seconds, expected):
+    assert format_duration(seconds) == expected
+
+
+def test_add_sums_phases(config):
+    durations = Durations(config)
+    durations.add(make_report("test_c", "setup", 0.5))
+    durations.add(make_report("test_c", "call", 1.0))
+    durations.add(make_report("test_c", "teardown", 0.5))
+    assert durations.known["test_c"] == 2.0
+    # the next run of the same test replaces the previous one
+    durations.add(make_report("test_c", "setup", 1.0))
+    assert durations.known["test_c"] == 1.0
+
+
+def test_store_merges_measured(config):
+    durations = Durations(config)
+    assert not durations.store()
+    durations.add(make_report("test_c", "setup", 0.5))
+    assert durations.store()
+    config.cache.set.assert_called_once_with(
+        Durations.CACHE_KEY, {"test_a": 1.0, "test_b": 3.0, "test_c": 0.5}
+    )
+
+
+def test_without_cache():
+    durations = Durations(mock.MagicMock(spec=[]))
+    assert durations.average() is None
+    assert durations.make_cost([], make_item("test_a")) is None
+    assert not durations.store()
+
+
+def test_make_cost(config):
+    items = [make_item("test_a"), make_item("test_b"), make_item("test_unknown")]
+    cost = Durations(config).make_cost(items, make_item("test_a"))
+    # unknown tests get the average duration
+    assert cost(Bucket(items, 0, 3)) == 1.0 + 3.0 + 2.0 + 1.0
+    assert cost(Bucket(items, 1, 2)) == 3.0 + 1.0
+    assert cost(Bucket([items[1]], 0, 1)) == 3.0 + 1.0
+
+
+def test_make_cost_once_per_hunt(config):
+    durations = Durations(config)
+    items, target = [make_item("test_a"), make_item("test_b")], make_item("test_a")
+    cost = durations.make_cost(items, target)
+    assert durations.make_cost(items, target) is cost
+    assert durations.make_cost(list(items), target) is not cost
+
+
+def test_seed_keeps_known(config):
+    durations = Durations(config)
+    assert durations.seed({"test_a": 5.0, "test_c": 2.0})
+    assert durations.known["test_a"] == 1.0
+    assert durations.known["test_c"] == 2.0
+    assert not durations.store()  # recorded durations aren't measured by the hunt
+
+
+def test_estimate(config):
+    durations = Durations(config)
+    # unknown tests get the average duration
+    assert durations.estimate(["test_a", "test_b", "test_unknown"]) == 1.0 + 3.0 + 2.0
+    assert Durations(mock.MagicMock(cache=None)).estimate(["test_a"]) is None
+
+
+def test_binary_strategy_estimate():
+    items = [make_item(f"test_{idx}") for idx in range(4)]
+    strategy = BinaryStrategy(items)
+    cost = lambda bucket: float(len(bucket))  # noqa: E731
+    # (0, 2), then (0, 1) and maybe (1, 2) or (2, 3) and maybe (3, 4)
+    assert strategy.estimate(cost) == (2.0 + 1.5, 4.0)
+    strategy.feed(strategy.propose(), True)
+    assert strategy.estimate(cost) == (1.5, 2.0)
+    strategy.feed(strategy.propose(), True)
+    assert strategy.estimate(cost) == (0.0, 0.0)
@@ -0,0 +1,74 @@
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.history import History, module_of
+
+
+@pytest.fixture
+def history(tmp_path):
+    return History(str(tmp_path / History.DB_NAME))
+
+
+def make_item(nodeid):
+    return mock.MagicMock(nodeid=nodeid)
+
+
+def test_module_of():
+    assert module_of("tests/test_one.py::TestOne::test_first") == "tests/test_one.py"
+
+
+def test_empty_history(history):
+    assert history.polluters("tests/test_one.py::test_one") == {}
+
+
+def test_add_pair(history):
+    assert history.add("tests/test_a.py::test_a", "tests/test_b.py::test_b", {"db"})
+    assert history.polluters("tests/test_b.py::test_b") == {"tests/test_a.py::test_a": 1}
+    assert history.polluters("tests/test_a.py::test_a") == {}
+
+
+def test_add_same_pair_increase_hits(history):
+    history.add("tests/test_a.py::test_a", "tests/test_b.py::test_b")
+    history.add("tests/test_a.py::test_a", "tests/test_b.py::test_b")
+    history.add("tests/test_c.py::test_c", "tests/test_b.py::test_b")
+    assert history.polluters("tests/test_b.py::test_b") == {
+        "tests/test_a.py::test_a": 2,
+        "tests/test_c.py::test_c": 1,
+    }
+
+
+def test_history_persists(tmp_path):
+    path = str(tmp_path / History.DB_NAME)
+    History(path).add("tests/test_a.py::test_a", "tests/test_b.py::test_b")
+    assert History(path).polluters("tests/test_b.py::test_b")
+
+
+def test_sort_key_puts_known_polluters_and_neighbours_first(history):
+    history.add("tests/test_a.py::test_two", "tests/test_b.py::test_b")
+    items = [
+        make_item("tests/test_c.py::test_one"),
+        make_item("tests/test_a.py::test_one"),
+        make_item("tests/test_a.py::test_two"),
+    ]
+    items.sort(key=history.make_sort_key("tests/test_b.py::test_b"), reverse=True)
+    assert [i.nodeid for i in items] == [
+        "tests/test_a.py::test_two",
+        "tests/test_a.py::test_one",
+        "tests/test_c.py::test_one",
+    ]
+
+
+def test_from_config_disabled():
+    config = mock.MagicMock()
+    config.getoption.return_value = True
+    assert History.from_config(config) is None
+
+
+def test_from_config(tmp_path):
+    config = mock.MagicMock()
+    config.getoption.return_value = False
+    config.cache.mkdir.return_value = tmp_path
+    history = History.from_config(config)
+    assert history.path == str(tmp_path / History.DB_NAME)
+    config.cache.mkdir.assert_called_once_with(History.CACHE_DIR)
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock import leaks
+from pytest_sherlock.leaks import (
+    CHILDREN,
+    FDS,
+    MB,
+    RSS,
+    THREADS,
+    LeakHunter,
+    count_children,
+    count_fds,
+    diff,
+    format_delta,
+    sample,
+)
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+
+
+@linux_only
+def test_count_fds(tmp_path):
+    before = count_fds()
+    with open(tmp_path / "file.txt", "w"):
+        assert count_fds() == before + 1
+    assert count_fds() == before
+
+
+@linux_only
+def test_count_children():
+    before = count_children()
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        assert count_children() == before + 1
+    finally:
+        process.kill()
+        process.wait()
+    assert count_children() == before
+
+
+def test_sample():
+    assert set(sample(collect=True)) == {FDS, THREADS, CHILDREN, RSS}
+    assert sample()[THREADS] >= 1
+
+
+def test_diff():
+    before = {FDS: 10, THREADS: 1, CHILDREN: None, RSS: 100}
+    after = {FDS: 12, THREADS: 1, CHILDREN: None, RSS: 50}
+    assert diff(before, after) == {FDS: 2, THREADS: 0, RSS: -50}
+
+
+def test_format_delta():
+    assert format_delta(RSS, 25 * MB) == "+25.0 MB"
+    assert format_delta(FDS, 2) == "+2 fds"
+
+
+def test_worker_writes_growth(tmp_path, monkeypatch):
+    path = tmp_path / "leaks.json"
+    monkeypatch.setenv(leaks.LEAKS_ENV, str(path))
+    samples = iter(
+        [
+            {FDS: 10, THREADS: 1, CHILDREN: 0, RSS: 100},
+            {FDS: 11, THREADS: 1, CHILDREN: 0, RSS: 100},
+        ]
+    )
+    with mock.patch.object(leaks, "sample", side_effect=lambda collect: next(samples)):
+        hook = leaks.pytest_runtestloop(mock.MagicMock())
+        next(hook)
+        with pytest.raises(StopIteration):
+            hook.send(None)
+    assert json.loads(path.read_text()) == {FDS: 1, THREADS: 0, CHILDREN: 0, RSS: 0}
+
+
+NODEIDS = [f"tests/test_{name}.py::test_{idx}" for name in "ab" for idx in range(4)]
+
+
+class FakeHunter(LeakHunter):
+    """
+    `tests/test_a.py::test_1` leaks a file, `tests/test_b.py::test_0` and
+    `tests/test_b.py::test_2` leak 15 MB each (a leak only together)
+    """
+
+    growth = {
+        NODEIDS[1]: {FDS: 1},
+        NODEIDS[4]: {RSS: 15 * MB},
+        NODEIDS[6]: {RSS: 15 * MB},
+    }
+
+    async def _measure(self, semaphore, nodeids):
+        self.groups.append(list(nodeids))
+        await asyncio.sleep(0)
+        total = {FDS: 0, THREADS: 0, CHILDREN: 0, RSS: 0}
+        for nodeid in nodeids:
+            for metric, delta in self.growth.get(nodeid, {}).items():
+                total[metric] += delta
+        return total
+
+
+@pytest.fixture
+def hunter(make_config, tmp_path):
+    config = make_config(sherlock_workers=2, sherlock_report=str(tmp_path / "leaks.json"))
+    instance = FakeHunter(config)
+    instance.groups = []
+    instance.totals = {FDS: 1, THREADS: 0, CHILDREN: 0, RSS: 30 * MB}
+    instance.per_test = {NODEIDS[1]: {FDS: 1}, NODEIDS[4]: {RSS: 15 * MB}}
+    return instance
+
+
+def test_hunt(hunter):
+    found = asyncio.run(hunter.hunt(NODEIDS))
+    assert found == [
+        {
+            "metric": FDS,
+            "tests": [NODEIDS[1]],
+            "delta": 1,
+            "cumulative": False,
+            "in_run": 1,
+        },
+        {
+            "metric": RSS,
+            "tests": [NODEIDS[4], NODEIDS[6]],
+            "delta": 30 * MB,
+            "cumulative": True,
+            "in_run": 15 * MB,
+        },
+    ]
+    # every group is run once for all metrics
+    assert len(hunter.groups) == len({tuple(group) for group in hunter.groups})
+
+
+def test_hunt_without_growth(hunter):
+    hunter.totals = {FDS: 0, THREADS: 0, CHILDREN: 0, RSS: MB}
+    assert asyncio.run(hunter.hunt(NODEIDS)) == []
+    assert hunter.groups == []
+
+
+def test_write_report(hunter):
+    hunter.leaks = asyncio.run(hunter.hunt(NODEIDS))
+    assert hunter.write_report()
+    with open(hunter.report_path) as f:
+        data = json.load(f)
+    assert [leak["metric"] for leak in data["leaks"]] == [FDS, RSS]
+    assert data["thresholds"][RSS] == 20 * MB
@@ -0,0 +1,130 @@
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.order import RecordedOrder, junit_key
+
+VERBOSE_LOG = """
+============================= test session starts ==============================
+collecting ... collected 4 items
+
+tests/test_c.py::test_c PASSED                                           [ 25%]
+tests/test_b.py::test_b FAILED                                           [ 50%]
+tests/test_a.py::test_a PASSED                                           [ 75%]
+tests/test_d.py::test_d[1] PASSED                                        [100%]
+"""
+
+XDIST_LOG = """
+[gw0] [ 25%] PASSED tests/test_c.py::test_c
+[gw1] [ 50%] PASSED tests/test_a.py::test_a
+[gw0] [ 75%] FAILED tests/test_b.py::test_b
+[gw1] [100%] PASSED tests/test_d.py::test_d[1]
+"""
+
+JUNIT = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites><testsuite name="pytest">
+<testcase classname="tests.test_c" name="test_c" time="0.001"/>
+<testcase classname="tests.test_a" name="test_a" time="0.001"/>
+<testcase classname="tests.test_b" name="test_b" time="0.001"><failure/></testcase>
+<testcase classname="tests.test_d" name="test_d[1]" time="0.001"/>
+</testsuite></testsuites>
+"""
+
+
+def make_item(nodeid):
+    return mock.MagicMock(nodeid=nodeid)
+
+
+@pytest.fixture
+def items():
+    return [
+        make_item(nodeid)
+        for nodeid in (
+            "tests/test_a.py::test_a",
+            "tests/test_b.py::test_b",
+            "tests/test_c.py::test_c",
+            "tests/test_d.py::test_d[1]",
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "nodeid, exp_key",
+    (
+        ("tests/test_one.py::test_first", ("tests.test_one", "test_first")),
+        ("tests/test_one.py::TestOne::test_first[a/b]", ("tests.test_one.TestOne", "test_first[a/b]")),
+    ),
+)
+def test_junit_key(nodeid, exp_key):
+    assert junit_key(nodeid) == exp_key
+
+
+@pytest.mark.parametrize(
+    "filename, content, exp_nodeids",
+    (
+        pytest.param("order.log", VERBOSE_LOG, ["tests/test_c.py::test_c"], id="verbose_log"),
+        pytest.param("order.log", XDIST_LOG, ["tests/test_c.py::test_c"], id="xdist_log"),
+        pytest.param(
+            "order.xml",
+            JUNIT,
+            ["tests/test_c.py::test_c", "tests/test_a.py::test_a"],
+            id="junit",
+        ),
+        pytest.param(
+            "order.txt",
+            "# order\ntests/test_d.py::test_d[1]\ntests/test_a.py::test_a\ntests/test_b.py::test_b\n",
+            ["tests/test_d.py::test_d[1]", "tests/test_a.py::test_a"],
+            id="order_file",
+        ),
+    ),
+)
+def test_resolve_recorded_order(tmp_path, items, filename, content, exp_nodeids):
+    path = tmp_path / filename
+    path.write_text(content)
+    candidates = RecordedOrder.read(str(path)).resolve(items, items[1])
+    assert [i.nodeid for i in candidates] == exp_nodeids
+
+
+def test_resolve_target_not_recorded(items):
+    order = RecordedOrder.from_lines(["tests/test_a.py::test_a"])
+    assert order.resolve(items, items[1]) is None
+
+
+def test_get_sequence_skip_duplicates():
+    order = RecordedOrder.from_lines(["tests/test_a.py::test_a", "tests/test_a.py::test_a"])
+    assert order.get_sequence("tests/test_a.py::test_a") == ["tests/test_a.py::test_a"]
+
+
+def test_short_summary_is_not_an_order():
+    order = RecordedOrder.from_lines(
+        (VERBOSE_LOG + "=== short test summary info ===\nPASSED tests/test_a.py::test_a\n").splitlines()
+    )
+    assert order.get_sequence("tests/test_a.py::test_a") == [
+        "tests/test_c.py::test_c",
+        "tests/test_b.py::test_b",
+        "tests/test_a.py::test_a",
+        "tests/test_d.py::test_d[1]",
+    ]
+
+
+def test_junit_durations(tmp_path, items):
+    path = tmp_path / "order.xml"
+    path.write_text(JUNIT.replace('test_b" time="0.001"', 'test_b" time="2.5"'))
+    durations = RecordedOrder.read(str(path)).get_durations(items)
+    assert durations["tests/test_b.py::test_b"] == 2.5
+    assert len(durations) == 4
+
+
+def test_verbose_log_durations(items):
+    log = VERBOSE_LOG + (
+        "============================= slowest durations ==============================\n"
+        "2.00s call     tests/test_b.py::test_b\n"
+        "0.50s setup    tests/test_b.py::test_b\n"
+        "0.10s call     tests/test_a.py::test_a\n"
+    )
+    order = RecordedOrder.from_lines(log.splitlines())
+    assert order.get_durations(items) == {
+        "tests/test_b.py::test_b": 2.5,
+        "tests/test_a.py::test_a": 0.1,
+    }
+    assert order.get_sequence("tests/test_a.py::test_a")[0] == "tests/test_c.py::test_c"
@@ -0,0 +1,173 @@
+import asyncio
+import sys
+import time
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.parallel import BucketRunner, Limits, ParallelHunt, WorkerError
+from pytest_sherlock.strategy import BinaryStrategy
+
+
+def make_item(nodeid):
+    return mock.MagicMock(nodeid=nodeid)
+
+
+class FakeRunner(object):
+    """The target fails when the polluter was run before it"""
+
+    def __init__(self, polluter, delay=0.01, target="tests/test_two.py::test_target"):
+        self.polluter = polluter
+        self.target = target
+        self.delay = delay
+        self.runs = []
+
+    async def run(self, nodeids):
+        self.runs.append(nodeids)
+        await asyncio.sleep(self.delay)
+        return self.polluter in nodeids
+
+
+@pytest.fixture
+def candidates():
+    return [make_item(f"tests/test_one.py::test_{idx}") for idx in range(8)]
+
+
+@pytest.fixture
+def target():
+    return make_item("tests/test_two.py::test_target")
+
+
+@pytest.mark.parametrize("workers", (1, 2, 4))
+@pytest.mark.parametrize("polluter_idx", (0, 3, 7))
+def test_hunt(candidates, target, workers, polluter_idx):
+    runner = FakeRunner(candidates[polluter_idx].nodeid)
+    hunt = ParallelHunt(runner, BinaryStrategy(candidates), workers=workers)
+    assert hunt.run() is candidates[polluter_idx]
+    assert all(nodeids[-1] == target.nodeid for nodeids in runner.runs)
+
+
+def test_hunt_not_found(candidates):
+    hunt = ParallelHunt(FakeRunner("unknown"), BinaryStrategy(candidates), workers=3)
+    assert hunt.run() is None
+
+
+def test_hunt_setter(candidates):
+    class SetterRunner(FakeRunner):
+        """The target fails without the setter"""
+
+        async def run(self, nodeids):
+            return not await super(SetterRunner, self).run(nodeids)
+
+    runner = SetterRunner(candidates[5].nodeid)
+    hunt = ParallelHunt(runner, BinaryStrategy(candidates), workers=2, invert=True)
+    assert hunt.run() is candidates[5]
+
+
+def test_speculative_runs_are_cancelled(candidates):
+    runner = FakeRunner(candidates[0].nodeid)
+    verdicts = []
+    hunt = ParallelHunt(
+        runner,
+        BinaryStrategy(candidates),
+        workers=3,
+        on_verdict=lambda nodeids, failed, duration: verdicts.append(failed),
+    )
+    assert hunt.run() is candidates[0]
+    # the first bucket (0, 4) runs together with (0, 2) and (4, 6)
+    assert runner.runs[0][:-1] == [item.nodeid for item in candidates[:4]]
+    assert len(runner.runs) > len(verdicts)
+    assert hunt.cancelled >= 1
+    assert verdicts == [True, True, True]
+
+
+def test_suspects_are_checked_first(candidates, target):
+    runner = FakeRunner(candidates[5].nodeid)
+    strategy = BinaryStrategy(candidates, suspects=[candidates[2], candidates[5]])
+    hunt = ParallelHunt(runner, strategy, workers=2)
+    assert hunt.run() is candidates[5]
+    # both suspects run concurrently, the tree isn't needed
+    assert runner.runs[:2] == [
+        [candidates[2].nodeid, target.nodeid],
+        [candidates[5].nodeid, target.nodeid],
+    ]
+
+
+class TestBucketRunner(object):
+    @pytest.fixture
+    def runner(self, tmp_path):
+        return BucketRunner(str(tmp_path), "tests/test_two.py::test_target", str(tmp_path))
+
+    def test_make_command(self, runner):
+        command = runner.make_command(["a.py::test_a", "b.py::test_b"], "out.xml")
+        assert command[1:3] == ["-m", "pytest"]
+        assert "no:sherlock" in command
+        assert "--junitxml=out.xml" in command
+        assert "pytest_sherlock.scan" in command
+        assert command[-2:] == ["a.py", "b.py"]  # tests are passed by the order file
+        assert "junit_duration_report=call" not in command
+        runner.limits.slower_than = 1.0
+        command = runner.make_command(["a.py::test_a", "b.py::test_b"], "out.xml")
+        assert command[command.index("junit_duration_report=call") - 1] == "-o"
+
+    def test_many_modules_keep_command_short(self, runner):
+        nodeids = [f"tests/test_{idx}.py::test_{idx}" for idx in range(50000)]
+        command = runner.make_command(nodeids, "out.xml")
+        assert command[-1] == "."
+        assert len(command) < 20
+
+    @pytest.mark.parametrize(
+        "content, expected",
+        (
+            ('<testcase classname="tests.test_two" name="test_target"/>', False),
+            (
+                '<testcase classname="tests.test_two" name="test_target">'
+                '<failure message="boom"/></testcase>',
+                True,
+            ),
+            (
+                '<testcase classname="tests.test_two" name="test_target">'
+                '<error message="boom"/></testcase>',
+                True,
+            ),
+        ),
+    )
+    def test_read_verdict(self, runner, tmp_path, content, expected):
+        path = tmp_path / "report.xml"
+        path.write_text(f"<testsuites><testsuite>{content}</testsuite></testsuites>")
+        assert runner.read_verdict(str(path)) is expected
+
+    def test_read_slowdown_verdict(self, runner, tmp_path):
+        path = tmp_path / "report.xml"
+        path.write_text(
+            "<testsuites><testsuite>"
+            '<testcase classname="tests.test_two" name="test_target" time="2.5"/>'
+            "</testsuite></testsuites>"
+        )
+        runner.limits.slower_than = 3.0
+        assert runner.read_verdict(str(path)) is False
+        runner.limits.slower_than = 2.0
+        assert runner.read_verdict(str(path)) is True
+
+    def test_hung_bucket_is_killed(self, tmp_path):
+        runner = BucketRunner(
+            str(tmp_path),
+            "tests/test_two.py::test_target",
+            str(tmp_path),
+            limits=Limits(timeout=lambda _: 0.2),
+        )
+        hang = [sys.executable, "-c", "import time; time.sleep(30)"]
+        nodeids = ["tests/test_one.py::test_1", "tests/test_two.py::test_target"]
+        started = time.time()
+        with mock.patch.object(runner, "make_command", return_value=hang):
+            assert asyncio.run(runner.run(nodeids)) is True
+        assert time.time() - started < 10
+        assert runner.timed_out == {tuple(nodeids)}
+
+    def test_read_verdict_without_target(self, runner, tmp_path):
+        path = tmp_path / "report.xml"
+        path.write_text("<testsuites><testsuite/></testsuites>")
+        with pytest.raises(WorkerError):
+            runner.read_verdict(str(path))
+        with pytest.raises(WorkerError):
+            runner.read_verdict(str(tmp_path / "missing.xml"))
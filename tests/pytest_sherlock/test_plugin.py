@@ -0,0 +1,88 @@
+import argparse
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pytest_sherlock.plugin import parse_duration
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (("90", 90), ("90s", 90), ("30m", 1800), ("1.5h", 5400), (" 2m ", 120)),
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+@pytest.mark.parametrize("value", ("", "m", "30x", "-1m", "0"))
+def test_parse_invalid_duration(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_duration(value)
+
+
+ENGINE_MODULES = (
+    "pytest_sherlock.sherlock",
+    "pytest_sherlock.hunt",
+    "pytest_sherlock.runner",
+    "pytest_sherlock.state",
+    "pytest_sherlock.recorder",
+    "pytest_sherlock.binary_tree_search",
+    "six",
+    "sqlite3",
+    "asyncio",
+)
+# generous budget of the plugin module itself (pytest is already imported)
+IMPORT_BUDGET_US = 50000
+
+
+def run_python(args, cwd=None):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=False,
+    )
+
+
+def test_import_does_not_load_engine():
+    code = (
+        "import sys, pytest; before = set(sys.modules); import pytest_sherlock.plugin; "
+        f"print(sorted(m for m in {ENGINE_MODULES!r} if m in sys.modules and m not in before))"
+    )
+    result = run_python(["-c", code])
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+
+def test_import_time():
+    result = run_python(["-X", "importtime", "-c", "import pytest; import pytest_sherlock.plugin"])
+    assert result.returncode == 0, result.stderr
+    cumulative = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.rstrip().endswith(" pytest_sherlock.plugin")
+    )
+    assert cumulative < IMPORT_BUDGET_US
+
+
+def test_inactive_run_does_not_load_engine(tmp_path):
+    (tmp_path / "conftest.py").write_text(
+        "import sys\n\n\n"
+        "def pytest_sessionfinish(session):\n"
+        "    print('ENGINE', 'pytest_sherlock.sherlock' in sys.modules)\n"
+    )
+    (tmp_path / "test_one.py").write_text("def test_one():\n    pass\n")
+    result = run_python(
+        ["-m", "pytest", "-p", "pytest_sherlock.plugin", "-s", "-q", str(tmp_path)],
+        cwd=str(tmp_path),
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "ENGINE False" in result.stdout
@@ -0,0 +1,111 @@
+import os
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.order import RecordedOrder
+from pytest_sherlock.recorder import (
+    MAGIC,
+    SUFFIX,
+    Recorder,
+    decode_varint,
+    encode_varint,
+    get_sessions,
+    read_log,
+)
+
+
+@pytest.fixture
+def config():
+    c = mock.MagicMock(spec=["getini", "option"])
+    c.getini.return_value = "10"
+    c.option.dist = "no"
+    return c
+
+
+@pytest.fixture
+def recorder(config, tmp_path):
+    return Recorder(config, directory=str(tmp_path), batch_size=2)
+
+
+def make_report(when, outcome):
+    return mock.MagicMock(
+        when=when,
+        failed=outcome == "failed",
+        skipped=outcome == "skipped",
+        passed=outcome == "passed",
+    )
+
+
+def run_test(recorder, nodeid, call="passed", setup="passed"):
+    recorder.pytest_runtest_logreport(make_report("setup", setup))
+    if setup == "passed":
+        recorder.pytest_runtest_logreport(make_report("call", call))
+    recorder.pytest_runtest_logreport(make_report("teardown", "passed"))
+    recorder.pytest_runtest_logfinish(nodeid)
+
+
+@pytest.mark.parametrize("value", (0, 1, 127, 128, 300, 2**35))
+def test_varint(value):
+    data = bytes(encode_varint(value, bytearray()))
+    assert decode_varint(data, 0) == (value, len(data))
+
+
+def test_recorder_writes_by_batches(recorder):
+    run_test(recorder, "tests/test_a.py::test_a")
+    assert not os.path.exists(recorder.path)
+    run_test(recorder, "tests/test_b.py::test_b", call="failed")
+    assert os.path.exists(recorder.path)
+    run_test(recorder, "tests/test_a.py::test_a", setup="skipped")
+    run_test(recorder, "tests/test_c.py::test_c", setup="failed")
+    recorder.pytest_sessionfinish(session=mock.MagicMock())
+
+    assert read_log(recorder.path) == [
+        ("tests/test_a.py::test_a", "passed"),
+        ("tests/test_b.py::test_b", "failed"),
+        ("tests/test_a.py::test_a", "skipped"),
+        ("tests/test_c.py::test_c", "error"),
+    ]
+
+
+def test_recorder_xdist_controller_does_not_record(config, tmp_path):
+    config.option.dist = "load"
+    recorder = Recorder(config, directory=str(tmp_path))
+    run_test(recorder, "tests/test_a.py::test_a")
+    recorder.pytest_sessionfinish(session=mock.MagicMock())
+    assert not os.listdir(str(tmp_path))
+
+
+def test_recorder_xdist_worker(config, tmp_path):
+    config.workerinput = {"workerid": "gw1", "sherlock_session_id": "000000000000001"}
+    recorder = Recorder(config, directory=str(tmp_path))
+    assert recorder.path == str(tmp_path / f"000000000000001-gw1{SUFFIX}")
+
+
+def test_read_not_a_log(tmp_path):
+    path = tmp_path / f"broken{SUFFIX}"
+    path.write_bytes(b"something")
+    with pytest.raises(ValueError):
+        read_log(str(path))
+
+
+def test_rotate(config, tmp_path):
+    for session_id in ("001", "002", "003"):
+        for worker in ("gw0", "gw1"):
+            (tmp_path / f"{session_id}-{worker}{SUFFIX}").write_bytes(MAGIC)
+    recorder = Recorder(config, directory=str(tmp_path), keep=2)
+    recorder.rotate()
+    assert [[os.path.basename(p) for p in s] for s in get_sessions(str(tmp_path))] == [
+        [f"003-gw0{SUFFIX}", f"003-gw1{SUFFIX}"]
+    ]
+
+
+def test_recorded_order_from_directory(config, tmp_path):
+    recorder = Recorder(config, directory=str(tmp_path))
+    for name in ("test_c", "test_a", "test_b"):
+        run_test(recorder, f"tests/test.py::{name}")
+    recorder.pytest_sessionfinish(session=mock.MagicMock())
+
+    items = [mock.MagicMock(nodeid=f"tests/test.py::{n}") for n in ("test_a", "test_b", "test_c")]
+    candidates = RecordedOrder.read(str(tmp_path)).resolve(items, items[1])
+    assert [i.nodeid for i in candidates] == ["tests/test.py::test_c", "tests/test.py::test_a"]
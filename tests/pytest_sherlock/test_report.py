@@ -0,0 +1,153 @@
+import json
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.report import HuntReport, get_fixture_scopes
+
+
+@pytest.fixture
+def json_path(tmp_path):
+    return str(tmp_path / "report.json")
+
+
+def read(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_get_fixture_scopes():
+    item = mock.MagicMock()
+    item._fixtureinfo.name2fixturedefs = {
+        "config": (mock.MagicMock(scope="session"),),
+        "param": (mock.MagicMock(scope="session"), mock.MagicMock(scope="function")),
+    }
+    assert get_fixture_scopes(item, ["param", "config", "unknown"]) == {
+        "config": "session",
+        "param": "function",
+        "unknown": None,
+    }
+
+
+def test_from_config_without_option():
+    config = mock.MagicMock()
+    config.getoption.return_value = None
+    assert HuntReport.from_config(config) is None
+
+
+def test_report_is_written_incrementally(json_path):
+    report = HuntReport(json_path)
+    report.start("tests/test_b.py::test_b", 3, 2, 3)
+    data = read(json_path)
+    assert data["status"] == HuntReport.RUNNING
+    assert data["steps_range"] == [2, 3]
+
+    report.add_step(1, ["tests/test_a.py::test_a", "tests/test_b.py::test_b"], True, 0.5)
+    data = read(json_path)
+    assert data["status"] == HuntReport.RUNNING
+    assert data["steps"] == [
+        {
+            "step": 1,
+            "tests": ["tests/test_a.py::test_a", "tests/test_b.py::test_b"],
+            "verdict": "failed",
+            "duration": 0.5,
+        }
+    ]
+
+    report.add_step(2, ["tests/test_b.py::test_b"], True, 60.0, timed_out=True)
+    assert read(json_path)["steps"][-1]["timed_out"] is True
+
+
+def test_slowdown_baseline(json_path):
+    report = HuntReport(json_path)
+    report.set_mode("slowdown")
+    report.set_baseline([0.2, 0.1, 0.3], 0.6)
+    data = read(json_path)
+    assert data["mode"] == "slowdown"
+    assert data["baseline"] == {"durations": [0.2, 0.1, 0.3], "median": 0.2, "threshold": 0.6}
+
+
+@pytest.mark.parametrize(
+    "verdicts, exp_confidence",
+    (
+        pytest.param([True, False, True], 1.0, id="seen_green"),
+        pytest.param([True], 0.5, id="never_green"),
+    ),
+)
+def test_report_finish(json_path, verdicts, exp_confidence):
+    report = HuntReport(json_path)
+    report.start("tests/test_b.py::test_b", 3, 2, 3)
+    for step, verdict in enumerate(verdicts, 1):
+        report.add_step(step, [], verdict, 0.1)
+    report.finish(
+        coupled=["tests/test_a.py::test_a", "tests/test_b.py::test_b"],
+        fixtures={"config": "session"},
+        reproduce="pytest -l -vv tests/test_a.py::test_a tests/test_b.py::test_b",
+        message="AssertionError",
+    )
+    data = read(json_path)
+    assert data["status"] == HuntReport.FOUND
+    assert data["common_fixtures"] == {"config": "session"}
+    assert data["confidence"] == exp_confidence
+
+
+@pytest.mark.parametrize(
+    "verdicts, exp_confidence",
+    (
+        pytest.param([True, False], 1.0, id="seen_red"),
+        pytest.param([False], 0.5, id="never_red"),
+    ),
+)
+def test_setter_report_finish(json_path, verdicts, exp_confidence):
+    report = HuntReport(json_path)
+    report.start("tests/test_b.py::test_b", 3, 2, 3)
+    report.set_mode("setter")
+    for step, verdict in enumerate(verdicts):
+        report.add_step(step, [], verdict, 0.1)
+    report.finish(coupled=["tests/test_a.py::test_a", "tests/test_b.py::test_b"])
+    data = read(json_path)
+    assert data["mode"] == "setter"
+    assert data["confidence"] == exp_confidence
+
+
+def test_report_not_found(json_path):
+    report = HuntReport(json_path)
+    report.start("tests/test_b.py::test_b", 3, 2, 3)
+    report.finish()
+    data = read(json_path)
+    assert data["status"] == HuntReport.NOT_FOUND
+    assert data["confidence"] == 0.0
+
+
+def test_sarif_report(tmp_path):
+    path = str(tmp_path / "report.sarif")
+    report = HuntReport(path)
+    report.start("tests/test_b.py::test_b", 3, 2, 3)
+    report.finish(
+        coupled=["tests/test_a.py::test_a", "tests/test_b.py::test_b"],
+        message="AssertionError",
+    )
+    data = read(path)
+    assert data["version"] == "2.1.0"
+    (run,) = data["runs"]
+    (result,) = run["results"]
+    assert result["message"]["text"] == "AssertionError"
+    assert [loc["physicalLocation"]["artifactLocation"]["uri"] for loc in result["locations"]] == [
+        "tests/test_a.py",
+        "tests/test_b.py",
+    ]
+    assert run["properties"]["status"] == HuntReport.FOUND
+
+
+def test_partial_report(json_path):
+    report = HuntReport(json_path)
+    report.start("tests/test_b.py::test_b", 4, 2, 3)
+    report.partial(["tests/test_a.py::test_a"], (2, 3), "RL", "pytest --sherlock-order=x")
+    data = read(json_path)
+    assert data["status"] == HuntReport.PARTIAL
+    assert data["narrowest"] == {
+        "tests": ["tests/test_a.py::test_a"],
+        "range": [2, 3],
+        "path": "RL",
+    }
+    assert data["reproduce"] == "pytest --sherlock-order=x"
@@ -0,0 +1,218 @@
+import ast
+import os
+import textwrap
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.repro import (
+    CONFTEST,
+    INI,
+    TEST_MODULE,
+    Reproduction,
+    ReproductionError,
+    SourceModule,
+    _is_fixture,
+)
+
+CONFTEST_SOURCE = '''
+import json
+import os
+
+import pytest
+
+ROOT = os.path.dirname(__file__)
+
+
+def helper():
+    return {"b": 2}
+
+
+@pytest.fixture(scope="session")
+def config():
+    return helper()
+
+
+@pytest.fixture
+def unused():
+    return 1
+'''
+
+MODIFY_SOURCE = '''
+CONSTANT = 13
+
+
+def test_passed():
+    assert True
+
+
+def test_modify(config):
+    config["b"] = CONSTANT
+
+
+class TestClass:
+    attr = 1
+
+    def test_other(self):
+        pass
+
+    def test_method(self, config):
+        assert config["b"] == 2
+'''
+
+READ_SOURCE = '''
+import pytest
+
+
+@pytest.mark.parametrize("key", ["b"])
+def test_modify(config, key):
+    assert config[key] == 2
+'''
+
+ENDS_SOURCE = '''
+VALUES = dict(
+    a=1,
+)
+
+
+class Case:
+    """
+    docstring
+    """
+
+    def method(self):
+        return [
+            1,
+        ]
+
+LAST = 1
+'''
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = {
+        "conftest.py": CONFTEST_SOURCE,
+        "test_modify.py": MODIFY_SOURCE,
+        "test_read.py": READ_SOURCE,
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(textwrap.dedent(content))
+    return tmp_path
+
+
+def make_item(project, module, name, cls=None, with_fixtures=True):
+    func = SimpleNamespace(
+        __name__="config", __code__=SimpleNamespace(co_filename=str(project / "conftest.py"))
+    )
+    fixture_def = mock.MagicMock(func=func)
+    item = mock.MagicMock()
+    item.module.__file__ = str(project / module)
+    item.function.__name__ = name.split("[")[0]
+    item.name = name
+    item.cls = cls
+    item._fixtureinfo.names_closure = ["config", "request"] if with_fixtures else []
+    item._fixtureinfo.name2fixturedefs = {
+        "config": (fixture_def,),
+        "request": (mock.MagicMock(func=os.path.exists),),
+    }
+    return item
+
+
+@pytest.fixture
+def coupled(project):
+    return [
+        make_item(project, "test_modify.py", "test_modify"),
+        make_item(project, "test_read.py", "test_modify[b]"),
+    ]
+
+
+def test_source_module_dependencies(project):
+    module = SourceModule(str(project / "conftest.py"))
+    deps = module.dependencies([module.definitions["config"]])
+    assert [module.segment(n) for n in deps] == ["def helper():\n    return {\"b\": 2}"]
+
+
+def test_source_module_replaces_file(project):
+    module = SourceModule(str(project / "conftest.py"))
+    segment = module.segment(module.definitions["ROOT"])
+    assert segment == f"ROOT = os.path.dirname({str(project / 'conftest.py')!r})"
+
+
+def test_source_module_end_lineno_without_end_positions(tmp_path):
+    path = tmp_path / "ends.py"
+    path.write_text(ENDS_SOURCE)
+    module = SourceModule(str(path))
+    for node in module.tree.body:
+        for child in ast.walk(node):
+            if hasattr(child, "end_lineno"):
+                del child.end_lineno  # python 3.7 has no end positions
+    assert [module.end_lineno(node) for node in module.tree.body] == [4, 15, 17]
+
+
+@pytest.mark.parametrize(
+    "decorator, expected",
+    [
+        ("pytest.fixture", True),
+        ("pytest.fixture(scope='session')", True),
+        ("fixture", True),
+        ("fixture(autouse=True)", True),
+        ("pytest.mark.fixture_like", False),
+        ("use_fixture_data", False),
+        ("pytest.mark.usefixtures('config')", False),
+    ],
+)
+def test_is_fixture(decorator, expected):
+    node = ast.parse(f"@{decorator}\ndef func():\n    pass\n").body[0]
+    assert _is_fixture(node) is expected
+
+
+def test_make_conftest(project, coupled):
+    conftest = Reproduction(coupled, str(project)).make_conftest()
+    assert "def config():" in conftest
+    assert "def helper():" in conftest
+    assert "def unused():" not in conftest
+    assert "import json" in conftest
+
+
+def test_make_test_module_renames_same_names(project, coupled):
+    source, names = Reproduction(coupled, str(project)).make_test_module()
+    assert names == ["test_modify", "test_modify_victim[b]"]
+    assert "CONSTANT = 13" in source
+    assert "def test_passed" not in source
+    assert "def test_modify_victim(config, key):" in source
+
+
+def test_make_test_module_with_class(project):
+    class TestClass:
+        pass
+
+    coupled = [
+        make_item(project, "test_modify.py", "test_modify"),
+        make_item(project, "test_modify.py", "test_method", cls=TestClass),
+    ]
+    source, names = Reproduction(coupled, str(project)).make_test_module()
+    assert names == ["test_modify", "TestClass::test_method"]
+    assert "def test_method(self, config):" in source
+    assert "attr = 1" in source
+    assert "def test_other" not in source
+
+
+def test_make_test_module_without_source(project):
+    coupled = [
+        make_item(project, "test_modify.py", "test_modify"),
+        make_item(project, "test_modify.py", "test_generated"),
+    ]
+    with pytest.raises(ReproductionError, match="test_generated isn't defined"):
+        Reproduction(coupled, str(project)).make_test_module()
+
+
+def test_write(project, coupled, tmp_path):
+    directory = str(tmp_path / "repro")
+    result, command = Reproduction(coupled, str(project)).write(directory)
+    assert result == directory
+    assert sorted(os.listdir(directory)) == sorted([CONFTEST, INI, TEST_MODULE])
+    assert command.endswith(
+        f"-m pytest -l -vv {TEST_MODULE}::test_modify {TEST_MODULE}::test_modify_victim[b]"
+    )
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock import scan
+from pytest_sherlock.scan import (
+    FAILED,
+    PASSED,
+    SKIPPED,
+    Scanner,
+    find_order_dependent,
+    make_orders,
+    make_paths,
+    make_worker_command,
+    read_outcomes,
+)
+
+NODEIDS = [
+    "tests/test_a.py::test_1",
+    "tests/test_a.py::test_2",
+    "tests/test_b.py::test_1",
+    "tests/test_c.py::Test::test_1",
+]
+
+
+def test_make_orders():
+    orders = make_orders(NODEIDS)
+    assert list(orders)[:3] == ["original", "reversed", "modules-reversed"]
+    assert orders["original"] == NODEIDS
+    assert orders["reversed"] == NODEIDS[::-1]
+    assert orders["modules-reversed"] == [NODEIDS[3], NODEIDS[2], NODEIDS[0], NODEIDS[1]]
+    for order in orders.values():
+        assert sorted(order) == sorted(NODEIDS)
+
+
+def test_make_paths():
+    assert make_paths(NODEIDS) == ["tests/test_a.py", "tests/test_b.py", "tests/test_c.py"]
+    assert make_paths(NODEIDS, limit=2) == ["."]
+
+
+def test_make_worker_command():
+    command = make_worker_command(["-x"], ["a.py"], plugins=["pytest_sherlock.leaks"])
+    assert command[1:3] == ["-m", "pytest"]
+    assert command[command.index("no:sherlock") - 1] == "-p"
+    assert command[command.index("pytest_sherlock.scan") - 1] == "-p"
+    assert command[command.index("pytest_sherlock.leaks") - 1] == "-p"
+    assert command[-2:] == ["-x", "a.py"]
+
+
+def test_make_orders_skips_identical():
+    orders = make_orders(NODEIDS[:1])
+    assert list(orders) == ["original"]
+
+
+def test_find_order_dependent():
+    outcomes = OrderedDict(
+        [
+            ("original", {"a": PASSED, "b": FAILED, "c": FAILED, "d": SKIPPED}),
+            ("reversed", {"a": FAILED, "b": FAILED, "c": PASSED, "d": PASSED}),
+            ("modules-reversed", {"a": FAILED, "b": FAILED, "c": PASSED, "d": PASSED}),
+        ]
+    )
+    assert find_order_dependent(outcomes) == OrderedDict(
+        [
+            ("a", {PASSED: "original", FAILED: "reversed"}),
+            ("c", {PASSED: "reversed", FAILED: "original"}),
+        ]
+    )
+
+
+def test_read_outcomes(tmpdir):
+    junit = tmpdir.join("junit.xml")
+    junit.write(
+        '<testsuites><testsuite name="pytest">'
+        '<testcase classname="tests.test_a" name="test_1"/>'
+        '<testcase classname="tests.test_a" name="test_2"><failure message="x"/></testcase>'
+        '<testcase classname="tests.test_b" name="test_1"><skipped message="x"/></testcase>'
+        '<testcase classname="tests.test_c.Test" name="test_1"><error message="x"/></testcase>'
+        "</testsuite></testsuites>"
+    )
+    assert read_outcomes(str(junit), NODEIDS) == {
+        NODEIDS[0]: PASSED,
+        NODEIDS[1]: FAILED,
+        NODEIDS[2]: SKIPPED,
+        NODEIDS[3]: FAILED,
+    }
+    assert read_outcomes(str(tmpdir.join("missing.xml")), NODEIDS) == {}
+
+
+def test_reorder_by_order_file(tmpdir, monkeypatch):
+    order = tmpdir.join("order.txt")
+    order.write(f"{NODEIDS[2]}\n{NODEIDS[0]}\n")
+    monkeypatch.setenv(scan.ORDER_ENV, str(order))
+    items = [mock.MagicMock(nodeid=nodeid) for nodeid in NODEIDS]
+    config = mock.MagicMock()
+    scan.pytest_collection_modifyitems(config, items)
+    assert [item.nodeid for item in items] == [NODEIDS[2], NODEIDS[0]]
+    deselected = config.hook.pytest_deselected.call_args[1]["items"]
+    assert [item.nodeid for item in deselected] == [NODEIDS[1], NODEIDS[3]]
+
+
+def test_reorder_without_order_file(monkeypatch):
+    monkeypatch.delenv(scan.ORDER_ENV, raising=False)
+    items = [mock.MagicMock(nodeid=nodeid) for nodeid in NODEIDS]
+    scan.pytest_collection_modifyitems(mock.MagicMock(), items)
+    assert [item.nodeid for item in items] == NODEIDS
+
+
+class FakeScanner(Scanner):
+    """
+    Test `tests/test_b.py::test_1` fails after `tests/test_a.py::test_2`,
+    test `tests/test_c.py::Test::test_1` fails without `tests/test_a.py::test_1`
+    """
+
+    polluter, victim = NODEIDS[1], NODEIDS[2]
+    setter, brittle = NODEIDS[0], NODEIDS[3]
+    randomly_fails = None  # fails only in the first run of the original order
+
+    async def run_order(self, semaphore, name, order):
+        self.runs.append(name)
+        outcomes = {}
+        for idx, nodeid in enumerate(order):
+            outcomes[nodeid] = PASSED
+            if nodeid == self.victim and self.polluter in order[:idx]:
+                outcomes[nodeid] = FAILED
+            if nodeid == self.brittle and self.setter not in order[:idx]:
+                outcomes[nodeid] = FAILED
+            if nodeid == self.randomly_fails and name == "original":
+                outcomes[nodeid] = FAILED
+        return outcomes
+
+    async def hunt(self, semaphore, idx, victim, order, mode="polluter"):
+        self.hunts.append(idx)
+        culprit = self.polluter if mode == "polluter" else self.setter
+        assert order.index(culprit) < order.index(victim)
+        return {"status": "found", "mode": mode, "coupled": [culprit, victim]}
+
+
+@pytest.fixture
+def scanner(make_config, tmpdir):
+    config = make_config(sherlock_workers=2, sherlock_report=str(tmpdir.join("scan.json")))
+    instance = FakeScanner(config)
+    instance.items = [mock.MagicMock(nodeid=nodeid) for nodeid in NODEIDS]
+    instance.runs, instance.hunts = [], []
+    return instance
+
+
+def test_scan(scanner):
+    outcomes = asyncio.run(scanner.scan())
+    assert list(outcomes) == list(make_orders(NODEIDS))
+    assert scanner.results == {
+        scanner.victim: {
+            "status": "found",
+            "mode": "polluter",
+            "coupled": [scanner.polluter, scanner.victim],
+            "order": "original",
+        },
+        scanner.brittle: {
+            "status": "found",
+            "mode": "setter",
+            "coupled": [scanner.setter, scanner.brittle],
+            "order": "original",
+        },
+    }
+    assert sorted(scanner.hunts) == [0, 1]
+    # the failed runs are repeated before hunts: the order of the victim and the brittle alone
+    assert scanner.runs[-2:] == ["confirm-original", "confirm-alone-1"]
+    assert scanner.write_report()
+    with open(scanner.report_path) as f:
+        assert json.load(f) == {"victims": scanner.results, "flaky": {}}
+
+
+def test_scan_skips_randomly_flaky(scanner):
+    scanner.randomly_fails = "tests/test_d.py::test_1"
+    scanner.items.append(mock.MagicMock(nodeid=scanner.randomly_fails))
+    asyncio.run(scanner.scan())
+    assert list(scanner.results) == [scanner.victim, scanner.brittle]
+    assert scanner.flaky == {scanner.randomly_fails: "original"}
+
+
+def test_make_hunt_command(scanner):
+    scanner.config.pluginmanager.get_plugin.return_value = None
+    scanner.directory = "scan"
+    command = scanner.make_hunt_command("tests/test_b.py::test_1", "hunt-0", ["tests"], "setter")
+    cache_dir = os.path.join("scan", "hunt-0-cache")
+    assert command[command.index(f"cache_dir={cache_dir}") - 1] == "-o"
+    assert command[-6:] == [
+        "-q",
+        "--flaky-test=tests/test_b.py::test_1",
+        "--sherlock-mode=setter",
+        f"--sherlock-order={os.path.join('scan', 'hunt-0.txt')}",
+        f"--sherlock-report={os.path.join('scan', 'hunt-0.json')}",
+        "tests",
+    ]
+    assert "pytest_sherlock.plugin" in command
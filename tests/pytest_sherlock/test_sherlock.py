@@ -1,4 +1,5 @@
-import argparse
+import os
+import time
 from unittest import mock
 
 import pytest
@@ -8,7 +9,29 @@ from _pytest.python import Function
 from _pytest.runner import TestReport as PytestReport
 from _pytest.terminal import TerminalReporter
 
-from pytest_sherlock.sherlock import Sherlock, log, refresh_state, write_coupled_report
+from pytest_sherlock.hunt import Collection
+from pytest_sherlock.parallel import WorkerError
+from pytest_sherlock.runner import (
+    MODE_AUTO,
+    MODE_POLLUTER,
+    MODE_SETTER,
+    MODE_SLOWDOWN,
+    BucketTimeout,
+    watchdog,
+)
+from pytest_sherlock.sherlock import (
+    Sherlock,
+    Steps,
+    check_timeout_method,
+    get_cached_fixture_value,
+    get_reusable_fixtures,
+    load_coverage,
+    load_strategy,
+    log,
+    write_coupled_report,
+)
+from pytest_sherlock.state import RESET_HARD, RESET_SOFT, refresh_state, run_lean
+from pytest_sherlock.strategy import BinaryStrategy, Bucket
 
 FAKE_FIXTURE_NAMES = ["my_fixture", "fixture_do_something", "other_fixture"]
 
@@ -75,16 +98,13 @@ def cache():
 
 
 @pytest.fixture
-def config(target_item, reporter, step, cache):
+def config(make_config, target_item, reporter, step, cache):
     plugin_manager = mock.MagicMock(spec=PytestPluginManager)
     plugin_manager.get_plugin.return_value = reporter
-    option_namespace = argparse.Namespace(flaky_test=target_item.nodeid, step=step)
-    c = mock.MagicMock(
-        spec=Config, pluginmanager=plugin_manager, option=option_namespace
-    )
+    c = mock.MagicMock(spec=Config, pluginmanager=plugin_manager)
     c.cache = cache
     c.getvalue.return_value = 2
-    return c
+    return make_config(c, flaky_test=target_item.nodeid, step=step, sherlock_no_history=True)
 
 
 @pytest.fixture
@@ -108,7 +128,6 @@ def sherlock_with_prepared_collection(sherlock, config, session, items, target_i
        /           \           /           \
     (0, 1)      (1, 2)      (2, 3)      (3, 4)
     """
-    sherlock.config.getoption.return_value = True
     next(sherlock.pytest_sessionstart(session))
     next(sherlock.pytest_collection_modifyitems(session, config, items))
     return sherlock
@@ -147,6 +166,65 @@ class TestCleanupItem(object):
         self.check_cleanup_fixtures(fixtures)
         assert not stack
 
+    def test_soft_refresh_state(self, called_item, fixtures):
+        fixtures["fixture1"][0].cached_result = ("value", None, None)
+        fixtures["fixture2"][0].cached_result = ("value", None, None)
+        called_item._request = mock.MagicMock()
+        errored = mock.MagicMock(cached_result=(None, None, ValueError()))
+        fixtures["fixture3"] = (errored,)
+        next_item = make_fake_test_item("next")
+
+        assert refresh_state(
+            called_item, touched={"fixture1"}, nextitem=next_item, level=RESET_SOFT
+        )
+        fixtures["fixture1"][0].finish.assert_called_once_with(called_item._request)
+        fixtures["fixture2"][0].finish.assert_not_called()
+        errored.finish.assert_called_once_with(called_item._request)
+        setup_state = called_item.session._setupstate
+        setup_state.teardown_all.assert_not_called()
+        setup_state.teardown_exact.assert_called_once_with(called_item, next_item)
+
+    @pytest.mark.parametrize("is_valid", (True, False), ids=["valid", "invalid"])
+    def test_soft_refresh_state_with_reusable_fixture(
+        self, called_item, fixtures, is_valid
+    ):
+        called_item._request = mock.MagicMock()
+        fixture = fixtures["fixture1"][0]
+        fixture.cached_result = ("db", None, None)
+        fixtures["fixture2"][0].cached_result = None
+        reset = mock.MagicMock(return_value=is_valid)
+
+        assert refresh_state(
+            called_item,
+            touched={"fixture1"},
+            nextitem=make_fake_test_item("next"),
+            level=RESET_SOFT,
+            reusable={"fixture1": reset},
+        )
+        reset.assert_called_once_with("db")
+        assert fixture.finish.called is not is_valid
+
+    def test_soft_refresh_state_with_failed_reset(self, called_item, fixtures):
+        called_item._request = mock.MagicMock()
+        fixture = fixtures["fixture1"][0]
+        fixture.cached_result = ("db", None, None)
+        fixtures["fixture2"][0].cached_result = None
+        reset = mock.MagicMock(side_effect=RuntimeError("connection is closed"))
+
+        refresh_state(
+            called_item,
+            touched={"fixture1"},
+            nextitem=make_fake_test_item("next"),
+            level=RESET_SOFT,
+            reusable={"fixture1": reset},
+        )
+        fixture.finish.assert_called_once_with(called_item._request)
+
+    def test_soft_refresh_state_without_next_item(self, called_item, fixtures):
+        assert refresh_state(called_item, touched=set(), level=RESET_SOFT)
+        self.check_cleanup_fixtures(fixtures)
+        called_item.session._setupstate.teardown_all.assert_called_once_with()
+
     def test_write_coupled_report_without_fixtures(self, called_item):
         coupled_tests = [
             make_fake_test_item("test1"),
@@ -192,6 +270,526 @@ class TestCleanupItem(object):
         assert write_coupled_report(coupled_tests) == exp_message
 
 
+class TestReusableFixtures(object):
+    def test_get_reusable_fixtures(self):
+        config = mock.MagicMock()
+        config.getini.return_value = [
+            "db = os.path:exists",
+            "app_server",
+        ]
+        assert get_reusable_fixtures(config) == {"db": os.path.exists, "app_server": None}
+        config.getini.assert_called_once_with("sherlock_reusable_fixtures")
+
+    @pytest.mark.parametrize(
+        "line",
+        ("db = not_existing_module:reset", "db = os.path:not_existing", "db = os:sep"),
+        ids=["module", "attribute", "not_callable"],
+    )
+    def test_get_reusable_fixtures_with_invalid_callable(self, line):
+        config = mock.MagicMock()
+        config.getini.return_value = [line]
+        with pytest.raises(pytest.UsageError):
+            get_reusable_fixtures(config)
+
+
+class TestBucket(object):
+    def test_view(self, items, target_item):
+        bucket = Bucket(items, 1, 3, target_item)
+        assert len(bucket) == 3
+        assert list(bucket) == [items[1], items[2], target_item]
+        assert bucket == [items[1], items[2], target_item]
+        assert (bucket[0], bucket[-1]) == (items[1], target_item)
+        assert bucket[:-1] == [items[1], items[2]]
+        assert list(bucket.tests) == [items[1], items[2]]
+        with pytest.raises(IndexError):
+            bucket[3]  # pylint: disable=pointless-statement
+
+    def test_with_target_does_not_copy(self, items, target_item):
+        bucket = Bucket(items, 0, 2)
+        assert len(bucket) == 2
+        with_target = bucket.with_target(target_item)
+        assert with_target.items is items
+        assert len(with_target) == 3
+
+    def test_nodeids_are_collected_once(self, items, target_item):
+        bucket = Bucket(items, 0, 2, target_item)
+        assert bucket.nodeids == [items[0].nodeid, items[1].nodeid, target_item.nodeid]
+        assert bucket.nodeids is bucket.nodeids
+
+
+class TestCollection(object):
+    def test_suspect_confirmed_in_one_step(self, items, target_item):
+        suspect = items[2]
+        collection = Collection.make(items[:4], target_item, suspects=[suspect])
+        assert (collection.min, collection.max) == (1, 4)
+        assert next(collection) == [suspect, target_item]
+        with pytest.raises(StopIteration):
+            collection.send(True)
+
+    def test_suspect_not_confirmed(self, items, target_item):
+        suspect = items[2]
+        collection = Collection.make(items[:4], target_item, suspects=[suspect])
+        assert next(collection) == [suspect, target_item]
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            assert collection.send(False) == items[:2] + [target_item]
+
+    @pytest.mark.parametrize(
+        "reset, exp_last_next_item",
+        ((RESET_SOFT, 0), (RESET_HARD, None)),
+    )
+    def test_get_next_item(self, items, target_item, reset, exp_last_next_item):
+        collection = Collection.make(items[:4], target_item, reset=reset)
+        bucket = next(collection)
+        assert collection.get_next_item(bucket, 1) == bucket[1]
+        exp_item = None if exp_last_next_item is None else bucket[exp_last_next_item]
+        assert collection.get_next_item(bucket, len(bucket)) == exp_item
+
+    def test_soft_send_refresh_touched_fixtures(self, items, target_item):
+        collection = Collection.make(items[:4], target_item, reset=RESET_SOFT)
+        bucket = next(collection)
+        with mock.patch("pytest_sherlock.hunt.refresh_state") as refresh:
+            next_bucket = collection.send(True)
+        refresh.assert_called_once_with(
+            item=target_item,
+            touched=set(FAKE_FIXTURE_NAMES),  # the target could change its own fixtures
+            nextitem=next_bucket[0],
+            level=RESET_SOFT,
+            reusable={},
+        )
+        assert collection.bucket == next_bucket
+        assert bucket != next_bucket
+
+    def test_narrow(self, items, target_item):
+        suspect = items[3]
+        collection = Collection.make(items[:4], target_item, suspects=[suspect])
+        assert collection.narrowest == (0, 4)
+        next(collection)
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            collection.send(False)  # suspect isn't guilty, the range is the same
+            assert (collection.narrowest, collection.path) == ((0, 4), "")
+            collection.send(False)  # (0, 2) passed
+            assert (collection.narrowest, collection.path) == ((2, 4), "R")
+            with pytest.raises(StopIteration):
+                collection.send(True)  # (2, 3) failed
+        assert (collection.narrowest, collection.path) == ((2, 3), "RL")
+        assert collection.get_narrowest(items[:4]) == [items[2]]
+
+
+class TestSteps(object):
+    def test_store_compact(self, config, items, target_item):
+        steps = Steps(config)
+        steps.add(Bucket(items, 0, 4, target_item))
+        steps.add(Bucket(items, 2, 4, target_item))
+        steps.store()
+        config.cache.set.assert_called_once_with(
+            Steps.STEPS_KEY,
+            {
+                "nodeids": [item.nodeid for item in items],
+                "target": target_item.nodeid,
+                "steps": [[0, 4], [2, 4]],
+            },
+        )
+
+    def test_suspects_have_own_table(self, config, items, target_item):
+        steps = Steps(config)
+        suspects = [items[3]]
+        steps.add(Bucket(suspects, 0, 1, target_item))
+        steps.add(Bucket(items, 0, 2, target_item))
+        assert steps.nodeids == [items[3].nodeid] + [item.nodeid for item in items]
+        assert steps.steps == [[0, 1], [1, 3]]
+        assert steps.get_step(1) == {items[0].nodeid, items[1].nodeid, target_item.nodeid}
+
+    @pytest.mark.parametrize("step", (2,))
+    def test_setup_from_step(self, config, items, target_item):
+        previous = Steps(config)
+        previous.add(Bucket(items, 0, 4, target_item))
+        previous.add(Bucket(items, 2, 4, target_item))
+        config.cache.get.return_value = previous.dump()
+        steps = Steps(config).read()
+        assert steps.setup_from_step(items[:4]) == items[2:4]
+        assert steps.steps == []
+
+    @pytest.mark.parametrize("step", (2,))
+    def test_read_old_format(self, config, items, target_item):
+        config.cache.get.return_value = [
+            [items[0].nodeid, items[1].nodeid, target_item.nodeid],
+            [items[1].nodeid, target_item.nodeid],
+        ]
+        steps = Steps(config).read()
+        assert steps.get_step(1) == {items[1].nodeid, target_item.nodeid}
+        assert steps.setup_from_step(items[:4]) == items[1:2]
+
+
+@pytest.mark.parametrize(
+    "fixture_defs, expected",
+    (
+        ([mock.MagicMock(cached_result=({"x": 1}, None, None))], {"x": 1}),
+        ([mock.MagicMock(cached_result=None)], "default"),
+        ([mock.MagicMock(cached_result=(None, None, (ValueError,)))], "default"),
+        ([], "default"),
+    ),
+)
+def test_get_cached_fixture_value(target_item, fixture_defs, expected):
+    target_item._fixtureinfo = mock.MagicMock(name2fixturedefs={"state": fixture_defs})
+    assert get_cached_fixture_value(target_item, "state", "default") == expected
+
+
+class TestLoadStrategy(object):
+    def test_builtin(self):
+        assert load_strategy("binary") is BinaryStrategy
+
+    def test_by_path(self):
+        assert load_strategy("pytest_sherlock.strategy:BinaryStrategy") is BinaryStrategy
+
+    @pytest.mark.parametrize("name", ("unknown", "pytest_sherlock.strategy:bucket_of"))
+    def test_invalid(self, name):
+        with pytest.raises(pytest.UsageError):
+            load_strategy(name)
+
+
+class TestProbe(object):
+    @pytest.fixture
+    def session(self):
+        return mock.MagicMock(shouldfail=False, shouldstop=False)
+
+    @pytest.fixture
+    def config(self, config):
+        config.hook = mock.MagicMock()
+        return config
+
+    @pytest.fixture
+    def hunt(self, sherlock_with_prepared_collection):
+        return sherlock_with_prepared_collection.hunt
+
+    @staticmethod
+    def run_bucket(hunt, session, bucket):
+        return hunt.runner.run_bucket(session, bucket, hunt.collection, hunt.probe)
+
+    def test_run_bucket_without_probe(self, hunt, session):
+        bucket = next(hunt.collection)
+        assert self.run_bucket(hunt, session, bucket) is None
+        assert hunt.config.hook.pytest_runtest_protocol.call_count == len(bucket)
+
+    def test_bucket_ends_on_detection(self, hunt, session):
+        bucket = next(hunt.collection)
+        culprit = bucket[0]
+        hunt.probe.check = lambda item: item is culprit
+        with mock.patch("pytest_sherlock.runner.teardown_towards") as teardown:
+            assert self.run_bucket(hunt, session, bucket) is culprit
+        teardown.assert_called_once_with(culprit, bucket[-1])
+        calls = hunt.config.hook.pytest_runtest_protocol.call_args_list
+        assert [c[1]["item"] for c in calls] == [culprit, bucket[-1]]
+
+    def test_pair_is_not_probed(self, hunt, session):
+        hunt.probe.check = mock.MagicMock(return_value=True)
+        pair = Bucket([hunt.candidates[0]], 0, 1, hunt.collection.target_test_method)
+        assert self.run_bucket(hunt, session, pair) is None
+        hunt.probe.check.assert_not_called()
+
+    def test_confirm_culprit(self, hunt):
+        bucket = next(hunt.collection)
+        target = hunt.collection.target_test_method
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            pair = hunt.confirm_culprit(bucket[1], bucket, step=1)
+        assert pair == [bucket[1], target]
+        assert hunt.collection.max == 2
+
+    def test_refuted_culprit_is_not_probed(self, hunt, session):
+        bucket = next(hunt.collection)
+        hunt.probe.check = lambda item: item is bucket[0]
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            assert hunt.refute_culprit(bucket[0], bucket) is bucket
+        assert self.run_bucket(hunt, session, bucket) is None
+        assert hunt.config.hook.pytest_runtest_protocol.call_count == len(bucket)
+
+    def test_restore_probed(self, hunt):
+        collection = hunt.collection
+        bucket = next(collection)
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            hunt.confirm_culprit(bucket[1], bucket, step=1)
+            # the pair passed, the probed bucket failed: go on with its left half
+            items = hunt.restore_probed()
+        assert hunt.collection is collection
+        assert hunt.probe.probed is None
+        assert bucket[1].nodeid in hunt.probe.refuted
+        tests = list(bucket.tests)
+        assert list(items.tests) == tests[: len(tests) // 2]
+
+
+def test_load_coverage_not_found(tmp_path):
+    with pytest.raises(pytest.UsageError, match="Coverage data file not found"):
+        load_coverage(str(tmp_path / ".coverage"))
+
+
+class TestLean(object):
+    @pytest.fixture
+    def item(self, target_item):
+        target_item.config.getoption.return_value = False
+        target_item._request = False
+        return target_item
+
+    def test_run_lean(self, item, items):
+        calls = run_lean(item, nextitem=items[0])
+        assert [call.when for call in calls] == ["setup", "call", "teardown"]
+        item._initrequest.assert_called_once_with()
+        item.ihook.pytest_runtest_setup.assert_called_once_with(item=item)
+        item.ihook.pytest_runtest_call.assert_called_once_with(item=item)
+        item.ihook.pytest_runtest_teardown.assert_called_once_with(item=item, nextitem=items[0])
+        item.ihook.pytest_runtest_makereport.assert_not_called()
+        item.ihook.pytest_runtest_logreport.assert_not_called()
+        assert item._request is False and item.funcargs is None
+
+    def test_failed_setup(self, item):
+        item.ihook.pytest_runtest_setup.side_effect = ValueError
+        calls = run_lean(item)
+        assert [call.when for call in calls] == ["setup", "teardown"]
+        assert calls[0].excinfo.type is ValueError
+        item.ihook.pytest_runtest_call.assert_not_called()
+
+    def test_run_candidate(self, sherlock_with_prepared_collection):
+        hunt = sherlock_with_prepared_collection.hunt
+        session = mock.MagicMock(shouldfail=False, shouldstop=False)
+        candidate, target = hunt.candidates[0], hunt.collection.target_test_method
+        candidate.config.getoption.return_value = False
+        hook = hunt.config.hook = mock.MagicMock()
+        hunt.runner.run_test(session, candidate, target, lean=True)
+        hook.pytest_runtest_protocol.assert_not_called()
+        hunt.runner.run_test(session, target, None)
+        hook.pytest_runtest_protocol.assert_called_once_with(item=target, nextitem=None)
+        assert candidate.nodeid in hunt.runner.durations.measured
+
+
+class TestSetterMode(object):
+    @pytest.fixture
+    def session(self):
+        return mock.MagicMock(shouldfail=False, shouldstop=False)
+
+    @pytest.fixture
+    def config(self, config):
+        config.hook = mock.MagicMock()
+        return config
+
+    @pytest.mark.parametrize(
+        "mode, failed, expected",
+        (
+            (MODE_POLLUTER, True, True),
+            (MODE_POLLUTER, False, False),
+            (MODE_SETTER, True, False),
+            (MODE_SETTER, False, True),
+        ),
+    )
+    def test_is_guilty(self, sherlock_with_prepared_collection, mode, failed, expected):
+        verdict = sherlock_with_prepared_collection.hunt.verdict
+        verdict.mode = mode
+        assert verdict.is_guilty(failed) is expected
+
+    def test_target_fails_alone(self, sherlock_with_prepared_collection, session):
+        hunt = sherlock_with_prepared_collection.hunt
+        hunt.verdict.mode = MODE_AUTO
+        hunt.probe.check = mock.MagicMock()
+        hunt.collection.suspects.append(hunt.candidates[0])
+        report = mock.MagicMock()
+
+        def fail(item, nextitem):
+            hunt.verdict.failed_report = report
+
+        hunt.config.hook.pytest_runtest_protocol.side_effect = fail
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            assert hunt.detect_mode(session)
+        assert hunt.verdict.mode == MODE_SETTER
+        assert hunt.verdict.alone_report is report
+        assert hunt.probe.check is None
+        assert hunt.collection.suspects == []
+        assert hunt.collection.strategy.items is hunt.candidates
+
+    @pytest.mark.parametrize("mode, expected", ((MODE_AUTO, True), (MODE_SETTER, False)))
+    def test_target_passes_alone(
+        self, sherlock_with_prepared_collection, session, mode, expected
+    ):
+        hunt = sherlock_with_prepared_collection.hunt
+        hunt.verdict.mode = mode
+        collection = hunt.collection
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            assert hunt.detect_mode(session) is expected
+        assert hunt.verdict.mode == (MODE_POLLUTER if expected else MODE_SETTER)
+        assert hunt.collection is collection
+        if expected:
+            hunt.reporter.write_line.assert_called_with(
+                "The target passes alone, try to find the test which breaks it in [2-3] steps"
+            )
+        calls = hunt.config.hook.pytest_runtest_protocol.call_args_list
+        assert [c[1]["item"] for c in calls] == [collection.target_test_method]
+
+
+class TestTimeout(object):
+    @pytest.fixture
+    def session(self):
+        return mock.MagicMock(shouldfail=False, shouldstop=False)
+
+    @pytest.fixture
+    def config(self, config):
+        config.hook = mock.MagicMock()
+        return config
+
+    def test_watchdog(self):
+        on_timeout = mock.MagicMock()
+        with pytest.raises(BucketTimeout, match="longer than 0.1s"):
+            with watchdog(0.05, on_timeout) as armed:
+                assert armed
+                time.sleep(5)
+        on_timeout.assert_called_once_with()
+        with watchdog(None) as armed:
+            assert armed is False
+
+    @pytest.mark.parametrize(
+        "plugin, method, conflicts",
+        ((False, None, False), (True, None, True), (True, "signal", True), (True, "thread", False)),
+    )
+    def test_check_timeout_method(self, plugin, method, conflicts):
+        config = mock.MagicMock()
+        config.pluginmanager.hasplugin.return_value = plugin
+        config.getoption.return_value = method
+        config.getini.return_value = ""
+        if conflicts:
+            with pytest.raises(pytest.UsageError, match="--timeout-method=thread"):
+                check_timeout_method(config)
+        else:
+            check_timeout_method(config)
+        config.pluginmanager.hasplugin.assert_called_once_with("timeout")
+
+    def test_get_timeout(self, sherlock):
+        runner = sherlock.hunt.runner
+        runner.durations.known = {}
+        assert runner.get_timeout(["tests/test_one.py"]) is None
+        sherlock.config.option.sherlock_timeout = 10.0
+        assert runner.get_timeout(["tests/test_one.py"]) == 10.0
+        runner.durations.known = {"tests/test_one.py": 1.0, "tests/test_two.py": 5.0}
+        assert runner.get_timeout(["tests/test_one.py"]) == 10.0
+        assert runner.get_timeout(["tests/test_one.py", "tests/test_two.py"]) == 18.0
+
+    def test_hung_candidate_fails_bucket(self, sherlock_with_prepared_collection, session):
+        hunt = sherlock_with_prepared_collection.hunt
+        hunt.config.option.sherlock_timeout = 0.05
+        hunt.runner.durations.known = {}
+        bucket = next(hunt.collection)
+        hunt.reset_progress(session, bucket)
+
+        def run(item, nextitem):
+            if item is bucket[0]:
+                time.sleep(5)  # deadlock
+
+        hunt.config.hook.pytest_runtest_protocol.side_effect = run
+        with mock.patch("pytest_sherlock.runner.teardown_towards") as teardown:
+            assert hunt.runner.run_bucket(session, bucket, hunt.collection, hunt.probe) is None
+        teardown.assert_called_once_with(bucket[0], None)
+        assert hunt.verdict.timed_out is bucket[0]
+        assert hunt.config.hook.pytest_runtest_protocol.call_count == 1  # no target
+
+
+class TestSlowdown(object):
+    @pytest.fixture
+    def session(self):
+        return mock.MagicMock(shouldfail=False, shouldstop=False)
+
+    @pytest.fixture
+    def config(self, config):
+        config.hook = mock.MagicMock()
+        return config
+
+    @pytest.fixture
+    def sherlock(self, sherlock_with_prepared_collection):
+        sherlock_with_prepared_collection.hunt.verdict.mode = MODE_SLOWDOWN
+        return sherlock_with_prepared_collection
+
+    @pytest.fixture
+    def verdict(self, sherlock):
+        return sherlock.hunt.verdict
+
+    def test_measure_baseline(self, sherlock, verdict, session):
+        sherlock.config.option.sherlock_baseline_runs = 3
+        durations = iter([1.0, 0.2, 0.3])
+
+        def run(item, nextitem):
+            verdict.duration = next(durations)  # warm-up run is slow
+
+        sherlock.config.hook.pytest_runtest_protocol.side_effect = run
+        with mock.patch("pytest_sherlock.hunt.refresh_state"):
+            assert sherlock.hunt.measure_baseline(session) == 0.3
+        assert verdict.threshold == pytest.approx(0.9)
+        assert sherlock.config.hook.pytest_runtest_protocol.call_count == 3
+
+    @pytest.mark.parametrize(
+        "duration, timed_out, expected",
+        ((None, None, False), (0.5, None, False), (2.0, None, True), (None, "test", True)),
+    )
+    def test_is_failed(self, verdict, duration, timed_out, expected):
+        verdict.baseline = 0.5
+        verdict.failed_report = mock.MagicMock()  # failures of the target don't matter
+        verdict.duration = duration
+        verdict.timed_out = timed_out
+        assert verdict.is_failed() is expected
+
+    def test_duration_of_call(self, sherlock, verdict, target_item):
+        for when, duration in (("setup", 1.0), ("call", 0.25), ("teardown", 2.0)):
+            report = mock.MagicMock(
+                nodeid=target_item.nodeid, when=when, duration=duration, outcome="passed"
+            )
+            hook = sherlock.pytest_runtest_makereport(target_item, mock.MagicMock())
+            next(hook)
+            with pytest.raises(StopIteration):
+                hook.send(mock.MagicMock(get_result=mock.MagicMock(return_value=report)))
+        assert verdict.duration == 0.25
+
+    def test_describe(self, verdict, mock_coupled):
+        verdict.baseline = 0.5
+        verdict.duration = 5.0
+        assert verdict.describe(mock_coupled) == (
+            f"The target takes 5.000s after {mock_coupled[0].nodeid}, "
+            "10.0x of its baseline 0.500s"
+        )
+
+    def test_found_without_stale_failures(self, sherlock, verdict, session):
+        target = sherlock.hunt.collection.target_test_method
+        sherlock.reporter.stats["failed"] = [mock.MagicMock()]  # of a previous step
+        session.testsfailed = 0
+        session.config.option.collectonly = False
+
+        def run(item, nextitem):
+            if item is target:
+                verdict.duration = 5.0
+
+        sherlock.config.hook.pytest_runtest_protocol.side_effect = run
+        with mock.patch.object(
+            sherlock.hunt, "measure_baseline"
+        ) as measure, mock.patch.object(sherlock, "write_reproduction"), mock.patch(
+            "pytest_sherlock.hunt.refresh_state"
+        ), mock.patch(
+            "pytest_sherlock.runner.teardown_towards"
+        ):
+            measure.side_effect = lambda session: setattr(verdict, "baseline", 0.5)
+            assert sherlock.pytest_runtestloop(session) is True
+        assert sherlock.last_failed is not None
+        assert "failed" not in sherlock.reporter.stats
+
+    @pytest.fixture
+    def mock_coupled(self):
+        return [make_fake_test_item("test1"), make_fake_test_item("test2")]
+
+
+def test_failed_worker_falls_back_in_process(sherlock_with_prepared_collection, session):
+    hunt = sherlock_with_prepared_collection.hunt
+    hunt.config.option.sherlock_workers = 2
+    collection = hunt.collection
+    with mock.patch(
+        "pytest_sherlock.hunt.ParallelHunt.run", side_effect=WorkerError("no report")
+    ):
+        assert hunt.prepare(session) is True
+    hunt.reporter.write_line.assert_called_with(
+        "Worker failed: no report, continue the hunt in the current process", yellow=True
+    )
+    assert hunt.collection is collection
+
+
 class TestSherlock(object):
     @pytest.fixture
     def sherlock_with_failures(self, sherlock_with_prepared_collection):
@@ -230,28 +828,42 @@ class TestSherlock(object):
         )
         return mock.MagicMock(spec=PytestReport, longrepr=longrepr)
 
-    def test_create_instance(self, cache):
+    @pytest.mark.parametrize(
+        "budget, spent, tested, bucket_size, expected",
+        (
+            (None, 100, 10, 10, False),
+            (60, 0, 0, 1000, False),
+            (60, 30, 10, 5, False),
+            (60, 30, 10, 20, True),
+            (60, 61, 10, 1, True),
+        ),
+    )
+    def test_is_out_of_budget(
+        self, sherlock, budget, spent, tested, bucket_size, expected
+    ):
+        sherlock.config.option.sherlock_budget = budget
+        assert sherlock.hunt.is_out_of_budget(spent, tested, bucket_size) is expected
+
+    def test_create_instance(self, make_config, cache):
         config = mock.MagicMock(spec=Config)  # pytest config
         config.getvalue.return_value = 2
-        config.option = mock.MagicMock(step=None)
         config.cache = cache
+        make_config(config, sherlock_no_history=True)
 
         sherlock = Sherlock(config)
         assert sherlock.config == config
-        assert sherlock.collection is None
-        assert sherlock.session is None
-        assert sherlock.reporter is None
-        assert sherlock.failed_report is None
+        assert sherlock.hunt.collection is None
+        assert sherlock.hunt.verdict.failed_report is None
+        assert sherlock.last_failed is None
 
     def test_instance_after_pytest_sessionstart(self, config, session, reporter):
         sherlock = Sherlock(config)
         next(sherlock.pytest_sessionstart(session))
 
         assert sherlock.config == config
-        assert sherlock.collection is None
-        assert sherlock.session == session
+        assert sherlock.hunt.collection is None
         assert sherlock.reporter == reporter
-        assert sherlock.failed_report is None
+        assert sherlock.hunt.verdict.failed_report is None
 
     @pytest.mark.parametrize("line", ("123", 12), ids=["string", "integer"])
     def test_write_step_to_terminal(self, sherlock_with_prepared_collection, line):
@@ -260,22 +872,35 @@ class TestSherlock(object):
         ________ Step [123 of 666] ________
         """
         exp_msg = "Step [{} of 666]:".format(line)
-        sherlock_with_prepared_collection.write_step(line, 666)
+        sherlock_with_prepared_collection.hunt.write_step(line, 666)
         sherlock_with_prepared_collection.reporter.write_sep.assert_called_once_with(
             "_", exp_msg, yellow=True, bold=True
         )
 
-    def test_terminal_reset_progress(self, sherlock_with_prepared_collection):
+    def test_write_step_with_eta(self, sherlock_with_prepared_collection):
+        sherlock_with_prepared_collection.hunt.write_step(2, 4, eta=(95.0, 200.0))
+        sherlock_with_prepared_collection.reporter.write_sep.assert_called_once_with(
+            "_", "Step [2 of 4]: ETA ~1m 35s (at most 3m 20s)", yellow=True, bold=True
+        )
+
+    def test_get_eta(self, sherlock_with_prepared_collection):
+        hunt = sherlock_with_prepared_collection.hunt
+        assert hunt.get_eta() is None  # nothing is known about durations
+        hunt.runner.durations.known = {item.nodeid: 1.0 for item in hunt.candidates}
+        expected, worst = hunt.get_eta()
+        assert 0 < expected <= worst
+
+    def test_terminal_reset_progress(self, sherlock_with_prepared_collection, session):
         items = list(range(5))
-        sherlock_with_prepared_collection.session.testscollected = 999
+        session.testscollected = 999
         setattr(
             sherlock_with_prepared_collection.reporter,
             "_progress_nodeids_reported",
             {1, 2},
         )
 
-        sherlock_with_prepared_collection.reset_progress(items)
-        assert sherlock_with_prepared_collection.session.testscollected == len(items)
+        sherlock_with_prepared_collection.hunt.reset_progress(session, items)
+        assert session.testscollected == len(items)
         assert (
             sherlock_with_prepared_collection.reporter._progress_nodeids_reported
             == set()
@@ -294,39 +919,47 @@ class TestSherlock(object):
 
     @pytest.mark.parametrize("by", ("name", "nodeid"))
     def test_pytest_collection_modifyitems_with_option(
-        self, sherlock, items, target_item, by
+        self, make_config, sherlock, items, target_item, by
     ):
-        config = mock.MagicMock()
-        config.getoption.return_value = True
-        config.option.flaky_test = getattr(target_item, by)
-        assert sherlock.collection is None
+        config = make_config(flaky_test=getattr(target_item, by))
+        assert sherlock.hunt.collection is None
         next(
             sherlock.pytest_collection_modifyitems(
                 session=mock.MagicMock(), config=config, items=items
             )
         )
         assert items == [target_item]
-        assert sherlock.collection is not None
-        config.getoption.assert_called_once()
+        assert sherlock.hunt.collection is not None
+        config.getoption.assert_any_call("--flaky-test")
 
     @pytest.mark.parametrize("by", ("name", "nodeid"))
     def test_pytest_collection_modifyitems_without_option(
-        self, sherlock, items, target_item, by
+        self, make_config, sherlock, items, target_item, by
     ):
-        config = mock.MagicMock()
-        config.getoption.return_value = False
-        config.option.flaky_test = getattr(target_item, by)
+        config = make_config()
         will_be_modified = list(items)
-        assert sherlock.collection is None
+        assert sherlock.hunt.collection is None
         next(
             sherlock.pytest_collection_modifyitems(
                 session=mock.MagicMock(), config=config, items=will_be_modified
             )
         )
         assert will_be_modified == items
-        assert sherlock.collection is None
+        assert sherlock.hunt.collection is None
         config.getoption.assert_called_once()
 
+    def test_recorded_order_is_kept(self, make_config, sherlock, items, target_item, tmp_path):
+        recorded = [items[3], items[0], items[2], target_item]
+        path = tmp_path / "order.txt"
+        path.write_text("\n".join(item.nodeid for item in recorded))
+        config = make_config(flaky_test=target_item.nodeid, sherlock_order=str(path))
+        next(
+            sherlock.pytest_collection_modifyitems(
+                session=mock.MagicMock(), config=config, items=items
+            )
+        )
+        assert sherlock.hunt.candidates == recorded[:-1]
+
     def test_pytest_report_collectionfinish(self, sherlock_with_prepared_collection):
         """
         Collection:
@@ -361,6 +994,12 @@ class TestSherlock(object):
             config=mock.MagicMock(), startdir=mock.MagicMock(), items=items
         )
         assert report == "Try to find coupled tests in [2-3] steps"
+        assert sherlock_with_prepared_collection.hunt.verdict.mode == MODE_POLLUTER  # by default
+        sherlock_with_prepared_collection.hunt.verdict.mode = MODE_AUTO
+        report = sherlock_with_prepared_collection.pytest_report_collectionfinish(
+            config=mock.MagicMock(), startdir=mock.MagicMock(), items=items
+        )
+        assert report == "Run the target alone to choose what to find"
 
     @pytest.mark.parametrize(
         "report_type", ("mock_report_str", "mock_report_class", "mock_report_crash")
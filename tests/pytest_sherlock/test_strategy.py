@@ -0,0 +1,203 @@
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock.binary_tree_search import make_tee
+from pytest_sherlock.strategy import (
+    BinaryStrategy,
+    Bucket,
+    ScopeStrategy,
+    Strategy,
+    bucket_of,
+    get_strategy,
+    scope_path,
+)
+
+
+class LinearStrategy(Strategy):
+    """Checks candidates one by one"""
+
+    name = "linear"
+
+    def __init__(self, items, suspects=()):
+        super(LinearStrategy, self).__init__(items, suspects)
+        self.idx = 0
+        self.polluter = None
+
+    def bounds(self):
+        return 1, len(self.items)
+
+    def propose(self):
+        if self.polluter is not None or self.idx >= len(self.items):
+            return None
+        return Bucket(self.items, self.idx, self.idx + 1)
+
+    def feed(self, bucket, failed):
+        if failed:
+            self.polluter = bucket[0]
+        self.idx += 1
+
+    def answer(self):
+        return self.polluter
+
+
+def hunt(strategy, polluter):
+    steps = 0
+    bucket = strategy.propose()
+    while bucket is not None:
+        steps += 1
+        strategy.feed(bucket, polluter in list(bucket))
+        bucket = strategy.propose()
+    return strategy.answer(), steps
+
+
+@pytest.fixture
+def candidates():
+    return [f"test_{idx}" for idx in range(8)]
+
+
+def test_bucket_of():
+    root = make_tee((0, 4))
+    assert bucket_of(root) == (0, 2)
+    assert bucket_of(root.left.left) == (0, 1)
+
+
+@pytest.mark.parametrize("polluter_idx", range(8))
+def test_binary_strategy(candidates, polluter_idx):
+    strategy = BinaryStrategy(candidates)
+    assert strategy.bounds() == (3, 4)
+    polluter, steps = hunt(strategy, candidates[polluter_idx])
+    assert polluter == candidates[polluter_idx]
+    assert 3 <= steps <= 4
+    assert strategy.narrowest() == (polluter_idx, polluter_idx + 1)
+
+
+def test_binary_strategy_not_found(candidates):
+    strategy = BinaryStrategy(candidates)
+    assert hunt(strategy, "unknown") == (None, 4)
+    assert strategy.path == "RRRR"
+
+
+def test_binary_strategy_suspects(candidates):
+    strategy = BinaryStrategy(candidates, suspects=[candidates[6]])
+    assert strategy.bounds() == (1, 5)
+    assert hunt(strategy, candidates[6]) == (candidates[6], 1)
+
+
+def test_binary_strategy_without_candidates():
+    strategy = BinaryStrategy([])
+    assert strategy.bounds() == (0, 0)
+    assert strategy.propose() is None
+    assert strategy.speculate(4) == []
+
+
+def test_binary_strategy_speculate(candidates):
+    strategy = BinaryStrategy(candidates, suspects=["suspect"])
+    speculative = strategy.speculate(3)
+    # the tree root and both possible next buckets
+    assert [(b.start, b.stop) for b in speculative] == [(0, 4), (0, 2), (4, 6)]
+    strategy.feed(strategy.propose(), False)  # the suspect isn't guilty
+    strategy.feed(strategy.propose(), True)  # (0, 4) failed
+    assert [(b.start, b.stop) for b in strategy.speculate(2)] == [(0, 1), (2, 3)]
+
+
+def test_custom_strategy(candidates):
+    assert hunt(LinearStrategy(candidates), candidates[2]) == (candidates[2], 3)
+
+
+def make_node(nodeid, parent=None):
+    node = mock.MagicMock(nodeid=nodeid)
+    node.parent = parent  # `parent` argument of MagicMock has another meaning
+    node.name = nodeid.split("::")[-1]
+    return node
+
+
+def make_test(parent, name):
+    item = make_node(f"{parent.nodeid}::{name}", parent)
+    item.originalname = name.split("[")[0]
+    return item
+
+
+@pytest.fixture
+def scoped():
+    """Tests of modules are mixed (as sorted by probability)"""
+    session = make_node("")
+    package = make_node("tests", session)
+    one = make_node("tests/test_one.py", package)
+    two = make_node("tests/test_two.py", package)
+    klass = make_node("tests/test_two.py::TestTwo", two)
+    return [
+        make_test(one, "test_a[0]"),
+        make_test(two, "test_c"),
+        make_test(one, "test_b"),
+        make_test(one, "test_a[1]"),
+        make_test(klass, "test_d"),
+        make_test(one, "test_a[2]"),
+        make_test(klass, "test_e"),
+    ]
+
+
+def test_scope_path(scoped):
+    assert scope_path(scoped[4]) == [
+        "tests",
+        "tests/test_two.py",
+        "tests/test_two.py::TestTwo",
+        "test_d",
+    ]
+    orphan = make_node("test_x[1]")
+    orphan.originalname = None
+    assert scope_path(orphan) == ["test_x"]
+
+
+def leaves(node):
+    if node.left is None and node.right is None:
+        return [node.items]
+    return leaves(node.left) + leaves(node.right)
+
+
+def test_scope_strategy_groups_scopes(scoped):
+    strategy = ScopeStrategy(scoped)
+    assert [item.nodeid.split("/")[-1] for item in strategy.items] == [
+        "test_one.py::test_a[0]",
+        "test_one.py::test_a[1]",
+        "test_one.py::test_a[2]",
+        "test_one.py::test_b",
+        "test_two.py::test_c",
+        "test_two.py::TestTwo::test_d",
+        "test_two.py::TestTwo::test_e",
+    ]
+    tree = strategy.binary_tree
+    assert tree.items == (0, 7)
+    # modules first, then functions (variants together), then variants
+    assert (tree.left.items, tree.right.items) == ((0, 4), (4, 7))
+    assert (tree.left.left.items, tree.left.right.items) == ((0, 3), (3, 4))
+    assert (tree.right.left.items, tree.right.right.items) == ((4, 5), (5, 7))
+    assert leaves(tree) == [(idx, idx + 1) for idx in range(7)]
+
+
+@pytest.mark.parametrize("polluter_idx", range(7))
+def test_scope_strategy(scoped, polluter_idx):
+    strategy = ScopeStrategy(scoped)
+    polluter = scoped[polluter_idx]
+    answer, steps = hunt(strategy, polluter)
+    assert answer is polluter
+    minimum, maximum = strategy.bounds()
+    assert minimum <= steps <= maximum
+
+
+def test_get_builtin_strategy():
+    assert get_strategy("binary") is BinaryStrategy
+
+
+def test_get_strategy_from_entry_point():
+    entry_point = mock.MagicMock()
+    entry_point.name = "linear"
+    entry_point.load.return_value = LinearStrategy
+    with mock.patch(
+        "pytest_sherlock.strategy.iter_entry_points", return_value=iter([entry_point])
+    ):
+        assert get_strategy("linear") is LinearStrategy
+
+
+def test_get_unknown_strategy():
+    assert get_strategy("unknown-strategy") is None
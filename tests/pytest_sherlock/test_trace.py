@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from pytest_sherlock.trace import (
+    Tracer,
+    find_first_difference,
+    get_read_expressions,
+    write_difference,
+)
+
+SETTINGS = {"debug": False}
+
+
+class Config(object):
+    timeout = 10
+
+
+def read_state():
+    debug = SETTINGS["debug"]
+    timeout = Config.timeout
+    mode = os.environ.get("SHERLOCK_TRACE_MODE")
+    return debug, timeout, mode
+
+
+def test_get_read_expressions():
+    expressions = get_read_expressions(read_state)
+    assert ["SETTINGS"] in expressions.values()
+    assert ["Config.timeout", "Config"] in expressions.values()
+
+
+def test_tracer_records_state(monkeypatch):
+    monkeypatch.setenv("SHERLOCK_TRACE_MODE", "fast")
+    with Tracer(read_state) as tracer:
+        read_state()
+    assert ("attribute", "SETTINGS", "{'debug': False}") in tracer.observations
+    assert ("attribute", "Config.timeout", "10") in tracer.observations
+    assert ("env", "SHERLOCK_TRACE_MODE", "'fast'") in tracer.observations
+
+
+def test_tracer_ignores_other_functions():
+    def other():
+        return SETTINGS["debug"]
+
+    with Tracer(read_state) as tracer:
+        other()
+    assert tracer.observations == []
+
+
+def test_tracer_records_files(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("data")
+
+    def read_file():
+        with open(str(path)) as f:
+            return f.read()
+
+    with Tracer(read_file) as tracer:
+        read_file()
+    assert any(kind == "file" and name == str(path) for kind, name, _ in tracer.observations)
+
+
+def test_tracer_restores_trace_function():
+    import sys
+
+    previous = sys.gettrace()
+    with Tracer(read_state):
+        pass
+    assert sys.gettrace() is previous
+
+
+@pytest.mark.parametrize(
+    "clean, polluted, expected",
+    [
+        ([], [], None),
+        ([("env", "A", "'1'")], [("env", "A", "'1'")], None),
+        (
+            [("env", "A", "'1'"), ("attribute", "B", "1")],
+            [("env", "A", "'1'"), ("attribute", "B", "2")],
+            {"kind": "attribute", "name": "B", "clean": "1", "polluted": "2"},
+        ),
+        # compares the same occurrence of the same state
+        (
+            [("local", "x", "1"), ("local", "x", "2")],
+            [("local", "x", "1"), ("local", "x", "3")],
+            {"kind": "local", "name": "x", "clean": "2", "polluted": "3"},
+        ),
+        # state which wasn't read in the clean run is skipped
+        ([("env", "A", "'1'")], [("env", "B", "'2'"), ("env", "A", "'1'")], None),
+    ],
+)
+def test_find_first_difference(clean, polluted, expected):
+    assert find_first_difference(clean, polluted) == expected
+
+
+def test_write_difference():
+    difference = {"kind": "env", "name": "MODE", "clean": "'a'", "polluted": "'b'"}
+    assert write_difference(difference) == (
+        "Victim reads different state (env) MODE:\n"
+        "clean run: 'a'\n"
+        "after polluter: 'b'"
+    )
+    assert write_difference(difference, setter=True) == (
+        "Victim reads different state (env) MODE:\n"
+        "alone: 'a'\n"
+        "after setter: 'b'"
+    )
@@ -0,0 +1,280 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from pytest_sherlock import work_queue
+from pytest_sherlock.parallel import Limits, ParallelHunt, WorkerError
+from pytest_sherlock.strategy import BinaryStrategy
+from pytest_sherlock.work_queue import Polling, QueueRunner, QueueWorker, WorkQueue
+
+TARGET = "tests/test_two.py::test_target"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / "queue"))
+
+
+def test_claim_oldest(queue):
+    queue.put("a-0001", TARGET, ["tests/test_one.py::test_1", TARGET])
+    queue.put("a-0002", TARGET, [TARGET])
+    assert queue.claim("worker") == {
+        "id": "a-0001",
+        "target": TARGET,
+        "nodeids": ["tests/test_one.py::test_1", TARGET],
+    }
+    assert queue.claim("worker")["id"] == "a-0002"
+    assert queue.claim("worker") is None
+
+
+def test_finish(queue):
+    queue.put("a-0001", TARGET, [TARGET])
+    queue.claim("worker")
+    assert queue.verdict("a-0001") is None
+    queue.finish("a-0001", {"failed": True})
+    assert queue.verdict("a-0001") == {"failed": True}
+    assert queue.verdict("a-0001") is None  # it's removed after reading
+    for state in WorkQueue.STATES:
+        assert os.listdir(os.path.join(queue.directory, state)) == []
+
+
+def test_requeue_expired(queue):
+    queue.put("a-0001", TARGET, [TARGET])
+    queue.claim("worker")
+    assert not queue.requeue_expired("a-0001", timeout=60)
+    old = time.time() - 120
+    os.utime(queue.path("leases", "a-0001"), (old, old))
+    assert queue.requeue_expired("a-0001", timeout=60)
+    assert queue.claim("other")["id"] == "a-0001"
+
+
+def test_cancel(queue):
+    queue.put("a-0001", TARGET, [TARGET])
+    queue.put("a-0002", TARGET, [TARGET])
+    queue.claim("worker")
+    queue.cancel("a-0001")
+    queue.cancel("a-0002")
+    assert queue.is_cancelled("a-0001")
+    assert queue.claim("worker") is None  # pending job was removed
+    queue.release("a-0001")
+    assert not queue.is_cancelled("a-0001")
+
+
+def assert_empty(queue):
+    for state in WorkQueue.STATES:
+        assert os.listdir(os.path.join(queue.directory, state)) == [], state
+
+
+def test_slow_worker_keeps_claim_of_another_one(queue):
+    queue.put("a-0001", TARGET, [TARGET])
+    queue.claim("slow")
+    old = time.time() - 120
+    os.utime(queue.path("leases", "a-0001"), (old, old))
+    assert queue.requeue_expired("a-0001", timeout=60)
+    queue.claim("fresh")
+    assert queue.finish("a-0001", {"failed": True}, "slow")
+    assert queue.owns("a-0001", "fresh")
+    assert queue.heartbeat("a-0001")
+    assert queue.verdict("a-0001") == {"failed": True}
+    # the copy of the fresh worker isn't needed anymore
+    assert queue.is_cancelled("a-0001")
+    assert not queue.finish("a-0001", {"failed": True}, "fresh")
+    assert_empty(queue)
+
+
+def test_requeued_job_finished_before_claim(queue):
+    queue.put("a-0001", TARGET, [TARGET])
+    queue.claim("slow")
+    old = time.time() - 120
+    os.utime(queue.path("leases", "a-0001"), (old, old))
+    assert queue.requeue_expired("a-0001", timeout=60)
+    assert queue.finish("a-0001", {"failed": False}, "slow")
+    assert queue.claim("fresh") is None
+    assert queue.verdict("a-0001") == {"failed": False}
+    assert_empty(queue)
+
+
+def test_cancelled_job_leaves_nothing(queue):
+    queue.put("a-0001", TARGET, [TARGET])
+    queue.claim("worker")
+    queue.cancel("a-0001")
+    assert not queue.finish("a-0001", {"failed": True}, "worker")
+    assert_empty(queue)
+    # the verdict was written right before the cancel
+    queue.put("a-0002", TARGET, [TARGET])
+    queue.claim("worker")
+    queue.finish("a-0002", {"failed": True}, "worker")
+    queue.cancel("a-0002")
+    assert_empty(queue)
+
+
+def claim_all(directory, claimed):
+    queue = WorkQueue(directory)
+    while True:
+        job = queue.claim(str(os.getpid()))
+        if job is None:
+            return
+        claimed.put(job["id"])
+
+
+def test_job_is_claimed_once_by_several_processes(queue):
+    job_ids = [queue.put(f"a-{idx:04d}", TARGET, [TARGET]) for idx in range(40)]
+    claimed = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=claim_all, args=(queue.directory, claimed))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert sorted(claimed.get(timeout=5) for _ in job_ids) == job_ids
+    assert claimed.empty()
+
+
+async def serve_fake(queue, polluter, jobs=None):
+    """Worker which fails the target when the polluter is in the bucket"""
+    while True:
+        job = queue.claim("fake")
+        if job is not None:
+            if jobs is not None:
+                jobs.append(job["nodeids"])
+            queue.finish(job["id"], {"failed": polluter in job["nodeids"]})
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.parametrize("polluter_idx", (0, 5))
+def test_hunt_through_queue(queue, polluter_idx):
+    candidates = [mock.MagicMock(nodeid=f"tests/test_one.py::test_{idx}") for idx in range(8)]
+    target = mock.MagicMock(nodeid=TARGET)
+
+    async def hunt():
+        workers = [
+            asyncio.ensure_future(serve_fake(queue, candidates[polluter_idx].nodeid))
+            for _ in range(2)
+        ]
+        try:
+            return await ParallelHunt(
+                QueueRunner(queue, TARGET, polling=Polling(poll=0.001)),
+                BinaryStrategy(candidates),
+                workers=3,
+            ).hunt()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    assert asyncio.run(hunt()) is candidates[polluter_idx]
+
+
+def test_runner_raises_worker_error(queue):
+    async def run():
+        task = asyncio.ensure_future(QueueRunner(queue, TARGET, polling=Polling(poll=0.001)).run([TARGET]))
+        await asyncio.sleep(0.01)
+        job = queue.claim("fake")
+        queue.finish(job["id"], {"error": "not collected"})
+        return await task
+
+    with pytest.raises(WorkerError, match="not collected"):
+        asyncio.run(run())
+
+
+def test_runner_gives_up_without_workers(queue):
+    on_wait = mock.MagicMock()
+    runner = QueueRunner(
+        queue, TARGET, polling=Polling(poll=0.001, wait=0.05, on_wait=on_wait)
+    )
+    with mock.patch.object(work_queue, "WAITING", 0.01):
+        with pytest.raises(WorkerError, match="No worker claimed"):
+            asyncio.run(runner.run([TARGET]))
+    on_wait.assert_called_once_with()
+    assert_empty(queue)
+
+
+def test_runner_waits_for_claimed_job(queue):
+    runner = QueueRunner(queue, TARGET, polling=Polling(poll=0.001, wait=0.02))
+
+    async def run():
+        task = asyncio.ensure_future(runner.run([TARGET]))
+        await asyncio.sleep(0.005)
+        job = queue.claim("fake")
+        await asyncio.sleep(0.05)  # a running job isn't limited by the wait
+        queue.finish(job["id"], {"failed": False})
+        return await task
+
+    assert asyncio.run(run()) is False
+
+
+class FakeBucketRunner(object):
+    def __init__(self, rootdir, target, directory, limits=None):
+        self.target = target
+        self.limits = limits
+        self.timed_out = set()
+
+    async def run(self, nodeids):
+        await asyncio.sleep(0.01)
+        return "tests/test_one.py::test_polluter" in nodeids
+
+
+@pytest.fixture
+def worker(make_config, queue):
+    config = make_config(sherlock_worker=queue.directory, sherlock_worker_idle=0.2)
+    return QueueWorker(config, heartbeat=0.01, poll=0.01)
+
+
+def test_worker_serves_until_idle(queue, worker):
+    queue.put("a-0001", TARGET, ["tests/test_one.py::test_polluter", TARGET])
+    queue.put("a-0002", TARGET, ["tests/test_one.py::test_1", TARGET])
+    with mock.patch.object(work_queue, "BucketRunner", FakeBucketRunner):
+        assert asyncio.run(worker.serve()) == 2
+    assert queue.verdict("a-0001") == {"failed": True}
+    assert queue.verdict("a-0002") == {"failed": False}
+
+
+def test_worker_kills_hung_job(queue, worker):
+    class HungRunner(FakeBucketRunner):
+        async def run(self, nodeids):
+            assert self.limits.get_timeout(nodeids) == 0.5
+            self.timed_out.add(tuple(nodeids))
+            return True
+
+    queue.put("a-0001", TARGET, [TARGET], timeout=0.5)
+    with mock.patch.object(work_queue, "BucketRunner", HungRunner):
+        assert asyncio.run(worker.serve()) == 1
+    assert queue.verdict("a-0001") == {"failed": True, "timed_out": True}
+
+
+def test_runner_sends_timeout(queue):
+    runner = QueueRunner(
+        queue,
+        TARGET,
+        limits=Limits(timeout=lambda nodeids: 2.0 * len(nodeids)),
+        polling=Polling(poll=0.001),
+    )
+
+    async def run():
+        task = asyncio.ensure_future(runner.run([TARGET]))
+        await asyncio.sleep(0.01)
+        job = queue.claim("fake")
+        assert job["timeout"] == 2.0
+        queue.finish(job["id"], {"failed": True, "timed_out": True})
+        return await task
+
+    assert asyncio.run(run()) is True
+    assert runner.timed_out == {(TARGET,)}
+
+
+def test_worker_drops_cancelled_job(queue, worker):
+    class SlowRunner(FakeBucketRunner):
+        async def run(self, nodeids):
+            queue.cancel("a-0001")
+            await asyncio.sleep(10)
+
+    queue.put("a-0001", TARGET, [TARGET])
+    with mock.patch.object(work_queue, "BucketRunner", SlowRunner):
+        assert asyncio.run(worker.serve()) == 0
+    assert queue.verdict("a-0001") is None
+    assert not queue.is_cancelled("a-0001")